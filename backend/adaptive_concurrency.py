@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger()
+
+
+class AdaptiveConcurrencyLimit:
+    """Límite de concurrencia AIMD (aumento aditivo, disminución multiplicativa)
+
+    Cada éxito suma 1/limit (≈ +1 por ventana completa); un throttling o una
+    latencia por encima del objetivo multiplica el límite por backoff_ratio.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, backoff_ratio=0.5, latency_target=None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff_ratio = backoff_ratio
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout=None, share=1.0):
+        """Espera un lugar libre; retorna False si vence el timeout
+
+        Con share < 1 solo se usa esa fracción del límite (los lugares restantes
+        quedan para requests de mayor prioridad).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.in_flight >= max(1, int(self.limit * share)):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def try_acquire(self, share=1.0):
+        """Toma un lugar sin esperar"""
+        return self.acquire(timeout=0, share=share)
+
+    def release(self, throttled=False, latency=None):
+        """Libera el lugar y ajusta el límite según el resultado"""
+        with self.condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            slow = self.latency_target is not None and latency is not None and latency > self.latency_target
+
+            if throttled or slow:
+                previous = self.limit
+                self.limit = max(self.minimum, self.limit * self.backoff_ratio)
+                if int(previous) != int(self.limit):
+                    reason = 'throttling' if throttled else f'latencia {latency:.1f}s'
+                    logger.warning(f"Límite de concurrencia {previous:.1f} -> {self.limit:.1f} ({reason})")
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+            self.condition.notify_all()
+
+    def cancel(self):
+        """Libera el lugar sin ajustar el límite (el request no llegó a ejecutarse)"""
+        with self.condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.condition.notify_all()
+
+    def status(self):
+        """Límite actual y requests en curso"""
+        with self.condition:
+            return {'limit': int(self.limit), 'in_flight': self.in_flight}
@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+import time
+
+from adaptive_concurrency import AdaptiveConcurrencyLimit
+from deadlines import budget
+from scheduler import DEFAULT_PRIORITY, PRIORITY_CLASSES
+
+logger = logging.getLogger()
+
+# Control de admisión de los requests que llegan al modelo (variables de entorno de Lambda)
+ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', 'true').lower() == 'true'
+# En Lambda cada contenedor atiende un request a la vez: los buckets se comparten en DynamoDB
+ADMISSION_BACKEND = os.environ.get(
+    'ADMISSION_BACKEND', 'dynamodb' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'memory'
+)  # memory | dynamodb
+ADMISSION_TABLE = os.environ.get('ADMISSION_TABLE', 'dnoc-admission')
+DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT')
+
+# Token buckets: tasa sostenida (requests/s) y ráfaga
+ADMISSION_GLOBAL_RATE = float(os.environ.get('ADMISSION_GLOBAL_RATE', '5'))
+ADMISSION_GLOBAL_BURST = float(os.environ.get('ADMISSION_GLOBAL_BURST', '20'))
+ADMISSION_SESSION_RATE = float(os.environ.get('ADMISSION_SESSION_RATE', '0.5'))
+ADMISSION_SESSION_BURST = float(os.environ.get('ADMISSION_SESSION_BURST', '5'))
+
+# Concurrencia AIMD del proceso y señales de saturación. Solo sirve en un proceso
+# con requests concurrentes (ejecución local): en Lambda nunca pasa de 1 en curso
+ADMISSION_CONCURRENCY = os.environ.get(
+    'ADMISSION_CONCURRENCY', 'false' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'true'
+).lower() == 'true'
+ADMISSION_INITIAL_CONCURRENCY = int(os.environ.get('ADMISSION_INITIAL_CONCURRENCY', '8'))
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get('ADMISSION_MAX_CONCURRENCY', '32'))
+ADMISSION_LATENCY_TARGET = float(os.environ.get('ADMISSION_LATENCY_TARGET', '20'))
+ADMISSION_MIN_RATE_FACTOR = float(os.environ.get('ADMISSION_MIN_RATE_FACTOR', '0.1'))
+ADMISSION_RATE_STEP = float(os.environ.get('ADMISSION_RATE_STEP', '0.05'))
+ADMISSION_BUSY_RETRY_AFTER = float(os.environ.get('ADMISSION_BUSY_RETRY_AFTER', '2'))
+ADMISSION_JOB_WAIT = float(os.environ.get('ADMISSION_JOB_WAIT', '120'))  # jobs asíncronos: esperan en vez de 429
+
+# Por clase de prioridad: fracción de la concurrencia y de la ráfaga global que puede usar
+# (las clases bajas absorben el encolamiento) y espera máxima por un lugar antes del 429
+ADMISSION_PRIORITY_SHARE = dict(zip(
+    PRIORITY_CLASSES, [float(v) for v in os.environ.get('ADMISSION_PRIORITY_SHARE', '1,0.75,0.5').split(',')]
+))
+ADMISSION_PRIORITY_WAIT = dict(zip(
+    PRIORITY_CLASSES, [float(v) for v in os.environ.get('ADMISSION_PRIORITY_WAIT', '5,0,0').split(',')]
+))
+
+class AdmissionRejected(Exception):
+    """El control de admisión rechazó el request (retry_after: segundos para reintentar)"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rechazado por control de admisión (reintentar en {retry_after:.1f}s)")
+        self.retry_after = retry_after
+
+
+# Tamaño máximo del registro de buckets en memoria (sesiones)
+MAX_MEMORY_BUCKETS = 10000
+
+
+class MemoryBucketBackend:
+    """Buckets en memoria del proceso (pruebas y ejecución local)
+
+    Cada bucket guarda solo su TAT (theoretical arrival time, algoritmo GCRA):
+    equivale a un token bucket sin timers ni recargas.
+    """
+
+    def __init__(self):
+        self.tats = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, interval, tolerance):
+        """Consume un token; retorna 0 si se admite o los segundos hasta que haya uno"""
+        now = time.time()
+        with self.lock:
+            tat = max(self.tats.get(key, now), now)
+            if tat - now > tolerance:
+                return tat - now - tolerance
+            self.tats[key] = tat + interval
+            if len(self.tats) > MAX_MEMORY_BUCKETS:
+                # Buckets llenos de nuevo (TAT vencido) equivalen a no tener registro
+                self.tats = {k: v for k, v in self.tats.items() if v > now}
+            return 0.0
+
+
+class DynamoDBBucketBackend:
+    """Buckets compartidos por todos los contenedores en DynamoDB
+
+    Lectura consistente y escritura condicionada al TAT leído (concurrencia
+    optimista). Si DynamoDB falla se admite el request: el control de admisión
+    no debe tirar el servicio.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, table_name, endpoint_url=None):
+        import boto3
+
+        self.table = boto3.resource('dynamodb', endpoint_url=endpoint_url).Table(table_name)
+
+    def take(self, key, interval, tolerance):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        for _ in range(self.MAX_ATTEMPTS):
+            now = time.time()
+            try:
+                item = self.table.get_item(Key={'bucket': key}, ConsistentRead=True).get('Item')
+                previous = float(item['tat']) if item else None
+                tat = max(previous or now, now)
+                if tat - now > tolerance:
+                    return tat - now - tolerance
+
+                condition = {'ConditionExpression': 'attribute_not_exists(bucket)'} if item is None else {
+                    'ConditionExpression': 'tat = :previous',
+                    'ExpressionAttributeValues': {':previous': item['tat']}
+                }
+                self.table.put_item(
+                    Item={'bucket': key, 'tat': str(tat + interval), 'expires_at': int(tat + interval + 3600)},
+                    **condition
+                )
+                return 0.0
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    logger.warning(f"Control de admisión sin DynamoDB ({key}): {str(e)}")
+                    return 0.0
+            except BotoCoreError as e:
+                logger.warning(f"Control de admisión sin DynamoDB ({key}): {str(e)}")
+                return 0.0
+        # Contención alta sobre el bucket: se trata como lleno por un intervalo
+        return interval
+
+
+def create_backend(name=ADMISSION_BACKEND):
+    """Crea el backend de buckets configurado"""
+    if name == 'dynamodb':
+        return DynamoDBBucketBackend(ADMISSION_TABLE, DYNAMODB_ENDPOINT)
+    return MemoryBucketBackend()
+
+
+class AdmissionController:
+    """Admisión de requests al modelo: token buckets por sesión y global + concurrencia AIMD
+
+    Un request se rechaza de inmediato (para responder 429 con Retry-After) si
+    la concurrencia del proceso está completa o si su sesión o el total
+    superan la tasa configurada. El límite de concurrencia y la tasa global que
+    consume este proceso bajan a la mitad ante throttling o latencia alta y se
+    recuperan de a poco con cada request exitoso (AIMD). Sin
+    ADMISSION_CONCURRENCY (default en Lambda) solo aplican los buckets y la
+    tasa adaptativa.
+    """
+
+    def __init__(self, backend=None, concurrency=ADMISSION_CONCURRENCY):
+        self.backend = backend
+        self.concurrency = AdaptiveConcurrencyLimit(
+            initial=ADMISSION_INITIAL_CONCURRENCY,
+            maximum=ADMISSION_MAX_CONCURRENCY,
+            latency_target=ADMISSION_LATENCY_TARGET
+        ) if concurrency else None
+        self.rate_factor = 1.0
+        self.lock = threading.Lock()
+
+    def _take(self, key, rate, burst):
+        interval = 1.0 / rate
+        return self.backend.take(key, interval, max(0.0, burst - 1) * interval)
+
+    def admit(self, session_id=None, priority=DEFAULT_PRIORITY):
+        """Intenta admitir un request; retorna (ticket, 0) o (None, segundos para reintentar)
+
+        Las clases de menor prioridad solo usan una fracción de la concurrencia
+        y de la ráfaga global, así que con carga alta se rechazan primero; las
+        alertas además esperan unos segundos por un lugar en vez de recibir 429.
+        """
+        if not ADMISSION_CONTROL:
+            return {'start': time.monotonic(), 'limited': False}, 0.0
+        if self.backend is None:
+            self.backend = create_backend()
+
+        share = ADMISSION_PRIORITY_SHARE.get(priority, 1.0)
+        if self.concurrency is not None and \
+                not self.concurrency.acquire(timeout=budget(ADMISSION_PRIORITY_WAIT.get(priority, 0)), share=share):
+            return None, ADMISSION_BUSY_RETRY_AFTER
+        try:
+            if session_id:
+                wait = self._take(f'session:{session_id}', ADMISSION_SESSION_RATE, ADMISSION_SESSION_BURST)
+                if wait:
+                    self._cancel()
+                    return None, wait
+            wait = self._take('global', ADMISSION_GLOBAL_RATE * self.rate_factor, ADMISSION_GLOBAL_BURST * share)
+            if wait:
+                self._cancel()
+                return None, wait
+        except Exception:
+            self._cancel()
+            raise
+        return {'start': time.monotonic(), 'limited': True}, 0.0
+
+    def release(self, ticket, throttled=False):
+        """Libera el lugar del request admitido y ajusta los límites según el resultado"""
+        if not ticket['limited']:
+            return
+        latency = time.monotonic() - ticket['start']
+        if self.concurrency is not None:
+            self.concurrency.release(throttled=throttled, latency=latency)
+        with self.lock:
+            if throttled or latency > ADMISSION_LATENCY_TARGET:
+                self.rate_factor = max(ADMISSION_MIN_RATE_FACTOR, self.rate_factor * 0.5)
+            else:
+                self.rate_factor = min(1.0, self.rate_factor + ADMISSION_RATE_STEP)
+
+    def _cancel(self):
+        if self.concurrency is not None:
+            self.concurrency.cancel()
+
+    def status(self):
+        """Estado del control de admisión (concurrencia y fracción de la tasa global)"""
+        concurrency = self.concurrency.status() if self.concurrency is not None else {}
+        return {**concurrency, 'rate_factor': round(self.rate_factor, 2)}
+
+
+admission = AdmissionController()
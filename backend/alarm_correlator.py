@@ -0,0 +1,229 @@
+import os
+import re
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+
+from alarm_parser import parse_alarm_dump
+from template_miner import miner
+
+# Ventana de correlación temporal (minutos)
+CORRELATION_WINDOW_MINUTES = int(os.environ.get('ALARM_CORRELATION_WINDOW', '15'))
+
+# Firmas de evento conocidas, de la más específica a la más general:
+# (clave, patrón sobre el summary, firma, descripción). Los grupos de captura
+# del patrón completan la firma y la descripción; signature_registry asocia
+# procedimientos a las claves. Es la única tabla de firmas del backend.
+SIGNATURE_RULES = [
+    ('eventlog_6008', r'EventLog\(6008\b', 'EventLog 6008', 'Apagado inesperado de Windows'),
+    ('eventlog_6006', r'EventLog\(6006\b', 'EventLog 6006', 'Apagado limpio del Event Log'),
+    ('eventlog_41', r'EventLog\(41\b|Kernel-Power', 'EventLog 41', 'Reinicio sin apagado limpio (Kernel-Power)'),
+    ('eventlog', r'EventLog\((\d+)', 'EventLog {0}', 'Evento Windows {0}'),
+    ('esx_status_red', r'Status is not as expected \(\d+ \(red\)\)', 'Status red', 'Estado del host: red'),
+    ('status', r'Status is not as expected \(\d+ \((\w+)\)\)', 'Status {0}', 'Estado del host: {0}'),
+    ('memory_threshold', r'Memory Usage pct has breached threshold', 'Memory threshold', 'Uso de memoria sobre umbral'),
+    ('cpu_threshold', r'CPU Usage pct has breached threshold', 'CPU threshold', 'Uso de CPU sobre umbral'),
+]
+
+# Compilada una sola vez (cold start): una alternancia con un grupo nombrado
+# por regla, de modo que cada summary se recorre en una única pasada. La regex
+# propia de la regla sólo se aplica al fragmento encontrado, para sus grupos.
+_RULES = {key: (re.compile(pattern, re.I), signature, description)
+          for key, pattern, signature, description in SIGNATURE_RULES}
+_SIGNATURE_RE = re.compile(
+    '|'.join(f'(?P<{key}>{pattern})' for key, pattern, _, _ in SIGNATURE_RULES),
+    re.I
+)
+
+
+def known_signature(summary):
+    """Firma conocida del summary: (clave, firma, descripción), o None"""
+    match = _SIGNATURE_RE.search(summary or '')
+    if not match:
+        return None
+    key = match.lastgroup
+    regex, signature, description = _RULES[key]
+    groups = regex.fullmatch(match.group(key)).groups()
+    return key, signature.format(*groups), description.format(*groups)
+
+
+def learn_alarm(alarm):
+    """Aprende la plantilla del summary y detecta su firma conocida (una sola vez por alarma)
+
+    Deja en la alarma el id de plantilla del minero, la plantilla, sus
+    parámetros y la firma conocida (o None). La deduplicación y la
+    correlación reutilizan estos campos.
+    """
+    if 'template_id' not in alarm:
+        alarm['template_id'], alarm['template'], alarm['params'] = miner.add(alarm['summary'])
+        alarm['known'] = known_signature(alarm['summary'])
+    return alarm
+
+
+def event_signature(alarm):
+    """Clave de la regla, firma del evento (p. ej. "EventLog 6008") y su descripción
+
+    Sin regla conocida la clave es None y se usa la plantilla minada del
+    summary (hosts, fechas y números como <*>), ya generalizada con el lote.
+    """
+    learn_alarm(alarm)
+    if alarm['known']:
+        return alarm['known']
+
+    masked = (miner.template(alarm['template_id']) or alarm['template'])[:80]
+    return None, masked, masked
+
+
+def alarm_time(alarm):
+    """Hora de referencia de la alarma para la ventana temporal"""
+    return alarm['first_ocurrence'] or alarm['event_time']
+
+
+def format_hosts(hosts):
+    """Compacta hosts por familia: plwagapp1, plwagapp2 -> plwagapp1/2"""
+    by_family = OrderedDict()
+    for host in sorted(set(hosts)):
+        family = re.sub(r'\d+$', '', host) or host
+        by_family.setdefault(family, []).append(host[len(family):])
+
+    parts = []
+    for family, suffixes in by_family.items():
+        numbered = [s for s in suffixes if s]
+        if len(numbered) > 1:
+            parts.append(f"{family}{'/'.join(numbered)}")
+        else:
+            parts.append(f"{family}{suffixes[0]}")
+    return ', '.join(parts)
+
+
+def correlate(alarms, window_minutes=CORRELATION_WINDOW_MINUTES):
+    """Agrupa alarmas por firma de evento y ventana temporal
+
+    Retorna clusters ordenados por tamaño y luego por hora, cada uno con sus
+    hosts, familias y rango temporal.
+    """
+    window = timedelta(minutes=window_minutes)
+    by_signature = defaultdict(list)
+    for alarm in alarms:
+        learn_alarm(alarm)
+
+    # Con todo el lote aprendido, alarmas estructuralmente iguales comparten
+    # la misma plantilla (ya generalizada) y caen en la misma firma
+    for alarm in alarms:
+        key, signature, description = event_signature(alarm)
+        alarm['signature_key'] = key
+        alarm['signature'] = signature
+        alarm['description'] = description
+        by_signature[signature].append(alarm)
+
+    clusters = []
+    for signature, group in by_signature.items():
+        timed = sorted((a for a in group if alarm_time(a)), key=alarm_time)
+        untimed = [a for a in group if not alarm_time(a)]
+
+        current = []
+        for alarm in timed:
+            if current and alarm_time(alarm) - alarm_time(current[-1]) > window:
+                clusters.append(_make_cluster(signature, current))
+                current = []
+            current.append(alarm)
+        if current or untimed:
+            clusters.append(_make_cluster(signature, current + untimed))
+
+    clusters.sort(key=lambda c: (-c['count'], c['first'] or datetime.max))
+    for i, cluster in enumerate(clusters, 1):
+        cluster['id'] = i
+    return clusters
+
+
+def _make_cluster(signature, alarms):
+    times = [t for a in alarms for t in (alarm_time(a), a.get('last_seen')) if t]
+    return {
+        'signature': signature,
+        'key': alarms[0]['signature_key'],
+        'description': alarms[0]['description'],
+        'alarms': alarms,
+        'count': sum(1 + a.get('duplicates', 0) for a in alarms),
+        'hosts': [a['host'] for a in alarms],
+        'families': sorted({a['family'] for a in alarms}),
+        'first': min(times) if times else None,
+        'last': max(times) if times else None,
+        'malformed_dates': sum(1 for a in alarms if a['malformed_date']),
+        'sample': alarms[0]['summary']
+    }
+
+
+def related_families(clusters, window_minutes=CORRELATION_WINDOW_MINUTES):
+    """Familias de hosts con distintas firmas dentro de la misma ventana (posible causa común)"""
+    window = timedelta(minutes=window_minutes)
+    by_family = defaultdict(list)
+    for cluster in clusters:
+        for family in cluster['families']:
+            by_family[family].append(cluster)
+
+    related = []
+    for family, family_clusters in by_family.items():
+        signatures = {c['signature'] for c in family_clusters}
+        times = [t for c in family_clusters for t in (c['first'], c['last']) if t]
+        if len(signatures) > 1 and times and max(times) - min(times) <= window:
+            related.append((family, sorted(signatures)))
+    return related
+
+
+def _format_time_range(cluster):
+    if not cluster['first']:
+        return 'sin hora válida'
+    first = cluster['first'].strftime('%d/%m/%Y %H:%M')
+    if cluster['last'] == cluster['first']:
+        return first
+    return f"{first}–{cluster['last'].strftime('%H:%M')}"
+
+
+def summarize_clusters(clusters, total_alarms, window_minutes=CORRELATION_WINDOW_MINUTES):
+    """Resumen compacto de los clusters para enviar al modelo"""
+    lines = [f"Resumen de {total_alarms} alarmas en {len(clusters)} grupos (ventana {window_minutes} min):"]
+    for cluster in clusters:
+        line = (f"{cluster['id']}. {cluster['signature']} ({cluster['description']}) x{cluster['count']} "
+                f"— {format_hosts(cluster['hosts'])} — {_format_time_range(cluster)}")
+        if cluster['malformed_dates']:
+            line += f" — {cluster['malformed_dates']} con fecha inválida"
+        lines.append(line)
+
+    related = related_families(clusters, window_minutes)
+    if related:
+        lines.append("Familias con eventos distintos en la misma ventana:")
+        for family, signatures in related:
+            lines.append(f"- {family}*: {', '.join(signatures)}")
+    return '\n'.join(lines)
+
+
+def correlate_dump(text):
+    """Parsea y correlaciona un dump de alarmas; retorna (alarms, clusters)"""
+    alarms = parse_alarm_dump(text)
+    return alarms, correlate(alarms)
+
+
+def build_alarm_prompt(text, alarms=None, clusters=None):
+    """Convierte un dump de alarmas en un prompt compacto con los clusters correlacionados
+
+    Si ya se correlacionó el dump se pueden pasar alarms y clusters para no
+    repetir el trabajo. Retorna (prompt, stats) donde stats incluye tamaños de
+    entrada y salida.
+    """
+    if alarms is None or clusters is None:
+        alarms, clusters = correlate_dump(text)
+    total_alarms = sum(cluster['count'] for cluster in clusters)
+    summary = summarize_clusters(clusters, total_alarms)
+
+    prompt = (
+        "Analiza las siguientes alarmas del monitoreo DNOC, ya agrupadas y "
+        "correlacionadas. Indica causa raíz probable, impacto y pasos a seguir.\n\n"
+        f"{summary}"
+    )
+    stats = {
+        'alarms': total_alarms,
+        'unique_alarms': len(alarms),
+        'clusters': len(clusters),
+        'input_chars': len(text),
+        'prompt_chars': len(prompt)
+    }
+    return prompt, stats
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+import time
+
+from alarm_correlator import format_hosts, learn_alarm
+
+# Ventana de deduplicación (minutos); 0 la desactiva
+DEDUP_WINDOW_MINUTES = float(os.environ.get('ALARM_DEDUP_WINDOW', '30'))
+DEDUP_BUCKETS = int(os.environ.get('ALARM_DEDUP_BUCKETS', '6'))
+DEDUP_MAX_PER_BUCKET = int(os.environ.get('ALARM_DEDUP_MAX_PER_BUCKET', '5000'))
+
+
+def fingerprint(alarm):
+    """Huella de la alarma: host + id de plantilla del minero + firma conocida
+
+    La firma conocida separa eventos que el minero puede unir en una misma
+    plantilla (p. ej. EventLog 6008 y EventLog 41 con el mismo texto). Los ids
+    de plantilla son del contenedor, igual que la ventana de deduplicación.
+    """
+    learn_alarm(alarm)
+    known = alarm['known'][0] if alarm['known'] else ''
+    key = f"{alarm['host']}|{alarm['template_id']}|{known}"
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def scoped_fingerprint(alarm, scope=''):
+    """Huella de la alarma dentro de un ámbito (sesión): cada operador tiene su propia ventana"""
+    fp = alarm.get('fingerprint') or fingerprint(alarm)
+    if not scope:
+        return fp
+    return int.from_bytes(hashlib.blake2b(f"{scope}|{fp}".encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def alarm_weight(alarm):
+    """Cantidad de alarmas que representa (la sobreviviente más sus duplicados)"""
+    return 1 + alarm.get('duplicates', 0)
+
+
+def collapse_duplicates(alarms, window_minutes=DEDUP_WINDOW_MINUTES):
+    """Colapsa las repeticiones dentro del dump en la primera alarma de cada huella
+
+    La sobreviviente lleva la cantidad suprimida en 'duplicates' y la última
+    hora vista en 'last_seen'. Una repetición fuera de la ventana abre una
+    sobreviviente nueva.
+    """
+    window_seconds = window_minutes * 60
+    survivors = {}
+    result = []
+    for alarm in alarms:
+        fp = fingerprint(alarm)
+        alarm['fingerprint'] = fp
+        when = alarm['first_ocurrence'] or alarm['event_time']
+        survivor = survivors.get(fp)
+
+        if survivor is not None:
+            since = survivor.get('last_seen') or survivor['first_ocurrence'] or survivor['event_time']
+            if not when or not since or abs((when - since).total_seconds()) <= window_seconds:
+                survivor['duplicates'] = survivor.get('duplicates', 0) + 1
+                if when and (not since or when > since):
+                    survivor['last_seen'] = when
+                continue
+
+        survivors[fp] = alarm
+        result.append(alarm)
+    return result
+
+
+class SlidingWindowDedup:
+    """Huellas vistas en la ventana, en un anillo de buckets temporales
+
+    Cada bucket cubre window / buckets segundos; al rotar se descarta el bucket
+    más viejo completo, así que la memoria queda acotada a
+    buckets * max_per_bucket huellas.
+    """
+
+    def __init__(self, window_minutes=DEDUP_WINDOW_MINUTES, buckets=DEDUP_BUCKETS,
+                 max_per_bucket=DEDUP_MAX_PER_BUCKET):
+        self.enabled = window_minutes > 0
+        self.bucket_seconds = max(1.0, window_minutes * 60 / buckets)
+        self.max_per_bucket = max_per_bucket
+        self.ring = [(None, {}) for _ in range(buckets)]
+        self.lock = threading.Lock()
+
+    def _current(self, now):
+        index = int(now // self.bucket_seconds)
+        slot = index % len(self.ring)
+        if self.ring[slot][0] != index:
+            self.ring[slot] = (index, {})
+        return index
+
+    def seen(self, fp, now=None):
+        """Registra la huella; retorna cuántas veces se vio antes dentro de la ventana"""
+        if not self.enabled:
+            return 0
+        now = time.time() if now is None else now
+
+        with self.lock:
+            index = self._current(now)
+            for bucket_index, counts in self.ring:
+                if bucket_index is not None and index - bucket_index < len(self.ring) and fp in counts:
+                    counts[fp] += 1
+                    return counts[fp] - 1
+
+            counts = self.ring[index % len(self.ring)][1]
+            if len(counts) < self.max_per_bucket:
+                counts[fp] = 1
+            return 0
+
+    def filter(self, alarms, now=None, scope=''):
+        """Separa las alarmas nuevas de las ya recibidas en requests recientes del mismo ámbito
+
+        Retorna (nuevas, suprimidas).
+        """
+        fresh, suppressed = [], []
+        for alarm in alarms:
+            (suppressed if self.seen(scoped_fingerprint(alarm, scope), now) else fresh).append(alarm)
+        return fresh, suppressed
+
+    def forget(self, alarms, scope=''):
+        """Quita las huellas de las alarmas (p. ej. si el análisis falló y se va a reintentar)"""
+        with self.lock:
+            for alarm in alarms:
+                fp = scoped_fingerprint(alarm, scope)
+                for _, counts in self.ring:
+                    counts.pop(fp, None)
+
+    def reset(self):
+        with self.lock:
+            self.ring = [(None, {}) for _ in self.ring]
+
+
+# Ventana del contenedor Lambda; las huellas se separan por sesión
+recent_alarms = SlidingWindowDedup()
+
+
+def deduplicate(alarms, session_id=''):
+    """Colapsa repeticiones dentro del dump y suprime las ya analizadas recientemente en la sesión
+
+    Otra sesión (otro operador) que pega el mismo dump recibe el análisis
+    completo. Retorna (alarmas sobrevivientes, alarmas suprimidas por
+    requests anteriores).
+    """
+    if not recent_alarms.enabled:
+        return alarms, []
+    return recent_alarms.filter(collapse_duplicates(alarms), scope=session_id)
+
+
+def format_suppressed(suppressed):
+    """Aviso de las alarmas omitidas por repetidas"""
+    total = sum(alarm_weight(alarm) for alarm in suppressed)
+    return (f"🔁 {total} alarmas repetidas omitidas (ya recibidas en los últimos "
+            f"{DEDUP_WINDOW_MINUTES:g} min) — {format_hosts([a['host'] for a in suppressed])}")
@@ -0,0 +1,114 @@
+import io
+import re
+from datetime import datetime
+
+# Columnas del dump de alarmas del monitoreo (se respeta "first_ocurrence" tal cual viene)
+ALARM_COLUMNS = ['node', 'summary', 'first_ocurrence']
+
+_DATE_RE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{2,4})(?:\s+(\d{1,2}):(\d{2})(?::(\d{2}))?)?')
+_EVENT_TIME_RE = re.compile(r'at (\d{1,2}):(\d{2})(?::(\d{2}))? on (\d{1,2}/\d{1,2}/\d{2,4})')
+_HOST_DIGITS_RE = re.compile(r'\d+$')
+
+
+def parse_date(text, day_first=True):
+    """Parsea fechas d/m/Y [H:M[:S]] tolerando valores inválidos (p. ej. 8/87/2025)
+
+    Retorna un datetime o None si la fecha no es válida.
+    """
+    match = _DATE_RE.search(text or '')
+    if not match:
+        return None
+
+    first, second, year, hour, minute, seconds = match.groups()
+    day, month = (first, second) if day_first else (second, first)
+    year = int(year)
+    if year < 100:
+        year += 2000
+
+    try:
+        return datetime(year, int(month), int(day), int(hour or 0), int(minute or 0), int(seconds or 0))
+    except ValueError:
+        return None
+
+
+def parse_event_time(summary):
+    """Extrae la hora del evento embebida en el summary ("at 12:22:00 on 8/8/2025", formato m/d/Y)"""
+    match = _EVENT_TIME_RE.search(summary)
+    if not match:
+        return None, False
+
+    hour, minute, seconds, date = match.groups()
+    parsed = parse_date(f"{date} {hour}:{minute}:{seconds or '00'}", day_first=False)
+    return parsed, parsed is None
+
+
+def short_host(node):
+    """Nombre corto del host (sin dominio)"""
+    return node.split('.')[0].lower()
+
+
+def host_family(node):
+    """Familia del host: nombre corto sin el número final (plwagapp2 -> plwagapp, pesx4559 -> pesx)"""
+    return _HOST_DIGITS_RE.sub('', short_host(node)) or short_host(node)
+
+
+def split_row(line):
+    """Separa una fila del dump por tabs (o por 2+ espacios si se perdieron los tabs al pegar)"""
+    if '\t' in line:
+        return [field.strip() for field in line.split('\t')]
+    return [field.strip() for field in re.split(r'\s{2,}', line)]
+
+
+def iter_alarms(lines):
+    """Parser incremental: consume líneas y genera una alarma por fila válida
+
+    Tolera encabezado ausente o repetido, líneas vacías, columnas de más o de
+    menos y fechas inválidas.
+    """
+    columns = ALARM_COLUMNS
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        fields = split_row(line)
+        lowered = [f.lower() for f in fields]
+        if 'node' in lowered and 'summary' in lowered:
+            columns = lowered
+            continue
+
+        row = dict(zip(columns, fields))
+        node = row.get('node', '')
+        summary = row.get('summary', '')
+        if not node or not summary:
+            continue
+
+        raw_date = row.get('first_ocurrence') or row.get('first_occurrence', '')
+        event_time, malformed = parse_event_time(summary)
+
+        yield {
+            'node': node,
+            'host': short_host(node),
+            'family': host_family(node),
+            'summary': summary,
+            'first_ocurrence': parse_date(raw_date),
+            'first_ocurrence_raw': raw_date,
+            'event_time': event_time,
+            'malformed_date': malformed or (bool(raw_date) and parse_date(raw_date) is None)
+        }
+
+
+def parse_alarm_dump(text):
+    """Parsea un dump completo de alarmas (texto pegado desde el monitoreo)"""
+    return list(iter_alarms(io.StringIO(text)))
+
+
+def is_alarm_dump(text):
+    """Indica si el mensaje parece un dump tabulado de alarmas"""
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    if not lines:
+        return False
+    header = lines[0].lower()
+    if 'node' in header and 'summary' in header:
+        return True
+    return sum(1 for line in lines if line.count('\t') >= 2) >= 2
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import time
+
+from job_store import DONE, ERROR, FINISHED, RUNNING, MemoryJobBackend, get_store, new_job, update_job
+from scheduler import DEFAULT_PRIORITY, PriorityExecutor
+
+logger = logging.getLogger()
+
+# Despacho de los jobs: invocación asíncrona de la misma Lambda o cola local
+JOBS_DISPATCH = os.environ.get(
+    'JOBS_DISPATCH', 'lambda' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'local'
+)
+JOBS_LOCAL_WORKERS = int(os.environ.get('JOBS_LOCAL_WORKERS', '4'))
+JOBS_MAX_WAIT = float(os.environ.get('JOBS_MAX_WAIT', '20'))
+
+# Marca del evento con el que la Lambda se invoca a sí misma para procesar un job
+JOB_EVENT_SOURCE = 'dnoc.async-job'
+
+_local_queue = None
+
+
+def _get_local_queue():
+    global _local_queue
+    if _local_queue is None:
+        _local_queue = PriorityExecutor(max_workers=JOBS_LOCAL_WORKERS)
+    return _local_queue
+
+
+def submit_job(request, work, function_name=None, priority=DEFAULT_PRIORITY):
+    """Registra el job y lo despacha; retorna el registro creado
+
+    work(request) procesa el job en la cola local, que atiende las clases de
+    prioridad con desencolado weighted-fair. En Lambda el job se procesa en una
+    invocación asíncrona (InvocationType=Event) de la misma función, que llega
+    al handler como {'source': JOB_EVENT_SOURCE, 'job_id': ...}; ahí la
+    prioridad se aplica en el control de admisión. Con el store en memoria la
+    otra invocación no vería el job, así que se procesa en la cola local.
+    """
+    job = new_job(request)
+    store = get_store()
+    store.create(job)
+
+    dispatch = JOBS_DISPATCH
+    if dispatch == 'lambda' and isinstance(store, MemoryJobBackend):
+        logger.warning("JOBS_DISPATCH=lambda con JOBS_BACKEND=memory: el job se procesa en la cola local")
+        dispatch = 'local'
+
+    if dispatch == 'lambda' and function_name:
+        from bedrock_clients import get_client
+
+        get_client('lambda').invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps({'source': JOB_EVENT_SOURCE, 'job_id': job['job_id']})
+        )
+    else:
+        _get_local_queue().submit(run_job, job['job_id'], work, priority=priority)
+
+    logger.info(f"Job {job['job_id']} despachado ({dispatch}, prioridad {priority})")
+    return job
+
+
+def is_job_event(event):
+    """Indica si el evento es la invocación asíncrona de un job"""
+    return event.get('source') == JOB_EVENT_SOURCE and 'job_id' in event
+
+
+def run_job(job_id, work):
+    """Procesa el job y guarda el resultado o el error"""
+    job = get_store().get(job_id)
+    if job is None:
+        logger.warning(f"Job {job_id} no encontrado (expiró o no existe)")
+        return None
+    if job['status'] in FINISHED:
+        return job
+
+    update_job(job, status=RUNNING)
+    start = time.monotonic()
+    try:
+        result = work(job['request'])
+        update_job(job, status=DONE, result=result)
+    except Exception as e:
+        logger.error(f"Error procesando job {job_id}: {str(e)}")
+        update_job(job, status=ERROR, error=str(e))
+    logger.info(f"Job {job_id} terminado en {time.monotonic() - start:.1f}s ({job['status']})")
+    return job
+
+
+def wait_job(job_id, wait_seconds=0):
+    """Retorna el job, esperando hasta wait_seconds a que termine (long-poll)"""
+    deadline = time.monotonic() + min(max(0.0, wait_seconds), JOBS_MAX_WAIT)
+    delay = 0.25
+    while True:
+        job = get_store().get(job_id)
+        if job is None or job['status'] in FINISHED or time.monotonic() >= deadline:
+            return job
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        delay = min(delay * 2, 2.0)
+
+
+def job_view(job):
+    """Vista pública del job para el cliente"""
+    view = {'job_id': job['job_id'], 'status': job['status']}
+    if job['status'] == DONE:
+        view.update(job['result'] or {})
+    elif job['status'] == ERROR:
+        view['error'] = job['error']
+    return view
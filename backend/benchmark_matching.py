@@ -0,0 +1,48 @@
+import random
+import time
+
+from lambda_function_mock import INTENT_KEYWORDS, _intent_matcher
+
+# Mensajes representativos del tráfico del mock (con y sin acentos)
+SAMPLE_MESSAGES = [
+    "Tengo un problema de conectividad en la red",
+    "Hay una caída de conexión en el core",
+    "Necesito reiniciar un servicio",
+    "Ayuda con correlación de fallas",
+    "Que equipos hay en la topología de WAG?",
+    "Que es un servicio de WAG?",
+    "plwagapp2 EventLog 6008 The previous system shutdown was unexpected",
+    "hola",
+]
+
+
+def legacy_scan(message):
+    """Búsqueda original: un any(word in message) por intención"""
+    message = message.lower()
+    for intent, words in INTENT_KEYWORDS.items():
+        if any(word in message for word in words):
+            return intent
+    return 'general'
+
+
+def run(label, func, messages):
+    start = time.perf_counter()
+    for message in messages:
+        func(message)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(messages) / elapsed:>12,.0f} req/s  {elapsed / len(messages) * 1e6:8.2f} µs/req")
+
+
+def main(requests=200000):
+    messages = [random.choice(SAMPLE_MESSAGES) for _ in range(requests)]
+    print(f"📊 Benchmark de matching de intenciones ({requests:,} mensajes)")
+    run("any() lineal", legacy_scan, messages)
+    run("acentos + prefijo", _intent_matcher.best, messages)
+
+    print("\nDiferencias de clasificación:")
+    for message in SAMPLE_MESSAGES:
+        print(f"  {message[:45]:<45} {legacy_scan(message):<13} -> {_intent_matcher.best(message) or 'general'}")
+
+
+if __name__ == "__main__":
+    main()
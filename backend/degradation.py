@@ -0,0 +1,55 @@
+import logging
+import os
+
+from alarm_parser import is_alarm_dump
+from deadlines import deadline_scope, get_deadline
+from lambda_function_mock import MOCK_RESPONSES, get_mock_response
+from retrieval_engine import retrieve
+
+logger = logging.getLogger()
+
+# Nivel local (sin Bedrock): segundos del deadline que se reservan para responderlo
+OFFLINE_RESERVE = float(os.environ.get('OFFLINE_RESERVE', '1'))
+# Chunks de la búsqueda local (BM25 + densa) que se incluyen en la respuesta
+OFFLINE_DOCUMENTS = int(os.environ.get('OFFLINE_DOCUMENTS', '3'))
+# Consulta de la búsqueda local para los dumps de alarmas
+ALARM_DUMP_QUERY = 'correlación de fallas causa raíz acciones correctivas'
+
+# Header de las respuestas degradadas (no se guardan para los reintentos)
+DEGRADED_HEADER = 'X-Degraded'
+
+OFFLINE_NOTE = """⚠️ **Respuesta local**: la base de conocimiento y el modelo no están disponibles (sin tiempo o con carga alta).
+Se muestra el análisis local y la documentación local; reintentar en unos minutos para un análisis completo."""
+
+
+def online_scope():
+    """Acota el trabajo con Bedrock al deadline del request menos la reserva del nivel local"""
+    deadline = get_deadline()
+    return deadline_scope(deadline - OFFLINE_RESERVE if deadline is not None else None)
+
+
+def local_documents(query, k=OFFLINE_DOCUMENTS):
+    """Chunks de la documentación local más relevantes para la consulta (motor BM25 + denso)"""
+    try:
+        results = retrieve(query, k)
+    except Exception as e:
+        logger.error(f"Búsqueda local no disponible: {str(e)}")
+        return ''
+    if not results:
+        return ''
+    sections = [f"**{result['heading'] or result['doc_id']}**\n{result['text']}" for result in results]
+    return "📚 **Documentación local:**\n\n" + '\n\n'.join(sections)
+
+
+def offline_answer(message, notes=''):
+    """Respuesta del nivel local: análisis local ya calculado (notes) y documentación local
+
+    La documentación sale de la búsqueda local sobre la KB (para los dumps de
+    alarmas, la de correlación de fallas). Sin resultados se usa el
+    procedimiento por intención del mock.
+    """
+    alarm_dump = is_alarm_dump(message)
+    procedure = local_documents(ALARM_DUMP_QUERY if alarm_dump else message)
+    if not procedure:
+        procedure = MOCK_RESPONSES['correlacion'] if alarm_dump else get_mock_response(message.lower())
+    return '\n\n'.join(part for part in (OFFLINE_NOTE, notes, procedure) if part)
@@ -0,0 +1,265 @@
+import bisect
+import gzip
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+from operator import attrgetter
+
+logger = logging.getLogger()
+
+# Índice de eventos recientes (por contenedor)
+EVENT_BUCKET_SECONDS = int(os.environ.get('EVENT_INDEX_BUCKET_SECONDS', '60'))
+EVENT_MAX_EVENTS = int(os.environ.get('EVENT_INDEX_MAX_EVENTS', '500000'))
+EVENT_RETENTION_HOURS = float(os.environ.get('EVENT_INDEX_RETENTION_HOURS', '24'))
+
+# Snapshot en archivo local (/tmp, EFS o el volumen de un sidecar); vacío lo desactiva
+SNAPSHOT_PATH = os.environ.get('EVENT_INDEX_SNAPSHOT_PATH', '/tmp/event_index.json.gz')
+SNAPSHOT_INTERVAL = float(os.environ.get('EVENT_INDEX_SNAPSHOT_INTERVAL', '60'))
+
+Event = namedtuple('Event', ['ts', 'host', 'signature', 'summary'])
+_event_time = attrgetter('ts')
+
+
+class HostTrie:
+    """Trie de nombres de host para consultas por prefijo (plwag*)
+
+    Cada nodo guarda el conjunto de hosts de su subárbol, así que la consulta
+    por prefijo cuesta sólo el largo del prefijo.
+    """
+
+    def __init__(self):
+        self.root = {'hosts': set(), 'children': {}}
+
+    def add(self, host):
+        node = self.root
+        node['hosts'].add(host)
+        for char in host:
+            node = node['children'].setdefault(char, {'hosts': set(), 'children': {}})
+            node['hosts'].add(host)
+
+    def remove(self, host):
+        node = self.root
+        node['hosts'].discard(host)
+        for char in host:
+            child = node['children'].get(char)
+            if child is None:
+                return
+            child['hosts'].discard(host)
+            # Poda del subárbol que quedó vacío
+            if not child['hosts']:
+                del node['children'][char]
+                return
+            node = child
+
+    def hosts(self, prefix):
+        """Hosts que comienzan con el prefijo"""
+        node = self.root
+        for char in prefix:
+            node = node['children'].get(char)
+            if node is None:
+                return set()
+        return node['hosts']
+
+
+class EventIndex:
+    """Eventos recientes indexados por bucket temporal y por prefijo de host
+
+    Cada host guarda sus eventos ordenados por tiempo, así que una consulta
+    ventana + prefijo es un recorrido del trie más una búsqueda binaria por
+    host. Las consultas sin prefijo recorren sólo los buckets de la ventana.
+    Los buckets más viejos se descartan al superar la retención o la cantidad
+    máxima de eventos.
+    """
+
+    def __init__(self, bucket_seconds=EVENT_BUCKET_SECONDS, max_events=EVENT_MAX_EVENTS,
+                 retention_hours=EVENT_RETENTION_HOURS):
+        self.bucket_seconds = bucket_seconds
+        self.max_events = max_events
+        self.retention_seconds = retention_hours * 3600
+        self.buckets = {}
+        self.by_host = {}
+        self.trie = HostTrie()
+        self.size = 0
+        self.oldest = None
+        self.newest = None
+        self.lock = threading.Lock()
+
+    def add(self, ts, host, signature, summary=''):
+        """Agrega un evento (ts en segundos epoch)"""
+        event = Event(ts, host.lower(), signature, summary)
+        with self.lock:
+            self._insert(event)
+            self._evict()
+
+    def add_alarms(self, alarms):
+        """Agrega las alarmas ya parseadas y correlacionadas (sin hora válida se ignoran)"""
+        with self.lock:
+            for alarm in alarms:
+                when = alarm['first_ocurrence'] or alarm['event_time']
+                if when:
+                    self._insert(Event(when.timestamp(), alarm['host'], alarm.get('signature', ''),
+                                       alarm['summary']))
+            self._evict()
+
+    def _insert(self, event):
+        key = int(event.ts // self.bucket_seconds)
+        bucket = self.buckets.setdefault(key, [])
+        if bucket and event.ts < bucket[-1].ts:
+            bisect.insort(bucket, event, key=_event_time)
+        else:
+            bucket.append(event)
+        self.newest = key if self.newest is None else max(self.newest, key)
+        self.oldest = key if self.oldest is None else min(self.oldest, key)
+        events = self.by_host.get(event.host)
+        if events is None:
+            events = self.by_host[event.host] = []
+            self.trie.add(event.host)
+        if events and event.ts < events[-1].ts:
+            bisect.insort(events, event, key=_event_time)
+        else:
+            events.append(event)
+        self.size += 1
+
+    def _evict(self):
+        if not self.buckets:
+            return
+        horizon = int((self.newest * self.bucket_seconds - self.retention_seconds) // self.bucket_seconds)
+        while self.buckets and (self.size > self.max_events or self.oldest < horizon):
+            expired = self.buckets.pop(self.oldest)
+            cutoff = (self.oldest + 1) * self.bucket_seconds
+            for host in {event.host for event in expired}:
+                events = self.by_host[host]
+                del events[:bisect.bisect_left(events, cutoff, key=_event_time)]
+                if not events:
+                    del self.by_host[host]
+                    self.trie.remove(host)
+            self.size -= len(expired)
+            self.oldest = min(self.buckets) if self.buckets else None
+            if self.oldest is None:
+                self.newest = None
+
+    def query(self, start, end, prefix=None):
+        """Eventos con start <= ts <= end, opcionalmente de hosts con el prefijo, ordenados por tiempo"""
+        with self.lock:
+            if not self.buckets:
+                return []
+            first = max(int(start // self.bucket_seconds), self.oldest)
+            last = min(int(end // self.bucket_seconds), self.newest)
+            if prefix is None:
+                return self._scan_buckets(first, last, start, end)
+
+            hosts = self.trie.hosts(prefix.lower().rstrip('*'))
+            in_window = sum(len(self.buckets.get(key, ())) for key in range(first, last + 1))
+            # Con muchos hosts bajo el prefijo conviene filtrar los buckets de la ventana
+            if len(hosts) * 4 > in_window:
+                return [e for e in self._scan_buckets(first, last, start, end) if e.host in hosts]
+
+            ranges = []
+            for host in hosts:
+                events = self.by_host[host]
+                lo = bisect.bisect_left(events, start, key=_event_time)
+                hi = bisect.bisect_right(events, end, key=_event_time)
+                if lo < hi:
+                    ranges.append(events[lo:hi])
+            return list(heapq.merge(*ranges, key=_event_time))
+
+    def _scan_buckets(self, first, last, start, end):
+        # Cada bucket está ordenado y los buckets son consecutivos: no hace falta reordenar
+        found = []
+        for key in range(first, last + 1):
+            bucket = self.buckets.get(key)
+            if not bucket:
+                continue
+            if first < key < last:
+                found.extend(bucket)
+            else:
+                found.extend(bucket[bisect.bisect_left(bucket, start, key=_event_time):
+                                    bisect.bisect_right(bucket, end, key=_event_time)])
+        return found
+
+    def around(self, ts, minutes, prefix=None):
+        """Eventos dentro de ±minutes alrededor de ts"""
+        return self.query(ts - minutes * 60, ts + minutes * 60, prefix)
+
+    def __len__(self):
+        return self.size
+
+    def snapshot(self, path=SNAPSHOT_PATH):
+        """Escribe el índice a un archivo local (escritura atómica)"""
+        with self.lock:
+            events = [list(e) for bucket in self.buckets.values() for e in bucket]
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+            json.dump({'bucket_seconds': self.bucket_seconds, 'events': events}, f)
+        os.replace(tmp_path, path)
+        return len(events)
+
+    def restore(self, path=SNAPSHOT_PATH):
+        """Carga los eventos de un snapshot; retorna la cantidad cargada"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        events = sorted((Event(*e) for e in data['events']), key=_event_time)
+        with self.lock:
+            for event in events:
+                self._insert(event)
+            self._evict()
+        return len(events)
+
+
+# Índice compartido por el contenedor; se restaura del snapshot en el cold start
+event_index = EventIndex()
+_last_snapshot = time.monotonic()
+_snapshot_lock = threading.Lock()
+
+if SNAPSHOT_PATH and os.path.exists(SNAPSHOT_PATH):
+    try:
+        logger.info(f"Índice de eventos restaurado: {event_index.restore(SNAPSHOT_PATH)} eventos")
+    except Exception as e:
+        logger.warning(f"No se pudo restaurar el índice de eventos: {e}")
+
+
+def maybe_snapshot():
+    """Guarda el snapshot en segundo plano si pasó el intervalo configurado"""
+    global _last_snapshot
+    if not SNAPSHOT_PATH or time.monotonic() - _last_snapshot < SNAPSHOT_INTERVAL:
+        return
+    _last_snapshot = time.monotonic()
+    threading.Thread(target=_write_snapshot, daemon=True).start()
+
+
+def _write_snapshot():
+    # La escritura es atómica: si el contenedor se congela a mitad, queda el snapshot anterior
+    if not _snapshot_lock.acquire(blocking=False):
+        return
+    try:
+        event_index.snapshot(SNAPSHOT_PATH)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el snapshot del índice de eventos: {e}")
+    finally:
+        _snapshot_lock.release()
+
+
+def related_context(clusters, window_minutes):
+    """Eventos previos del índice en las mismas familias y ventana que los clusters
+
+    Se consulta antes de indexar el dump actual, así que sólo aparecen
+    alarmas de requests anteriores.
+    """
+    lines = []
+    for family in sorted({f for cluster in clusters for f in cluster['families']}):
+        times = [t for c in clusters if family in c['families'] for t in (c['first'], c['last']) if t]
+        if not times:
+            continue
+        start = min(times).timestamp() - window_minutes * 60
+        end = max(times).timestamp() + window_minutes * 60
+        counts = Counter(event.signature for event in event_index.query(start, end, family))
+        if counts:
+            summary = ', '.join(f"{signature} x{count}" for signature, count in counts.most_common(5))
+            lines.append(f"- {family}*: {summary}")
+    if not lines:
+        return ''
+    return f"Alarmas previas en las mismas familias (±{window_minutes} min):\n" + '\n'.join(lines)
@@ -0,0 +1,91 @@
+import logging
+import os
+import time
+
+from degradation import DEGRADED_HEADER
+from job_store import DONE, ERROR, RUNNING, get_store, new_job, update_job
+
+logger = logging.getLogger()
+
+# Idempotency keys del cliente (header Idempotency-Key o campo idempotency_key del body)
+IDEMPOTENCY_WAIT = float(os.environ.get('IDEMPOTENCY_WAIT', '25'))  # por debajo del corte de API Gateway
+IDEMPOTENCY_STALE = float(os.environ.get('IDEMPOTENCY_STALE', '300'))  # request original sin terminar: abandonado
+IDEMPOTENCY_RETRY_AFTER = int(os.environ.get('IDEMPOTENCY_RETRY_AFTER', '5'))
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+# Los registros comparten el store de jobs (con su TTL) con otro prefijo de id
+IDEMPOTENCY_PREFIX = 'idem:'
+IDEMPOTENCY_HEADER = 'idempotency-key'
+
+# Respuestas que se guardan para los reintentos (los errores y las respuestas
+# degradadas del nivel local se vuelven a procesar)
+STORED_STATUS_CODES = (200, 202)
+
+
+def idempotency_key(event, body):
+    """Idempotency key del request (None si el cliente no envió una válida)"""
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    key = headers.get(IDEMPOTENCY_HEADER) or body.get('idempotency_key')
+    if not isinstance(key, str) or not key.strip() or len(key) > IDEMPOTENCY_MAX_KEY_LENGTH:
+        return None
+    return key.strip()
+
+
+def begin_request(key, fingerprint):
+    """Registra el request original; retorna (registro propio, None) o (None, registro existente)
+
+    Un registro existente con error o abandonado se reemplaza: el reintento
+    vuelve a procesar el mensaje. Si el store falla (tabla inexistente, sin
+    permisos) se retorna un registro desacoplado: el request se procesa sin
+    deduplicar reintentos en vez de fallar.
+    """
+    record = new_job({'fingerprint': fingerprint}, job_id=IDEMPOTENCY_PREFIX + key)
+    record['status'] = RUNNING
+    try:
+        store = get_store()
+        if store.create(record):
+            return record, None
+
+        existing = store.get(record['job_id'])
+        if existing is None or existing['status'] == ERROR or \
+                (existing['status'] == RUNNING and time.time() - existing['created_at'] > IDEMPOTENCY_STALE):
+            store.put(record)
+            return record, None
+    except Exception as e:
+        logger.error(f"Store de jobs no disponible, request sin idempotencia: {type(e).__name__}: {str(e)}")
+        record['detached'] = True
+        return record, None
+    return None, existing
+
+
+def wait_request(key, wait_seconds=IDEMPOTENCY_WAIT):
+    """Espera a que el request original termine; retorna su registro (puede seguir en curso)"""
+    deadline = time.monotonic() + wait_seconds
+    delay = 0.25
+    while True:
+        try:
+            record = get_store().get(IDEMPOTENCY_PREFIX + key)
+        except Exception as e:
+            logger.error(f"Store de jobs no disponible esperando el request original: {type(e).__name__}: {str(e)}")
+            return None
+        if record is None or record['status'] != RUNNING:
+            return record
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return record
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 2.0)
+
+
+def complete_request(record, response):
+    """Guarda la respuesta para los reintentos con la misma key (solo si fue exitosa)"""
+    if record.get('detached'):
+        return
+    try:
+        if response is not None and response['statusCode'] in STORED_STATUS_CODES and \
+                not response['headers'].get(DEGRADED_HEADER):
+            update_job(record, status=DONE, result=response)
+        else:
+            update_job(record, status=ERROR, error=f"status {response['statusCode'] if response else None}")
+    except Exception as e:
+        logger.error(f"No se pudo guardar la respuesta de la key {record['job_id']}: {type(e).__name__}: {str(e)}")
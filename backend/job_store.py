@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger()
+
+# Store de jobs asíncronos (variables de entorno de Lambda)
+# En Lambda el default es dynamodb: el job se procesa en otra invocación (otro contenedor)
+JOBS_BACKEND = os.environ.get(
+    'JOBS_BACKEND', 'dynamodb' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'memory'
+)  # memory | sqlite | dynamodb
+JOBS_TTL = int(os.environ.get('JOBS_TTL', '3600'))
+JOBS_SQLITE_PATH = os.environ.get('JOBS_SQLITE_PATH', '/tmp/dnoc_jobs.db')
+JOBS_TABLE = os.environ.get('JOBS_TABLE', 'dnoc-jobs')
+DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT')
+
+# Estados de un job
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+FINISHED = (DONE, ERROR)
+
+
+def new_job(request, job_id=None):
+    """Registro de un job nuevo para el request indicado"""
+    now = time.time()
+    return {
+        'job_id': job_id or str(uuid.uuid4()),
+        'status': PENDING,
+        'request': request,
+        'result': None,
+        'error': None,
+        'created_at': now,
+        'updated_at': now
+    }
+
+
+class MemoryJobBackend:
+    """Backend en memoria del proceso (pruebas y ejecución local)"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job and time.time() - job['updated_at'] > JOBS_TTL:
+                del self.jobs[job_id]
+                return None
+            return dict(job) if job else None
+
+    def create(self, job):
+        """Guarda el job si no existe; retorna False si ya había uno con ese id"""
+        with self.lock:
+            existing = self.jobs.get(job['job_id'])
+            if existing and time.time() - existing['updated_at'] <= JOBS_TTL:
+                return False
+            self.jobs[job['job_id']] = dict(job)
+            return True
+
+    def put(self, job):
+        with self.lock:
+            self.jobs[job['job_id']] = dict(job)
+            expired = [k for k, v in self.jobs.items() if time.time() - v['updated_at'] > JOBS_TTL]
+            for key in expired:
+                del self.jobs[key]
+
+
+class SQLiteJobBackend:
+    """Backend durable en archivo SQLite"""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data TEXT, updated_at REAL)')
+        self.conn.commit()
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT data FROM jobs WHERE job_id = ? AND updated_at >= ?', (job_id, time.time() - JOBS_TTL)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create(self, job):
+        with self.lock:
+            self.conn.execute('DELETE FROM jobs WHERE updated_at < ?', (time.time() - JOBS_TTL,))
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO jobs VALUES (?, ?, ?)', (job['job_id'], json.dumps(job), job['updated_at'])
+            )
+            self.conn.commit()
+            return cursor.rowcount == 1
+
+    def put(self, job):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)', (job['job_id'], json.dumps(job), job['updated_at'])
+            )
+            self.conn.commit()
+
+
+class DynamoDBJobBackend:
+    """Backend DynamoDB (o DynamoDB Local vía DYNAMODB_ENDPOINT) con TTL nativo"""
+
+    def __init__(self, table_name, endpoint_url=None):
+        import boto3
+
+        self.table = boto3.resource('dynamodb', endpoint_url=endpoint_url).Table(table_name)
+
+    def get(self, job_id):
+        item = self.table.get_item(Key={'job_id': job_id}, ConsistentRead=True).get('Item')
+        if not item or int(item['expires_at']) < time.time():
+            return None
+        return json.loads(item['data'])
+
+    def create(self, job):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.table.put_item(
+                Item=self._item(job),
+                ConditionExpression='attribute_not_exists(job_id) OR expires_at < :now',
+                ExpressionAttributeValues={':now': int(time.time())}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def put(self, job):
+        self.table.put_item(Item=self._item(job))
+
+    @staticmethod
+    def _item(job):
+        return {
+            'job_id': job['job_id'],
+            'data': json.dumps(job),
+            'expires_at': int(job['updated_at'] + JOBS_TTL)
+        }
+
+
+def create_backend(name=JOBS_BACKEND):
+    """Crea el backend configurado"""
+    if name == 'sqlite':
+        return SQLiteJobBackend(JOBS_SQLITE_PATH)
+    if name == 'dynamodb':
+        return DynamoDBJobBackend(JOBS_TABLE, DYNAMODB_ENDPOINT)
+    return MemoryJobBackend()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Retorna el store de jobs compartido (creado una vez por contenedor)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_backend()
+    return _store
+
+
+def set_store(store):
+    """Reemplaza el store de jobs (pruebas o configuración local)"""
+    global _store
+    _store = store
+
+
+def update_job(job, **fields):
+    """Actualiza campos del job y lo persiste"""
+    job.update(fields, updated_at=time.time())
+    get_store().put(job)
+    return job
@@ -1,11 +1,37 @@
+import itertools
 import json
+import math
 import os
 import logging
 import sys
+import time
+import uuid
 
 # Agregar directorio bedrock-agent al path
 sys.path.append('/opt/python')
 sys.path.append(os.path.join(os.path.dirname(__file__), 'bedrock-agent'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bedrock-agent'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'knowledge-base'))
+
+from admission import ADMISSION_BUSY_RETRY_AFTER, ADMISSION_JOB_WAIT, AdmissionRejected, admission
+from alarm_correlator import CORRELATION_WINDOW_MINUTES, build_alarm_prompt, correlate
+from alarm_dedup import deduplicate, format_suppressed, recent_alarms
+from alarm_parser import is_alarm_dump, parse_alarm_dump
+from async_jobs import is_job_event, job_view, run_job, submit_job, wait_job
+from bedrock_clients import is_throttling_error
+from deadlines import budget, deadline_scope, expired
+from degradation import DEGRADED_HEADER, offline_answer, online_scope
+from event_index import event_index, maybe_snapshot, related_context
+from idempotency import (IDEMPOTENCY_RETRY_AFTER, IDEMPOTENCY_WAIT, begin_request, complete_request,
+                         idempotency_key, wait_request)
+from job_store import DONE, RUNNING
+from root_cause import format_ranking, rank_root_causes
+from scheduler import request_priority
+from signature_registry import format_runbooks, split_known
+from single_flight import (SINGLE_FLIGHT, SINGLE_FLIGHT_JOB_WAIT, SINGLE_FLIGHT_WAIT, claim_flight,
+                           finish_flight, request_fingerprint, wait_flight)
+from storm_mode import STORM_DEADLINE, analyze_storm, is_storm
+from topology import answer_lookup, is_pure_lookup, topology_context
 
 # Configurar logging
 logger = logging.getLogger()
@@ -14,18 +40,363 @@ logger.setLevel(logging.INFO)
 # Log de inicio
 logger.info("Lambda function iniciada con Strands Agent")
 
+# Deadlines: corte de API Gateway y margen para serializar y devolver la respuesta
+API_GATEWAY_TIMEOUT = float(os.environ.get('API_GATEWAY_TIMEOUT', '29'))
+DEADLINE_MARGIN = float(os.environ.get('DEADLINE_MARGIN', '0.5'))
+DEADLINE_HEADER = 'x-request-deadline'  # deadline absoluto del cliente, epoch en milisegundos
+
 try:
-    from claude_agent import process_message
+    from claude_agent import (get_response_metadata, invoke_prompt, process_message, record_shared_answer,
+                              session_has_context, stream_message)
     logger.info("Claude agent importado exitosamente")
 except ImportError as e:
     logger.error(f"Error importando claude_agent: {e}")
     process_message = None
+    stream_message = None
+    get_response_metadata = None
+    invoke_prompt = None
+    session_has_context = None
+    record_shared_answer = None
+
+def sse_event(event, data):
+    """Formatea un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def iter_sse_events(message, session_id, cacheable=True, prefix=''):
+    """Genera la respuesta del agente como eventos SSE (token, done, error)
+
+    prefix (p. ej. procedimientos de firmas conocidas) se envía como primer token.
+    """
+    start = time.monotonic()
+    first_token_ms = None
+    sent = 0
+
+    try:
+        tokens = stream_message(message, session_id, cacheable)
+        if prefix:
+            tokens = itertools.chain([prefix + '\n\n'], tokens)
+        for text in tokens:
+            if first_token_ms is None:
+                first_token_ms = int((time.monotonic() - start) * 1000)
+                logger.info(f"Time to first token: {first_token_ms}ms")
+            sent += 1
+            yield sse_event('token', {'text': text})
+
+        yield sse_event('done', {
+            'session_id': session_id,
+            'ttft_ms': first_token_ms,
+            'total_ms': int((time.monotonic() - start) * 1000),
+            'metadata': get_response_metadata()
+        })
+    except Exception as e:
+        # Falla antes del primer token del agente: el handler responde con el nivel
+        # local en vez de un stream fallido
+        if sent <= (1 if prefix else 0):
+            raise
+        logger.error(f"Error en streaming: {str(e)}")
+        yield sse_event('error', {'error': f'Error interno: {str(e)}'})
+
+def stream_response(message, session_id, cacheable=True, prefix=''):
+    """Retorna la respuesta con formato SSE (text/event-stream)
+
+    Solo es el formato: el runtime de Python no tiene response streaming, así
+    que el cuerpo se arma completo antes de responder y el cliente no recibe
+    el primer token antes. ttft_ms es el time-to-first-token del lado del
+    servidor (llegada del primer fragmento de Bedrock).
+    """
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': ''.join(iter_sse_events(message, session_id, cacheable, prefix))
+    }
+
+def report_response(report, session_id, stream=False, metadata=None):
+    """Retorna un reporte ya armado (modo tormenta, firmas conocidas) como JSON o como un único evento SSE"""
+    if stream:
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'text/event-stream',
+                'Cache-Control': 'no-cache',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': sse_event('token', {'text': report}) + sse_event('done', {
+                'session_id': session_id,
+                'metadata': metadata
+            })
+        }
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({
+            'response': report,
+            'session_id': session_id,
+            'metadata': metadata
+        })
+    }
+
+def json_response(status_code, payload):
+    """Respuesta HTTP JSON con CORS"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(payload)
+    }
+
+def response_payload(response):
+    """Texto y metadata de una respuesta exitosa (JSON o SSE), para compartirla; None si falló"""
+    if response['statusCode'] != 200:
+        return None
+    if response['headers'].get('Content-Type') != 'text/event-stream':
+        payload = json.loads(response['body'])
+        return {'response': payload['response'], 'metadata': payload.get('metadata')}
+    
+    text, metadata = [], None
+    for block in response['body'].split('\n\n'):
+        if not block.startswith('event: '):
+            continue
+        header, data = block.split('\n', 1)
+        event, data = header[len('event: '):], json.loads(data[len('data: '):])
+        if event == 'token':
+            text.append(data['text'])
+        elif event == 'done':
+            metadata = data.get('metadata')
+        elif event == 'error':
+            return None
+    return {'response': ''.join(text), 'metadata': metadata}
+
+def flight_key(body):
+    """Huella para coalescer el request con otros idénticos en curso (None: no se coalesce)
+
+    Los dumps se comparten entre sesiones; las preguntas solo si la sesión no
+    tiene historial, porque si no la respuesta depende de la conversación.
+    """
+    message = body.get('message', '')
+    if not SINGLE_FLIGHT or not message.strip():
+        return None
+    scope = ''
+    session_id = body.get('session_id')
+    if not is_alarm_dump(message) and session_id and (session_has_context is None or session_has_context(session_id)):
+        scope = session_id
+    return request_fingerprint(message, scope)
+
+def coalesced_chat(body, wait_seconds=SINGLE_FLIGHT_WAIT):
+    """Procesa el mensaje una sola vez entre requests idénticos concurrentes (single-flight)
+
+    El primero (líder) llama al modelo; los demás esperan su resultado hasta
+    wait_seconds y lo reciben con su propio session_id. Si el líder falla o
+    tarda demasiado, el request se procesa por su cuenta.
+    """
+    key = flight_key(body)
+    if key is None:
+        return handle_chat(body)
+    
+    session_id = body.get('session_id') or str(uuid.uuid4())
+    flight = claim_flight(key, session_id)
+    if flight is None:
+        logger.info(f"Request idéntico en curso, esperando su resultado ({key})")
+        shared = wait_flight(key, budget(wait_seconds))
+        if shared is None:
+            logger.info("El request en curso falló o tardó demasiado, procesando por separado")
+            return handle_chat(body)
+        result = shared['result']
+        if record_shared_answer is not None and shared['request'].get('session_id') != session_id:
+            record_shared_answer(session_id, body['message'], result['response'])
+        return report_response(result['response'], session_id, bool(body.get('stream')),
+                               {**(result['metadata'] or {}), 'coalesced': True})
+    
+    response = None
+    try:
+        response = handle_chat(dict(body, session_id=session_id))
+        return response
+    finally:
+        finish_flight(flight, response_payload(response) if response else None)
+
+def too_many_requests(retry_after):
+    """429 con Retry-After: el cliente reintenta en vez de esperar un fallo lento"""
+    retry_after = max(1, math.ceil(retry_after))
+    response = json_response(429, {
+        'error': 'Demasiadas solicitudes al modelo, reintente en unos segundos',
+        'retry_after': retry_after
+    })
+    response['headers']['Retry-After'] = str(retry_after)
+    return response
+
+def admitted_call(session_id, call, priority):
+    """Ejecuta call() (que llama al modelo) si el control de admisión lo permite; si no, AdmissionRejected"""
+    ticket, retry_after = admission.admit(session_id, priority)
+    if ticket is None:
+        logger.warning(f"Request '{priority}' rechazado por control de admisión (reintentar en "
+                       f"{retry_after:.1f}s): {json.dumps(admission.status())}")
+        raise AdmissionRejected(retry_after)
+    
+    throttled = False
+    try:
+        # Se deja la reserva del deadline para responder con el nivel local si Bedrock no llega
+        with online_scope():
+            return call()
+    except Exception as e:
+        throttled = is_throttling_error(e)
+        raise
+    finally:
+        admission.release(ticket, throttled)
+
+def run_chat_job(request):
+    """Procesa un job de chat asíncrono; retorna el payload de la respuesta
+
+    Un job rechazado por el control de admisión (o con throttling) espera y
+    reintenta (hasta ADMISSION_JOB_WAIT segundos) en vez de recibir la
+    respuesta del nivel local. El deadline del cliente (deadline_ms) acota el
+    job igual que al request sincrónico.
+    """
+    client_deadline = request['deadline_ms'] / 1000 if request.get('deadline_ms') else None
+    with deadline_scope(client_deadline):
+        deadline = time.monotonic() + budget(ADMISSION_JOB_WAIT)
+        while True:
+            response = coalesced_chat(dict(request, stream=False, offline_on_reject=False), SINGLE_FLIGHT_JOB_WAIT)
+            remaining = deadline - time.monotonic()
+            if response['statusCode'] != 429 or remaining <= 0:
+                break
+            time.sleep(min(float(response['headers']['Retry-After']), remaining))
+    payload = json.loads(response['body'])
+    if response['statusCode'] != 200:
+        raise Exception(payload.get('error', f"status {response['statusCode']}"))
+    return payload
+
+def submit_chat_job(body, context):
+    """Encola el mensaje como job y responde de inmediato con su job_id (202)"""
+    request = {key: value for key, value in body.items() if key != 'async'}
+    request['session_id'] = body.get('session_id') or str(uuid.uuid4())
+    request['priority'] = request_priority(body.get('message', ''), body.get('priority'))
+    job = submit_job(request, run_chat_job, getattr(context, 'function_name', None), request['priority'])
+    return json_response(202, {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'session_id': request['session_id']
+    })
+
+def request_deadline(event, context):
+    """Deadline absoluto del request (epoch en segundos): lo primero entre el deadline
+    del cliente, el corte de API Gateway y el tiempo que le queda a la Lambda"""
+    now = time.time()
+    candidates = []
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    try:
+        if headers.get(DEADLINE_HEADER):
+            candidates.append(float(headers[DEADLINE_HEADER]) / 1000)
+    except ValueError:
+        logger.warning(f"Header {DEADLINE_HEADER} inválido: {headers[DEADLINE_HEADER]}")
+    if 'httpMethod' in event:
+        candidates.append(now + API_GATEWAY_TIMEOUT)
+    if hasattr(context, 'get_remaining_time_in_millis'):
+        candidates.append(now + context.get_remaining_time_in_millis() / 1000)
+    return min(candidates) - DEADLINE_MARGIN if candidates else None
+
+def degraded_response(message, session_id, stream, notes, error, retry_after=None):
+    """Respuesta del nivel local cuando cache, KB y modelo directo fallan, se quedan sin
+    tiempo o no se pueden usar (throttling, control de admisión)
+
+    Con retry_after se informa Retry-After para que el cliente pueda pedir el
+    análisis completo más tarde.
+    """
+    logger.warning(f"Respondiendo con el nivel local ({type(error).__name__}): {str(error)}")
+    metadata = {'tier': 'offline', 'degraded': True, 'reason': type(error).__name__}
+    response = report_response(offline_answer(message, notes), session_id, stream, metadata)
+    response['headers'][DEGRADED_HEADER] = 'true'
+    if retry_after is not None:
+        response['headers']['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def deadline_response():
+    """504: el request se quedó sin tiempo y se cortó el trabajo pendiente"""
+    return json_response(504, {'error': 'Tiempo del request agotado'})
+
+def get_job_response(event):
+    """GET /jobs/{job_id}[?wait=N]: estado del job, esperando hasta N segundos a que termine"""
+    job_id = (event.get('pathParameters') or {}).get('job_id')
+    try:
+        wait = float((event.get('queryStringParameters') or {}).get('wait') or 0)
+    except (TypeError, ValueError):
+        return json_response(400, {'error': 'Parámetro wait inválido'})
+    if not math.isfinite(wait):
+        return json_response(400, {'error': 'Parámetro wait inválido'})
+    # Se acota a [0, tiempo restante del request]
+    wait = budget(max(0.0, wait))
+    # Los ids con prefijo (vuelos, idempotency keys) son registros internos del store
+    job = wait_job(job_id, wait) if job_id and ':' not in job_id else None
+    if job is None:
+        return json_response(404, {'error': 'Job no encontrado'})
+    return json_response(200, job_view(job))
+
+def idempotent_response(key, body, context):
+    """Procesa un request con idempotency key; los reintentos reciben la respuesta del original
+
+    Un reintento mientras el original sigue en curso espera su resultado hasta
+    IDEMPOTENCY_WAIT segundos; si no termina responde 409 con Retry-After para
+    que el cliente reintente con la misma key. La key reusada con otro mensaje
+    se rechaza (422).
+    """
+    fingerprint = request_fingerprint(body.get('message', ''), f"{bool(body.get('stream'))}|{bool(body.get('async'))}")
+    record, existing = begin_request(key, fingerprint)
+    if record is None:
+        if existing['request']['fingerprint'] != fingerprint:
+            return json_response(422, {'error': 'Idempotency-Key ya usada con otro request'})
+        logger.info(f"Reintento con idempotency key {key} ({existing['status']})")
+        if existing['status'] == RUNNING:
+            existing = wait_request(key, budget(IDEMPOTENCY_WAIT))
+        if existing is not None and existing['status'] == DONE:
+            response = existing['result']
+            response['headers'] = {**response['headers'], 'Idempotent-Replayed': 'true'}
+            return response
+        if existing is not None and existing['status'] == RUNNING:
+            response = json_response(409, {'error': 'Request original en curso, reintente con la misma Idempotency-Key'})
+            response['headers']['Retry-After'] = str(IDEMPOTENCY_RETRY_AFTER)
+            return response
+        # El original falló mientras se esperaba: este reintento lo vuelve a procesar
+        record, existing = begin_request(key, fingerprint)
+        if record is None:
+            return idempotent_response(key, body, context)
+    
+    response = None
+    try:
+        response = submit_chat_job(body, context) if body.get('async') else coalesced_chat(body)
+        return response
+    finally:
+        complete_request(record, response)
 
 def lambda_handler(event, context):
     """Handler principal de Lambda"""
     
     logger.info(f"Evento recibido: {json.dumps(event)}")
     
+    # Todo el trabajo del request (y cada llamada a Bedrock) se acota a su deadline
+    with deadline_scope(request_deadline(event, context)):
+        if expired():
+            logger.warning("Request recibido con el deadline ya vencido")
+            return deadline_response()
+        return route_request(event, context)
+
+def route_request(event, context):
+    """Despacha el evento: job asíncrono, consulta de job o mensaje de chat"""
+    # Invocación asíncrona de la propia función: procesar un job encolado
+    if is_job_event(event):
+        job = run_job(event['job_id'], run_chat_job)
+        return {'job_id': event['job_id'], 'status': job['status'] if job else None}
+    
+    # GET /jobs/{job_id}: consulta (o long-poll) de un job asíncrono
+    if event.get('httpMethod') == 'GET':
+        return get_job_response(event)
+    
     try:
         # Parsear el body del request
         logger.info("Parseando body del request")
@@ -35,11 +406,92 @@ def lambda_handler(event, context):
         else:
             body = event.get('body', {})
             logger.info(f"Body directo: {body}")
-        
+    except Exception as e:
+        logger.error(f"Error parseando el body: {str(e)}")
+        return json_response(400, {'error': 'Body inválido'})
+    
+    # Reintentos del cliente: se enganchan al resultado del request original
+    key = idempotency_key(event, body)
+    if key:
+        return idempotent_response(key, body, context)
+    
+    # Modo asíncrono: el análisis sigue en segundo plano y el cliente consulta /jobs/{job_id}
+    if body.get('async'):
+        logger.info("Encolando request como job asíncrono")
+        return submit_chat_job(body, context)
+    
+    return coalesced_chat(body)
+
+def handle_chat(body):
+    """Procesa un mensaje de chat y retorna la respuesta HTTP"""
+    alarms = []
+    # Sin session_id se abre una conversación nueva
+    session_id = body.get('session_id') or str(uuid.uuid4())
+    stream = bool(body.get('stream'))
+    # Análisis local del dump: se incluye en la respuesta del nivel local si Bedrock falla
+    local_notes = ''
+    
+    try:
         message = body.get('message', '')
-        session_id = body.get('session_id', 'default-session')
+        # Prioridad pedida por el cliente; los dumps de alarmas siempre son 'alert'
+        priority = request_priority(message, body.get('priority'))
+        
+        logger.info(f"Mensaje: {message}, Session ID: {session_id}, prioridad: {priority}")
         
-        logger.info(f"Mensaje: {message}, Session ID: {session_id}")
+        # Dumps de alarmas: parsear y correlacionar antes de llamar al modelo
+        cacheable = True
+        prefix = ''
+        if is_alarm_dump(message):
+            cacheable = False
+            
+            # Repeticiones: se colapsan en el dump y se omiten las ya recibidas
+            alarms, suppressed = deduplicate(parse_alarm_dump(message), session_id)
+            notes = [format_suppressed(suppressed)] if suppressed else []
+            if suppressed:
+                logger.info(f"Alarmas repetidas omitidas: {len(suppressed)}")
+                if not alarms:
+                    return report_response(notes[0], session_id, stream, {'deduplicated': True})
+            clusters = correlate(alarms)
+            
+            # Alarmas previas de las mismas familias (índice del contenedor) y luego
+            # se indexa el dump actual para los próximos requests
+            history = related_context(clusters, CORRELATION_WINDOW_MINUTES)
+            event_index.add_alarms(alarms)
+            maybe_snapshot()
+            
+            # Ranking local de causa raíz (topología + orden temporal)
+            ranking = format_ranking(rank_root_causes(clusters))
+            if ranking:
+                notes.append(ranking)
+            
+            # Firmas conocidas: procedimiento directo, sin llamar al modelo
+            known, clusters = split_known(clusters)
+            if known:
+                notes.append(format_runbooks(known))
+                logger.info(f"Firmas conocidas: {list(known)}; {len(clusters)} grupos van al modelo")
+                if not clusters:
+                    return report_response('\n\n'.join(notes), session_id, stream, {'fast_path': True})
+            prefix = '\n\n'.join(notes)
+            local_notes = '\n\n'.join(part for part in (prefix, history) if part)
+            
+            # Tormenta de alarmas: un análisis acotado por cluster, en paralelo
+            unknown = [alarm for cluster in clusters for alarm in cluster['alarms']]
+            if invoke_prompt is not None and is_storm(unknown, clusters):
+                return admitted_call(session_id, lambda: storm_response(clusters, session_id, stream, prefix),
+                                     priority)
+            
+            message, alarm_stats = build_alarm_prompt(message, unknown, clusters)
+            topology = topology_context(alarm['host'] for alarm in alarms)
+            message = '\n'.join(part for part in (message, topology, ranking, history) if part)
+            logger.info(f"Dump de alarmas correlacionado: {json.dumps(alarm_stats)}")
+        else:
+            # Consultas puras de topología: se responden desde el inventario; en una
+            # pregunta de diagnóstico la topología va al prompt como contexto
+            lookup = answer_lookup(message)
+            if lookup and is_pure_lookup(message):
+                return report_response(lookup, session_id, stream, {'topology_lookup': True})
+            if lookup:
+                message = f"{message}\n\nTopología del inventario:\n{lookup}"
         
         if not message:
             logger.warning("Mensaje vacío recibido")
@@ -59,26 +511,33 @@ def lambda_handler(event, context):
         if process_message is None:
             raise Exception("Claude agent no disponible")
         
-        response = process_message(message, session_id)
-        logger.info(f"Respuesta del agente: {response[:100]}...")  # Primeros 100 chars
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'response': response,
-                'session_id': session_id
-            })
-        }
+        return admitted_call(session_id, lambda: agent_response(message, session_id, cacheable, stream, prefix),
+                             priority)
         
     except Exception as e:
-        logger.error(f"Error en lambda_handler: {str(e)}")
+        logger.error(f"Error en handle_chat: {str(e)}")
         logger.error(f"Tipo de error: {type(e).__name__}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        # Las alarmas no analizadas no deben quedar como repetidas en el reintento
+        recent_alarms.forget(alarms, session_id)
+        retry_after = None
+        if isinstance(e, AdmissionRejected):
+            retry_after = e.retry_after
+        elif is_throttling_error(e):
+            retry_after = ADMISSION_BUSY_RETRY_AFTER
+        else:
+            import traceback
+            logger.error(f"Traceback: {traceback.format_exc()}")
+        # Los jobs asíncronos esperan y reintentan en vez de recibir el nivel local
+        if retry_after is not None and body.get('offline_on_reject') is False:
+            return too_many_requests(retry_after)
+        # Bedrock caído, sin tiempo o con carga alta: el operador recibe el nivel
+        # local en vez de un 429/500/504
+        try:
+            return degraded_response(body.get('message', ''), session_id, stream, local_notes, e, retry_after)
+        except Exception as offline_error:
+            logger.error(f"Error en el nivel local: {str(offline_error)}")
+        if retry_after is not None:
+            return too_many_requests(retry_after)
         return {
             'statusCode': 500,
             'headers': {
@@ -90,4 +549,42 @@ def lambda_handler(event, context):
             })
         }
 
+def storm_response(clusters, session_id, stream, prefix=''):
+    """Reporte del modo tormenta: un análisis acotado por cluster, en paralelo"""
+    total = sum(cluster['count'] for cluster in clusters)
+    logger.info(f"Modo tormenta: {total} alarmas en {len(clusters)} grupos")
+    report = analyze_storm(clusters, total, invoke_prompt, budget(STORM_DEADLINE))
+    if prefix:
+        report = f"{prefix}\n\n{report}"
+    return report_response(report, session_id, stream,
+                           {**get_response_metadata(), 'tier': 'storm', 'storm_mode': True})
+
+def agent_response(message, session_id, cacheable=True, stream=False, prefix=''):
+    """Respuesta del agente Claude (JSON o SSE)"""
+    # Modo streaming (SSE)
+    if stream:
+        logger.info("Respondiendo en modo streaming")
+        return stream_response(message, session_id, cacheable, prefix)
+    
+    response = process_message(message, session_id, cacheable)
+    if prefix:
+        response = f"{prefix}\n\n{response}"
+    logger.info(f"Respuesta del agente: {response[:100]}...")  # Primeros 100 chars
+    
+    metadata = get_response_metadata()
+    logger.info(f"Metadata: {json.dumps(metadata)}")
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({
+            'response': response,
+            'session_id': session_id,
+            'metadata': metadata
+        })
+    }
+
 # Función invoke_bedrock_agent removida - ahora usa Strands
\ No newline at end of file
@@ -1,6 +1,9 @@
 import json
 import logging
 
+from text_matching import KeywordMatcher
+from topology import answer_lookup
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -61,12 +64,18 @@ def lambda_handler(event, context):
             })
         }
 
-def get_mock_response(message):
-    """Genera respuestas simuladas basadas en el mensaje"""
-    
+# Palabras clave por intención (se comparan sin acentos y por raíz)
+INTENT_KEYWORDS = {
+    'conectividad': ["conectividad", "red", "conexion", "falla", "caida"],
+    'reinicio': ["reinicio", "servicio", "reiniciar", "restart"],
+    'correlacion': ["correlacion", "fallas", "eventos", "alarmas"],
+    'topologia': ["topologia", "equipos", "inventario", "dispositivos"],
+}
+
+# Respuestas simuladas por intención
+MOCK_RESPONSES = {
     # Respuestas para problemas de conectividad
-    if any(word in message for word in ["conectividad", "red", "conexion", "falla", "caida"]):
-        return """🔧 **Procedimiento para Fallas de Conectividad:**
+    'conectividad': """🔧 **Procedimiento para Fallas de Conectividad:**
 
 1. **Verificar estado de interfaces**
    - Revisar interfaces físicas y lógicas
@@ -86,11 +95,10 @@ def get_mock_response(message):
 
 5. **Aplicar solución según tipo de falla**
    - Reinicio de interfaces si es necesario
-   - Escalamiento a nivel 2 si persiste"""
-    
+   - Escalamiento a nivel 2 si persiste""",
+
     # Respuestas para reinicio de servicios
-    elif any(word in message for word in ["reinicio", "servicio", "reiniciar", "restart"]):
-        return """🔄 **Procedimiento para Reinicio de Servicios:**
+    'reinicio': """🔄 **Procedimiento para Reinicio de Servicios:**
 
 1. **Identificar servicio afectado**
    - Verificar qué servicio presenta problemas
@@ -111,11 +119,10 @@ def get_mock_response(message):
 
 5. **Monitorear estabilidad**
    - Observar por 10-15 minutos
-   - Confirmar que no hay errores"""
-    
+   - Confirmar que no hay errores""",
+
     # Respuestas para correlación de fallas
-    elif any(word in message for word in ["correlacion", "fallas", "eventos", "alarmas"]):
-        return """📊 **Procedimiento para Correlación de Fallas:**
+    'correlacion': """📊 **Procedimiento para Correlación de Fallas:**
 
 1. **Recopilar eventos**
    - Obtener alarmas de múltiples sistemas
@@ -135,11 +142,10 @@ def get_mock_response(message):
 
 5. **Ejecutar acciones correctivas**
    - Implementar soluciones
-   - Validar resolución del problema"""
-    
+   - Validar resolución del problema""",
+
     # Respuestas para topología
-    elif any(word in message for word in ["topologia", "equipos", "inventario", "dispositivos"]):
-        return """🗺️ **Información de Topología DNOC:**
+    'topologia': """🗺️ **Información de Topología DNOC:**
 
 **Consulta de Equipos:**
 - Acceder al sistema de inventario
@@ -157,11 +163,10 @@ def get_mock_response(message):
 - VLANs y subnets
 - Puntos de falla críticos
 
-¿Necesitas información específica de algún equipo o segmento de red?"""
-    
+¿Necesitas información específica de algún equipo o segmento de red?""",
+
     # Respuesta general
-    else:
-        return """👋 **Asistente DNOC - Modo Demo**
+    'general': """👋 **Asistente DNOC - Modo Demo**
 
 Soy tu asistente técnico DNOC. Puedo ayudarte con:
 
@@ -187,3 +192,16 @@ Soy tu asistente técnico DNOC. Puedo ayudarte con:
 - "Ayuda con correlación de fallas"
 
 ¿En qué puedo ayudarte hoy?"""
+}
+
+# Autómata compilado una sola vez por contenedor (cold start)
+_intent_matcher = KeywordMatcher(INTENT_KEYWORDS)
+
+def get_mock_response(message):
+    """Genera respuestas simuladas según la intención detectada en el mensaje"""
+    # Consultas de topología sobre nodos del inventario: respuesta real del grafo
+    lookup = answer_lookup(message)
+    if lookup:
+        return lookup
+    intent = _intent_matcher.best(message) or 'general'
+    return MOCK_RESPONSES[intent]
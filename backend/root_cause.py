@@ -0,0 +1,149 @@
+import os
+
+from alarm_correlator import alarm_time, format_hosts
+from topology import get_topology, node_key
+
+# Pesos de las señales: cobertura, precedencia, anticipación, severidad, con alarma
+FEATURES = ['coverage', 'precedence', 'earliness', 'severity', 'alarmed']
+WEIGHTS = [float(w) for w in os.environ.get('ROOT_CAUSE_WEIGHTS', '0.35,0.25,0.15,0.15,0.10').split(',')]
+ROOT_CAUSE_TOP = int(os.environ.get('ROOT_CAUSE_TOP', '3'))
+ROOT_CAUSE_MAX_DEPTH = int(os.environ.get('ROOT_CAUSE_MAX_DEPTH', '3'))
+
+# Severidad relativa por firma (la primera coincidencia gana)
+SIGNATURE_SEVERITY = [
+    ('status red', 1.0),
+    ('eventlog 6008', 0.6),
+    ('eventlog 41', 0.6),
+    ('threshold', 0.3),
+]
+DEFAULT_SEVERITY = 0.4
+
+
+def signature_severity(signature):
+    """Severidad de la firma entre 0 y 1"""
+    lowered = signature.lower()
+    for pattern, severity in SIGNATURE_SEVERITY:
+        if pattern in lowered:
+            return severity
+    return DEFAULT_SEVERITY
+
+
+def host_observations(clusters):
+    """Por host alarmado: hora de la primera alarma, severidad máxima y firmas"""
+    observations = {}
+    for cluster in clusters:
+        severity = signature_severity(cluster['signature'])
+        for alarm in cluster['alarms']:
+            host = node_key(alarm['host'])
+            obs = observations.setdefault(host, {'first': None, 'severity': 0.0, 'signatures': set()})
+            when = alarm_time(alarm)
+            if when and (obs['first'] is None or when < obs['first']):
+                obs['first'] = when
+            obs['severity'] = max(obs['severity'], severity)
+            obs['signatures'].add(cluster['signature'])
+    return observations
+
+
+def candidate_features(observations, graph):
+    """Candidatos (hosts alarmados y ancestros comunes) y su matriz de señales
+
+    - coverage: fracción de los otros hosts alarmados que dependen del candidato
+    - precedence: fracción de esos dependientes que alarmaron después que él
+    - earliness: 1 para la primera alarma del lote, 0 para la última
+    - severity: severidad de la firma del candidato
+    - alarmed: 1 si el candidato tiene alarma propia
+    """
+    alarmed = list(observations)
+    timed = sorted((obs['first'], host) for host, obs in observations.items() if obs['first'])
+    rank = {host: i for i, (_, host) in enumerate(timed)}
+
+    # Ancestros sin alarma que explican a más de un host alarmado
+    candidates = list(alarmed)
+    if len(alarmed) > 1:
+        counts = {}
+        for host in alarmed:
+            for ancestor, _ in graph.upstream(host, ROOT_CAUSE_MAX_DEPTH):
+                counts[ancestor] = counts.get(ancestor, 0) + 1
+        candidates += [node for node, count in counts.items() if count > 1 and node not in observations]
+
+    others = max(1, len(alarmed) - 1)
+    rows, explains = [], []
+    for node in candidates:
+        obs = observations.get(node)
+        downstream = set(graph.blast_radius(node))
+        covered = [host for host in alarmed if host != node and host in downstream]
+        explains.append(covered)
+
+        precedence = 0.0
+        if obs and obs['first'] and covered:
+            after = sum(1 for h in covered if observations[h]['first'] and observations[h]['first'] >= obs['first'])
+            precedence = after / len(covered)
+        earliness = 0.0
+        if node in rank:
+            earliness = 1.0 - rank[node] / max(1, len(timed) - 1) if len(timed) > 1 else 1.0
+
+        rows.append([
+            len(covered) / others,
+            precedence,
+            earliness,
+            obs['severity'] if obs else 0.0,
+            1.0 if obs else 0.0
+        ])
+    return candidates, rows, explains
+
+
+def score_rows(rows, weights=WEIGHTS):
+    """Puntaje de cada candidato: producto de la matriz de señales por los pesos"""
+    return [sum(value * weight for value, weight in zip(row, weights)) for row in rows]
+
+
+def rank_root_causes(clusters, top=ROOT_CAUSE_TOP):
+    """Ranking local de candidatos a causa raíz para los clusters correlacionados
+
+    Combina el orden temporal de las alarmas con el grafo de dependencias del
+    inventario. Retorna [{'node', 'score', 'explains', 'first', 'signatures',
+    'features'}] de mayor a menor puntaje; sin inventario configurado no hay
+    ranking (los puntajes dependen de la topología).
+    """
+    graph = get_topology()
+    if graph is None:
+        return []
+    observations = host_observations(clusters)
+    if len(observations) < 2:
+        return []
+    candidates, rows, explains = candidate_features(observations, graph)
+    scores = score_rows(rows)
+
+    ranking = []
+    for i in sorted(range(len(candidates)), key=lambda i: -scores[i])[:top]:
+        obs = observations.get(candidates[i])
+        ranking.append({
+            'node': candidates[i],
+            'kind': graph.kind(candidates[i]),
+            'score': round(scores[i], 3),
+            'explains': explains[i],
+            'first': obs['first'] if obs else None,
+            'signatures': sorted(obs['signatures']) if obs else [],
+            'features': dict(zip(FEATURES, rows[i]))
+        })
+    return ranking
+
+
+def format_ranking(ranking):
+    """Hipótesis de causa raíz en texto, para el prompt y la respuesta"""
+    if not ranking or not any(candidate['explains'] for candidate in ranking):
+        return ''
+    lines = ["🎯 **Hipótesis de causa raíz** (ranking local por topología y orden temporal):"]
+    for i, candidate in enumerate(ranking, 1):
+        name = f"{candidate['node']} ({candidate['kind']})" if candidate['kind'] else candidate['node']
+        details = []
+        if candidate['explains']:
+            details.append(f"explica {len(candidate['explains'])} hosts alarmados ({format_hosts(candidate['explains'])})")
+        if candidate['first']:
+            details.append(f"primera alarma {candidate['first'].strftime('%H:%M')}")
+        if candidate['signatures']:
+            details.append(', '.join(candidate['signatures']))
+        else:
+            details.append('sin alarma propia')
+        lines.append(f"{i}. {name} — score {candidate['score']:.2f}: {'; '.join(details)}")
+    return '\n'.join(lines)
@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+from collections import deque
+
+from alarm_parser import is_alarm_dump
+
+logger = logging.getLogger()
+
+# Clases de prioridad, de mayor a menor, y su peso en el desencolado weighted-fair
+PRIORITY_CLASSES = ['alert', 'interactive', 'background']
+PRIORITY_WEIGHTS = dict(zip(
+    PRIORITY_CLASSES, [float(w) for w in os.environ.get('PRIORITY_WEIGHTS', '8,3,1').split(',')]
+))
+DEFAULT_PRIORITY = 'interactive'
+
+
+def request_priority(message, requested=None):
+    """Clase de prioridad del request: la que pide el cliente, pero un dump de alarmas es siempre 'alert'"""
+    if is_alarm_dump(message):
+        return 'alert'
+    return requested if requested in PRIORITY_WEIGHTS else DEFAULT_PRIORITY
+
+
+def priority_rank(priority):
+    """Posición de la clase (0 = la más alta)"""
+    return PRIORITY_CLASSES.index(priority) if priority in PRIORITY_CLASSES else len(PRIORITY_CLASSES)
+
+
+class WeightedFairQueue:
+    """Cola con una fila por clase y desencolado weighted-fair (stride scheduling)
+
+    Cada clase lleva un "pase" que avanza 1/peso por cada elemento desencolado
+    y se atiende la fila no vacía con el pase más bajo: con pesos 8,3,1 y las
+    tres filas cargadas, 'alert' recibe 8 de cada 12 turnos. Una clase que
+    estuvo vacía entra con el pase actual, sin crédito acumulado, así que una
+    ráfaga de alertas tras un rato de calma no deja sin turnos al resto.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = dict(weights or PRIORITY_WEIGHTS)
+        self.queues = {name: deque() for name in self.weights}
+        self.passes = {name: 0.0 for name in self.weights}
+        self.virtual_time = 0.0
+        self.condition = threading.Condition()
+
+    def put(self, item, priority=DEFAULT_PRIORITY):
+        with self.condition:
+            if priority not in self.queues:
+                priority = DEFAULT_PRIORITY
+            if not self.queues[priority]:
+                self.passes[priority] = max(self.passes[priority], self.virtual_time)
+            self.queues[priority].append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Retorna (item, clase) o None si vence el timeout sin elementos"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: any(self.queues.values()), timeout):
+                return None
+            priority = min((name for name, queue in self.queues.items() if queue),
+                           key=lambda name: (self.passes[name], priority_rank(name)))
+            self.virtual_time = self.passes[priority]
+            self.passes[priority] += 1.0 / self.weights[priority]
+            return self.queues[priority].popleft(), priority
+
+    def depths(self):
+        """Elementos en espera por clase"""
+        with self.condition:
+            return {name: len(queue) for name, queue in self.queues.items()}
+
+
+class PriorityExecutor:
+    """Pool de hilos que toma el trabajo de una WeightedFairQueue"""
+
+    def __init__(self, max_workers, weights=None):
+        self.queue = WeightedFairQueue(weights)
+        self.max_workers = max_workers
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, priority=DEFAULT_PRIORITY):
+        """Encola fn(*args) en la clase indicada"""
+        self.queue.put((fn, args), priority)
+        with self.lock:
+            if len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def _work(self):
+        while True:
+            (fn, args), priority = self.queue.get()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Error en tarea '{priority}': {str(e)}")
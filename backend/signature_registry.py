@@ -0,0 +1,113 @@
+import os
+from collections import OrderedDict
+
+from alarm_correlator import format_hosts
+
+# Respuesta directa para firmas conocidas (sin llamar al modelo)
+FAST_PATH_ENABLED = os.environ.get('SIGNATURE_FAST_PATH', 'true').lower() == 'true'
+
+# Procedimientos de las firmas recurrentes: (clave de alarm_correlator.SIGNATURE_RULES,
+# título, procedimiento). Las firmas se detectan al correlacionar las alarmas.
+SIGNATURE_RUNBOOKS = [
+    ('eventlog_6008', 'Apagado inesperado de Windows (EventLog 6008)', """1. **Confirmar que el host volvió**
+   - Ping y acceso RDP/WinRM
+   - Verificar uptime (`systeminfo | find "Boot Time"`)
+
+2. **Determinar el origen del apagado**
+   - Revisar EventLog System: 41 (Kernel-Power), 1074, 6008
+   - Si es VM, revisar eventos del host ESX y del vCenter
+
+3. **Validar servicios de la aplicación**
+   - Servicios automáticos iniciados
+   - Health check de la aplicación
+
+4. **Correlacionar**
+   - Si varios hosts de la misma familia se apagaron juntos, sospechar del host físico, datastore o energía
+   - Escalar a plataforma si se repite en menos de 24 h"""),
+
+    ('eventlog_41', 'Reinicio sin apagado limpio (Kernel-Power 41)', """1. **Confirmar que el host volvió**
+   - Ping, acceso remoto y uptime
+
+2. **Revisar la causa**
+   - Minidumps en `C:\\Windows\\Minidump` y BugcheckCode del evento 41
+   - Eventos de hardware (WHEA) previos al reinicio
+
+3. **Validar servicios de la aplicación**
+   - Servicios automáticos iniciados y health check
+
+4. **Escalar**
+   - Con BugcheckCode distinto de 0, abrir caso a plataforma Windows"""),
+
+    ('esx_status_red', 'Host ESX en estado red', """1. **Verificar el host en vCenter**
+   - Estado de conexión y alarmas activas del host
+   - Hardware Status (sensores, fuentes, memoria)
+
+2. **Revisar impacto en VMs**
+   - VMs reiniciadas por HA en otros hosts
+   - VMs con apagado inesperado (EventLog 6008) en la misma ventana
+
+3. **Revisar almacenamiento y red**
+   - Datastores accesibles y paths activos
+   - Uplinks de vmnic UP
+
+4. **Escalar**
+   - Si el host no responde o hay falla de hardware, escalar a plataforma de virtualización y poner el host en mantenimiento"""),
+
+    ('memory_threshold', 'Uso de memoria sobre umbral', """1. **Confirmar la tendencia**
+   - Revisar el gráfico de memoria de las últimas horas
+   - Descartar un pico puntual
+
+2. **Identificar el consumo**
+   - Procesos o VMs con mayor uso de memoria
+   - Ballooning/swapping si es un host ESX
+
+3. **Mitigar**
+   - Reiniciar controladamente el proceso con fuga de memoria, si aplica
+   - En ESX, migrar VMs con vMotion para liberar el host
+
+4. **Escalar**
+   - Si persiste más de 30 minutos, escalar a capacidad/plataforma"""),
+
+    ('cpu_threshold', 'Uso de CPU sobre umbral', """1. **Confirmar la tendencia**
+   - Revisar el gráfico de CPU de las últimas horas
+
+2. **Identificar el consumo**
+   - Procesos o VMs con mayor uso de CPU
+   - CPU ready alto si es un host ESX
+
+3. **Mitigar**
+   - Detener tareas batch fuera de horario, si corresponde
+   - En ESX, balancear VMs con vMotion
+
+4. **Escalar**
+   - Si persiste más de 30 minutos, escalar a capacidad/plataforma"""),
+]
+
+_RULES = {key: (title, runbook) for key, title, runbook in SIGNATURE_RUNBOOKS}
+
+
+def split_known(clusters):
+    """Separa los clusters con procedimiento conocido de los que requieren al modelo
+
+    Retorna (known, unknown) donde known agrupa los clusters por clave de firma.
+    """
+    known = OrderedDict()
+    unknown = []
+    for cluster in clusters:
+        key = cluster.get('key') if FAST_PATH_ENABLED else None
+        if key in _RULES:
+            known.setdefault(key, []).append(cluster)
+        else:
+            unknown.append(cluster)
+    return known, unknown
+
+
+def format_runbooks(known):
+    """Procedimientos de las firmas conocidas, en el formato de las respuestas mock"""
+    sections = []
+    for key, clusters in known.items():
+        title, runbook = _RULES[key]
+        hosts = [host for cluster in clusters for host in cluster['hosts']]
+        count = sum(cluster['count'] for cluster in clusters)
+        sections.append(f"📋 **{title}** — {count} alarmas — {format_hosts(hosts)}\n\n{runbook}")
+    return '\n\n'.join(sections)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+from alarm_parser import is_alarm_dump, parse_alarm_dump
+from job_store import DONE, ERROR, FINISHED, RUNNING, get_store, new_job, update_job
+
+logger = logging.getLogger()
+
+# Coalescing de requests idénticos concurrentes (single-flight)
+SINGLE_FLIGHT = os.environ.get('SINGLE_FLIGHT', 'true').lower() == 'true'
+SINGLE_FLIGHT_WAIT = float(os.environ.get('SINGLE_FLIGHT_WAIT', '25'))  # por debajo del corte de API Gateway
+SINGLE_FLIGHT_JOB_WAIT = float(os.environ.get('SINGLE_FLIGHT_JOB_WAIT', '240'))  # jobs asíncronos
+SINGLE_FLIGHT_STALE = float(os.environ.get('SINGLE_FLIGHT_STALE', '300'))  # líder que no terminó: abandonado
+
+# Los vuelos comparten el store de jobs (DynamoDB en Lambda) con otro prefijo de id
+FLIGHT_PREFIX = 'flight:'
+
+
+def normalize_message(message):
+    """Mensaje sin diferencias de espacios ni mayúsculas"""
+    return ' '.join(message.split()).casefold()
+
+
+def request_fingerprint(message, scope=''):
+    """Huella del request: mismas alarmas (en cualquier orden) o misma pregunta normalizada
+
+    scope separa los requests que no pueden compartir respuesta (p. ej. el
+    session_id cuando la respuesta depende del historial de la conversación).
+    """
+    if is_alarm_dump(message):
+        rows = sorted({
+            (alarm['host'].lower(), ' '.join(alarm['summary'].split()), alarm['first_ocurrence_raw'].strip())
+            for alarm in parse_alarm_dump(message)
+        })
+        basis = json.dumps(rows)
+    else:
+        basis = normalize_message(message)
+    digest = hashlib.blake2b(f"{scope}|{basis}".encode('utf-8'), digest_size=16).hexdigest()
+    return FLIGHT_PREFIX + digest
+
+
+def claim_flight(key, session_id=None):
+    """Intenta liderar el vuelo; retorna el registro si este request es el líder o None
+
+    Un vuelo terminado no se comparte con los requests que llegan después (sin
+    respuestas viejas): se reemplaza y el nuevo request lidera. El reemplazo no
+    es atómico; en la carrera dos requests pueden liderar a la vez, lo que solo
+    cuesta una llamada duplicada. Si el store falla (tabla inexistente, sin
+    permisos) el request lidera un vuelo desacoplado que no se publica: se
+    procesa sin coalescer en vez de fallar.
+    """
+    flight = new_job({'owner': str(uuid.uuid4()), 'session_id': session_id}, job_id=key)
+    flight['status'] = RUNNING
+    try:
+        store = get_store()
+        if store.create(flight):
+            return flight
+
+        current = store.get(key)
+        if current is not None and current['status'] not in FINISHED and \
+                time.time() - current['created_at'] <= SINGLE_FLIGHT_STALE:
+            return None
+
+        store.put(flight)
+        current = store.get(key)
+    except Exception as e:
+        logger.error(f"Store de jobs no disponible, request sin coalescer: {type(e).__name__}: {str(e)}")
+        flight['detached'] = True
+        return flight
+    if current is not None and current['request']['owner'] != flight['request']['owner']:
+        return None
+    return flight
+
+
+def wait_flight(key, wait_seconds=SINGLE_FLIGHT_WAIT):
+    """Espera el resultado del líder; retorna el vuelo terminado o None (falló o tardó demasiado)"""
+    deadline = time.monotonic() + wait_seconds
+    delay = 0.1
+    while True:
+        try:
+            flight = get_store().get(key)
+        except Exception as e:
+            logger.error(f"Store de jobs no disponible esperando el vuelo: {type(e).__name__}: {str(e)}")
+            return None
+        if flight is None or flight['status'] == ERROR:
+            return None
+        if flight['status'] == DONE:
+            return flight
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 1.0)
+
+
+def finish_flight(flight, result):
+    """Publica el resultado del líder para los requests que esperan (None: no se comparte)"""
+    if flight.get('detached'):
+        return
+    try:
+        if result is None:
+            update_job(flight, status=ERROR, error='Sin resultado compartible')
+        else:
+            update_job(flight, status=DONE, result=result)
+    except Exception as e:
+        # Los que esperan el vuelo lo procesan por su cuenta al vencer su espera
+        logger.error(f"No se pudo publicar el resultado del vuelo {flight['job_id']}: {type(e).__name__}: {str(e)}")
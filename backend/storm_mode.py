@@ -0,0 +1,153 @@
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from adaptive_concurrency import AdaptiveConcurrencyLimit
+from alarm_correlator import format_hosts, summarize_clusters
+from bedrock_clients import is_throttling_error
+from deadlines import deadline_scope, submit_with_deadline
+
+logger = logging.getLogger()
+
+# Activación del modo tormenta
+STORM_MIN_ALARMS = int(os.environ.get('STORM_MIN_ALARMS', '50'))
+STORM_MIN_CLUSTERS = int(os.environ.get('STORM_MIN_CLUSTERS', '4'))
+
+# Presupuestos de tiempo (segundos) y de salida por cluster
+STORM_DEADLINE = float(os.environ.get('STORM_DEADLINE', '22'))
+STORM_CALL_TIMEOUT = float(os.environ.get('STORM_CALL_TIMEOUT', '12'))
+STORM_MAX_TOKENS = int(os.environ.get('STORM_MAX_TOKENS', '400'))
+STORM_MAX_CLUSTERS = int(os.environ.get('STORM_MAX_CLUSTERS', '20'))
+STORM_MAX_WORKERS = int(os.environ.get('STORM_MAX_WORKERS', '8'))
+
+# Concurrencia adaptativa compartida por el contenedor: baja ante throttling
+storm_limit = AdaptiveConcurrencyLimit(
+    initial=int(os.environ.get('STORM_INITIAL_CONCURRENCY', '4')),
+    minimum=1,
+    maximum=STORM_MAX_WORKERS
+)
+_executor = ThreadPoolExecutor(max_workers=STORM_MAX_WORKERS)
+
+PRIORITY_ORDER = {'P1': 1, 'P2': 2, 'P3': 3}
+_PRIORITY_RE = re.compile(r'PRIORIDAD:\s*(P[123])', re.I)
+
+
+def is_storm(alarms, clusters):
+    """Indica si el lote de alarmas amerita el análisis en paralelo por cluster"""
+    return len(alarms) >= STORM_MIN_ALARMS or len(clusters) >= STORM_MIN_CLUSTERS
+
+
+def build_cluster_prompt(cluster):
+    """Prompt acotado para analizar un único cluster"""
+    return (
+        "Analiza este grupo de alarmas correlacionadas del monitoreo DNOC. "
+        "Comienza la respuesta con 'PRIORIDAD: P1', 'PRIORIDAD: P2' o 'PRIORIDAD: P3' "
+        "(P1 = impacto en servicio) y luego da causa probable y 2-4 pasos concretos, "
+        "en no más de 120 palabras.\n\n"
+        f"{summarize_clusters([cluster], cluster['count'])}"
+    )
+
+
+def heuristic_priority(cluster):
+    """Prioridad estimada localmente si el modelo no la informa"""
+    signature = cluster['signature'].lower()
+    if re.search(r'\bred\b', signature) or 'eventlog 6008' in signature or cluster['count'] >= 10:
+        return 'P1'
+    if 'threshold' in signature or cluster['count'] >= 3:
+        return 'P2'
+    return 'P3'
+
+
+def analyze_cluster(cluster, invoke, deadline):
+    """Analiza un cluster respetando el límite adaptativo y el deadline global"""
+    result = {'cluster': cluster, 'analysis': None, 'error': None}
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 1 or not storm_limit.acquire(timeout=remaining - 1):
+            result['error'] = 'deadline'
+            return result
+
+        start = time.monotonic()
+        throttled = False
+        try:
+            # Cada llamada se acota a STORM_CALL_TIMEOUT o al deadline del reporte, lo
+            # que llegue antes; el cliente deriva de ahí el timeout y los reintentos
+            with deadline_scope(time.time() + STORM_CALL_TIMEOUT):
+                result['analysis'] = invoke(build_cluster_prompt(cluster), STORM_MAX_TOKENS)
+            return result
+        except Exception as e:
+            throttled = is_throttling_error(e)
+            if not throttled:
+                result['error'] = str(e)
+                return result
+            logger.warning(f"Throttling analizando cluster {cluster['id']}, reintentando")
+        finally:
+            storm_limit.release(throttled=throttled, latency=time.monotonic() - start)
+
+        # Backoff corto antes de reintentar tras un throttling
+        time.sleep(min(1.0, max(0.0, deadline - time.monotonic() - 1)))
+
+
+def analyze_storm(clusters, total_alarms, invoke, deadline_seconds=STORM_DEADLINE):
+    """Analiza los clusters en paralelo y arma un reporte de incidente priorizado
+
+    invoke(prompt, max_tokens) llama al modelo. Los workers heredan el deadline
+    del request (acotado a deadline_seconds). Los clusters que no alcanzan a
+    analizarse dentro del deadline se listan sin análisis.
+    """
+    start = time.monotonic()
+    deadline = start + deadline_seconds
+    selected = clusters[:STORM_MAX_CLUSTERS]
+
+    with deadline_scope(time.time() + deadline_seconds):
+        futures = [submit_with_deadline(_executor, analyze_cluster, cluster, invoke, deadline) for cluster in selected]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+        except Exception:
+            pass
+
+    for result in results:
+        match = _PRIORITY_RE.search(result['analysis'] or '')
+        result['priority'] = match.group(1).upper() if match else heuristic_priority(result['cluster'])
+        if match:
+            result['analysis'] = (result['analysis'][:match.start()] + result['analysis'][match.end():]).strip()
+
+    results.sort(key=lambda r: (PRIORITY_ORDER[r['priority']], -r['cluster']['count']))
+    elapsed = time.monotonic() - start
+    analyzed = sum(1 for r in results if r['analysis'])
+
+    logger.info(f"Modo tormenta: {analyzed}/{len(clusters)} clusters analizados en {elapsed:.1f}s "
+                f"(límite de concurrencia {storm_limit.status()['limit']})")
+    return format_report(results, clusters, total_alarms, elapsed)
+
+
+def format_report(results, clusters, total_alarms, elapsed):
+    """Reporte de incidente en Markdown, ordenado por prioridad"""
+    lines = [
+        f"🚨 **Reporte de incidente** — {total_alarms} alarmas en {len(clusters)} grupos "
+        f"({elapsed:.1f}s)",
+        ""
+    ]
+    reported = set()
+    for result in results:
+        cluster = result['cluster']
+        reported.add(cluster['id'])
+        lines.append(f"### {result['priority']} — {cluster['signature']} x{cluster['count']} — "
+                     f"{format_hosts(cluster['hosts'])}")
+        if result['analysis']:
+            lines.append(result['analysis'])
+        else:
+            lines.append(f"_Sin análisis ({result['error']}): {cluster['description']}_")
+        lines.append("")
+
+    pending = [c for c in clusters if c['id'] not in reported]
+    if pending:
+        lines.append(f"**Grupos sin analizar ({len(pending)}):**")
+        for cluster in pending:
+            lines.append(f"- {cluster['signature']} x{cluster['count']} — {format_hosts(cluster['hosts'])}")
+    return '\n'.join(lines).strip()
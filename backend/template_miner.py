@@ -0,0 +1,163 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Parámetros del árbol (estilo Drain)
+TEMPLATE_DEPTH = int(os.environ.get('TEMPLATE_MINER_DEPTH', '4'))
+TEMPLATE_SIMILARITY = float(os.environ.get('TEMPLATE_MINER_SIMILARITY', '0.5'))
+TEMPLATE_MAX_CHILDREN = int(os.environ.get('TEMPLATE_MINER_MAX_CHILDREN', '100'))
+TEMPLATE_MAX_TEMPLATES = int(os.environ.get('TEMPLATE_MINER_MAX_TEMPLATES', '1000'))
+
+WILDCARD = '<*>'
+
+# Tokens variables: números, fechas, horas, IPs, hex y nombres de host con dominio
+_VARIABLE_RE = re.compile(
+    r'[-+]?\d+([.,]\d+)?%?'
+    r'|\d{1,2}/\d{1,2}/\d{2,4}'
+    r'|\d{1,2}:\d{2}(:\d{2})?'
+    r'|\d{1,3}(\.\d{1,3}){3}(:\d+)?'
+    r'|(0x)?[0-9a-f]{8,}'
+    r'|[\w-]+(\.[\w-]+){2,}',
+    re.I
+)
+
+
+def is_variable(token):
+    """Indica si el token es un parámetro (host, fecha, número, ...)"""
+    return bool(_VARIABLE_RE.fullmatch(token.rstrip('.,;:')))
+
+
+def mask_tokens(text):
+    """Tokeniza por espacios y reemplaza los parámetros evidentes por <*>"""
+    return [WILDCARD if is_variable(token) else token for token in text.split()]
+
+
+def mask_summary(text):
+    """Summary con los parámetros enmascarados (plantilla sin aprendizaje)"""
+    return ' '.join(mask_tokens(text))
+
+
+class Template:
+    """Plantilla aprendida: tokens con <*> en las posiciones variables"""
+
+    __slots__ = ('id', 'tokens', 'count', 'leaf')
+
+    def __init__(self, template_id, tokens, leaf):
+        self.id = template_id
+        self.tokens = tokens
+        self.count = 0
+        self.leaf = leaf
+
+    @property
+    def text(self):
+        return ' '.join(self.tokens)
+
+
+class TemplateMiner:
+    """Minero de plantillas online con árbol de profundidad fija (Drain)
+
+    El árbol se indexa por cantidad de tokens y por los primeros depth - 2
+    tokens, así que cada summary se compara sólo contra las plantillas de su
+    hoja. La cantidad de plantillas está acotada: las menos usadas
+    recientemente se descartan (LRU).
+    """
+
+    def __init__(self, depth=TEMPLATE_DEPTH, similarity=TEMPLATE_SIMILARITY,
+                 max_children=TEMPLATE_MAX_CHILDREN, max_templates=TEMPLATE_MAX_TEMPLATES):
+        self.prefix_depth = max(1, depth - 2)
+        self.similarity = similarity
+        self.max_children = max_children
+        self.max_templates = max_templates
+        self.root = {}
+        self.templates = OrderedDict()
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def _leaf(self, tokens, create):
+        """Hoja del árbol para la secuencia de tokens (None si no existe y create=False)"""
+        node = self.root.get(len(tokens))
+        if node is None:
+            if not create:
+                return None
+            node = self.root[len(tokens)] = {}
+
+        for token in tokens[:self.prefix_depth]:
+            key = WILDCARD if token == WILDCARD or any(c.isdigit() for c in token) else token
+            child = node.get(key)
+            if child is None and create:
+                # Con el nodo lleno los tokens nuevos comparten la rama <*>
+                key = key if len(node) < self.max_children else WILDCARD
+                child = node.setdefault(key, {})
+            elif child is None:
+                child = node.get(WILDCARD)
+                if child is None:
+                    return None
+            node = child
+
+        return node.setdefault('templates', []) if create else node.get('templates')
+
+    def _best_match(self, leaf, tokens):
+        best, best_score = None, self.similarity
+        for template in leaf:
+            same = sum(1 for a, b in zip(template.tokens, tokens) if a == b)
+            score = same / len(tokens) if tokens else 1.0
+            if score >= best_score:
+                best, best_score = template, score
+        return best
+
+    def add(self, text):
+        """Aprende el summary y retorna (template_id, plantilla, parámetros)"""
+        tokens = mask_tokens(text)
+        raw = text.split()
+
+        with self.lock:
+            leaf = self._leaf(tokens, create=True)
+            template = self._best_match(leaf, tokens)
+
+            if template is None:
+                template = Template(self.next_id, tokens, leaf)
+                self.next_id += 1
+                leaf.append(template)
+                self.templates[template.id] = template
+                self._evict()
+            else:
+                template.tokens = [a if a == b else WILDCARD for a, b in zip(template.tokens, tokens)]
+                self.templates.move_to_end(template.id)
+
+            template.count += 1
+            params = [token for token, slot in zip(raw, template.tokens) if slot == WILDCARD]
+            return template.id, template.text, params
+
+    def match(self, text):
+        """Busca la plantilla del summary sin aprender; retorna (template_id, plantilla) o (None, None)"""
+        tokens = mask_tokens(text)
+        with self.lock:
+            leaf = self._leaf(tokens, create=False)
+            template = self._best_match(leaf, tokens) if leaf else None
+            if template is None:
+                return None, None
+            return template.id, template.text
+
+    def template(self, template_id):
+        """Texto actual de la plantilla (None si fue descartada)"""
+        template = self.templates.get(template_id)
+        return template.text if template else None
+
+    def _evict(self):
+        while len(self.templates) > self.max_templates:
+            _, template = self.templates.popitem(last=False)
+            template.leaf.remove(template)
+
+    def stats(self):
+        """Cantidad de plantillas vivas y las más frecuentes"""
+        with self.lock:
+            top = sorted(self.templates.values(), key=lambda t: -t.count)[:10]
+            return {
+                'templates': len(self.templates),
+                'top': [{'id': t.id, 'count': t.count, 'template': t.text} for t in top]
+            }
+
+
+# Minero compartido por el contenedor (las plantillas sobreviven entre invocaciones)
+miner = TemplateMiner()
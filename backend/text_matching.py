@@ -0,0 +1,109 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# Sufijos del stemmer liviano de español (del más largo al más corto)
+SPANISH_SUFFIXES = sorted([
+    'amientos', 'imientos', 'aciones', 'uciones', 'amiento', 'imiento',
+    'acion', 'ucion', 'idades', 'idad', 'mente', 'ando', 'iendo',
+    'adas', 'idas', 'ados', 'idos', 'ada', 'ida', 'ado', 'ido',
+    'ia', 'ar', 'er', 'ir', 'as', 'es', 'os', 'a', 'e', 'o', 's'
+], key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+# Todo byte que no es letra o dígito ASCII pasa a ser separador (escaneo por palabras)
+_SEPARATOR_BYTES = bytes(c if chr(c).isascii() and chr(c).isalnum() else 32 for c in range(256))
+
+
+def fold_accents(text):
+    """Elimina acentos y diacríticos (conexión -> conexion, topología -> topologia)"""
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def normalize(text):
+    """Minúsculas y sin acentos"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return fold_accents(text)
+
+
+@lru_cache(maxsize=8192)
+def stem(word):
+    """Stemmer liviano de español: quita el sufijo más largo que deje una raíz mínima"""
+    for suffix in SPANISH_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Palabras normalizadas (sin acentos, minúsculas)"""
+    return _WORD_RE.findall(normalize(text))
+
+
+def ascii_words(text):
+    """Palabras en minúsculas y sin acentos (solo ASCII) separadas por un espacio
+
+    Con un espacio inicial, para buscar palabras por prefijo con `in`. Los
+    caracteres sin equivalente ASCII se descartan.
+    """
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+    return ' ' + ' '.join(text.encode('ascii', 'ignore').translate(_SEPARATOR_BYTES).decode('ascii').split())
+
+
+def stem_tokens(text):
+    """Raíces de las palabras del texto"""
+    return [stem(word) for word in tokenize(text)]
+
+
+class KeywordMatcher:
+    """Búsqueda de palabras clave por intención, sin acentos y por prefijo de palabra
+
+    Las palabras clave de cada intención (pueden ser frases, p. ej. "causa
+    raiz") coinciden al inicio de una palabra del mensaje, así "falla" cubre
+    "fallas" y "conexion" cubre "conexión". Es el escaneo lineal de siempre
+    sobre el texto normalizado: los mensajes y las listas son cortos.
+    """
+
+    def __init__(self, intents):
+        # Por keyword: (intención, keyword, peso, texto buscado)
+        self.keywords = []
+
+        for intent, keywords in intents.items():
+            for keyword in keywords:
+                weight = 1.0
+                if isinstance(keyword, tuple):
+                    keyword, weight = keyword
+                needle = ascii_words(keyword)
+                if needle.strip():
+                    self.keywords.append((intent, keyword, weight, needle))
+
+    def find(self, text):
+        """Retorna las keywords presentes (intención, keyword, peso), una vez cada una"""
+        padded = ascii_words(text)
+        return [(intent, keyword, weight) for intent, keyword, weight, needle in self.keywords if needle in padded]
+
+    def scores(self, text):
+        """Score por intención presente (orden de definición de las intenciones)
+
+        Cada keyword suma su peso una sola vez por mensaje.
+        """
+        scores = {}
+        for intent, keyword, weight in self.find(text):
+            scores[intent] = scores.get(intent, 0.0) + weight
+        return scores
+
+    def match(self, text):
+        """Intenciones con su score, de mayor a menor (empate: orden de definición)"""
+        # sorted es estable: los empates conservan el orden de definición
+        return sorted(self.scores(text).items(), key=lambda item: -item[1])
+
+    def best(self, text):
+        """Intención con mayor score, o None"""
+        scores = self.scores(text)
+        return max(scores, key=scores.get) if scores else None
@@ -0,0 +1,259 @@
+import csv
+import json
+import logging
+import os
+import re
+from array import array
+
+from text_matching import KeywordMatcher
+
+logger = logging.getLogger()
+
+# Inventario local (CSV node,parent,kind o JSON {"nodes": [{"name", "kind", "parents"}]}).
+# Sin configurar no hay topología: topology_inventory.example.csv es solo un ejemplo
+TOPOLOGY_INVENTORY = os.environ.get('TOPOLOGY_INVENTORY', '')
+TOPOLOGY_MAX_LISTED = int(os.environ.get('TOPOLOGY_MAX_LISTED', '15'))
+# Largo máximo (palabras) de una consulta que se responde solo con el inventario
+TOPOLOGY_LOOKUP_MAX_WORDS = int(os.environ.get('TOPOLOGY_LOOKUP_MAX_WORDS', '12'))
+
+# Palabras clave de las consultas de topología (se comparan sin acentos y por raíz)
+LOOKUP_KEYWORDS = {
+    'upstream': ["depende", "dependencias", "upstream", "padre"],
+    'downstream': ["afecta", "afectados", "impacto", "downstream", "hijos", "blast"],
+    'topologia': ["topologia", "comun", "comparten"],
+}
+
+# Palabras de una pregunta de diagnóstico: la topología es contexto, no la respuesta
+DIAGNOSTIC_KEYWORDS = {
+    'diagnostico': ["por que", "porque", "causa", "falla", "error", "caido", "caida", "cayo", "lento",
+                    "problema", "solucion", "resolver", "revisar", "hago", "pasos", "alarma",
+                    "diagnostico", "reinicio", "reiniciar"],
+}
+
+_NAME_RE = re.compile(r'[a-z0-9][\w.-]*')
+_lookup_matcher = KeywordMatcher(LOOKUP_KEYWORDS)
+_diagnostic_matcher = KeywordMatcher(DIAGNOSTIC_KEYWORDS)
+
+
+def node_key(name):
+    """Nombre normalizado del nodo (host corto en minúsculas)"""
+    return name.strip().split('.')[0].lower()
+
+
+class TopologyGraph:
+    """Grafo de dependencias del inventario con adyacencias compactas (CSR)
+
+    parent = equipo del que depende el nodo (VM -> host ESX -> cluster -> switch).
+    Las listas de padres e hijos se guardan como offsets + destinos en arrays
+    de enteros, así que un BFS recorre memoria contigua sin objetos por arista.
+    """
+
+    def __init__(self, edges, kinds=None):
+        kinds = kinds or {}
+        names = sorted({n for edge in edges for n in edge if n} | set(kinds))
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.kinds = [kinds.get(name, '') for name in names]
+
+        parents = [[] for _ in names]
+        children = [[] for _ in names]
+        for node, parent in edges:
+            if node and parent:
+                parents[self.index[node]].append(self.index[parent])
+                children[self.index[parent]].append(self.index[node])
+        self.parent_offsets, self.parent_targets = self._compact(parents)
+        self.child_offsets, self.child_targets = self._compact(children)
+
+    @staticmethod
+    def _compact(adjacency):
+        offsets = array('I', [0])
+        targets = array('I')
+        for neighbours in adjacency:
+            targets.extend(sorted(set(neighbours)))
+            offsets.append(len(targets))
+        return offsets, targets
+
+    @classmethod
+    def from_file(cls, path):
+        """Carga el inventario desde CSV o JSON"""
+        edges, kinds = [], {}
+        with open(path, encoding='utf-8') as f:
+            if path.endswith('.json'):
+                for node in json.load(f)['nodes']:
+                    name = node_key(node['name'])
+                    kinds[name] = node.get('kind', '')
+                    edges.extend((name, node_key(p)) for p in node.get('parents', []))
+            else:
+                for row in csv.DictReader(f):
+                    name = node_key(row['node'])
+                    if row.get('kind'):
+                        kinds[name] = row['kind'].strip()
+                    edges.append((name, node_key(row['parent']) if row.get('parent') else None))
+        return cls(edges, kinds)
+
+    def __contains__(self, name):
+        return node_key(name) in self.index
+
+    def _bfs(self, start, offsets, targets, max_depth=None):
+        """BFS desde el nodo; retorna [(índice, profundidad)] sin incluir el origen"""
+        depth = {start: 0}
+        queue = [start]
+        for current in queue:
+            d = depth[current]
+            if max_depth is not None and d >= max_depth:
+                continue
+            for i in range(offsets[current], offsets[current + 1]):
+                target = targets[i]
+                if target not in depth:
+                    depth[target] = d + 1
+                    queue.append(target)
+        return [(i, depth[i]) for i in queue[1:]]
+
+    def upstream(self, name, max_depth=None):
+        """Equipos de los que depende el nodo, con su distancia"""
+        start = self.index.get(node_key(name))
+        if start is None:
+            return []
+        return [(self.names[i], d) for i, d in
+                self._bfs(start, self.parent_offsets, self.parent_targets, max_depth)]
+
+    def downstream(self, name, max_depth=None):
+        """Equipos que dependen del nodo (radio de impacto si cae), con su distancia"""
+        start = self.index.get(node_key(name))
+        if start is None:
+            return []
+        return [(self.names[i], d) for i, d in
+                self._bfs(start, self.child_offsets, self.child_targets, max_depth)]
+
+    def blast_radius(self, name):
+        """Todos los equipos afectados si el nodo cae"""
+        return [node for node, _ in self.downstream(name)]
+
+    def shared_parents(self, names):
+        """Ancestros comunes a todos los nodos, del más cercano al más lejano"""
+        distances = None
+        for name in names:
+            ups = dict(self.upstream(name))
+            distances = ups if distances is None else {
+                node: max(distances[node], ups[node]) for node in distances if node in ups
+            }
+        return sorted((distances or {}).items(), key=lambda item: (item[1], item[0]))
+
+    def kind(self, name):
+        i = self.index.get(node_key(name))
+        return self.kinds[i] if i is not None else ''
+
+
+_topology = None
+_loaded = False
+
+
+def get_topology():
+    """Grafo del inventario, cargado una vez por contenedor (None si no hay inventario)"""
+    global _topology, _loaded
+    if not _loaded:
+        _loaded = True
+        if not TOPOLOGY_INVENTORY:
+            logger.info("TOPOLOGY_INVENTORY sin configurar: consultas de topología deshabilitadas")
+        elif not os.path.exists(TOPOLOGY_INVENTORY):
+            logger.error(f"Inventario de topología no encontrado: {TOPOLOGY_INVENTORY}")
+        else:
+            try:
+                _topology = TopologyGraph.from_file(TOPOLOGY_INVENTORY)
+                logger.info(f"Topología cargada: {len(_topology.names)} nodos")
+            except Exception as e:
+                logger.error(f"Error cargando topología: {e}")
+    return _topology
+
+
+def set_topology(graph):
+    """Reemplaza el grafo (pruebas o recarga del inventario)"""
+    global _topology, _loaded
+    _topology, _loaded = graph, True
+
+
+def _format_nodes(graph, nodes):
+    listed = [f"{node} ({graph.kind(node)})" if graph.kind(node) else node for node in nodes[:TOPOLOGY_MAX_LISTED]]
+    if len(nodes) > TOPOLOGY_MAX_LISTED:
+        listed.append(f"y {len(nodes) - TOPOLOGY_MAX_LISTED} más")
+    return ', '.join(listed) or 'ninguno'
+
+
+def mentioned_nodes(message, graph):
+    """Nodos del inventario mencionados en el mensaje, en orden de aparición"""
+    found = []
+    for token in _NAME_RE.findall(message.lower()):
+        key = node_key(token)
+        if key in graph.index and key not in found:
+            found.append(key)
+    return found
+
+
+def topology_context(hosts):
+    """Contexto de topología para los hosts alarmados (para el prompt)"""
+    graph = get_topology()
+    if graph is None:
+        return ''
+    alarmed = [h for h in dict.fromkeys(node_key(h) for h in hosts) if h in graph.index]
+    if not alarmed:
+        return ''
+
+    # Hosts agrupados por sus padres directos, marcando los padres con alarma
+    alarmed_set = set(alarmed)
+    by_parents = {}
+    for host in alarmed:
+        parents = tuple(node for node, _ in graph.upstream(host, max_depth=1))
+        if parents:
+            by_parents.setdefault(parents, []).append(host)
+
+    lines = ["Topología de los hosts alarmados:"]
+    for parents, children in list(by_parents.items())[:TOPOLOGY_MAX_LISTED]:
+        described = ', '.join(f"{p} ({graph.kind(p)}{', con alarma' if p in alarmed_set else ''})" for p in parents)
+        verb = 'dependen' if len(children) > 1 else 'depende'
+        lines.append(f"- {_format_nodes(graph, children)} {verb} de {described}")
+    for host in alarmed:
+        affected = graph.blast_radius(host)
+        if affected:
+            lines.append(f"- Si {host} cae afecta a {len(affected)} equipos")
+    if len(alarmed) > 1:
+        shared = graph.shared_parents(alarmed)
+        if shared:
+            lines.append(f"- Ancestro común más cercano: {shared[0][0]}")
+    return '\n'.join(lines)
+
+
+def is_pure_lookup(message):
+    """Indica si el mensaje es solo una consulta de topología (corto y sin pedido de diagnóstico)"""
+    return len(message.split()) <= TOPOLOGY_LOOKUP_MAX_WORDS and _diagnostic_matcher.best(message) is None
+
+
+def answer_lookup(message):
+    """Respuesta directa para consultas puras de topología sobre nodos del inventario
+
+    Retorna None si el mensaje no es una consulta de topología o no menciona
+    nodos conocidos.
+    """
+    graph = get_topology()
+    if graph is None:
+        return None
+    intents = dict(_lookup_matcher.match(message))
+    if not intents:
+        return None
+    nodes = mentioned_nodes(message, graph)
+    if not nodes:
+        return None
+
+    sections = []
+    for node in nodes:
+        lines = [f"🗺️ **Topología de {node}**" + (f" ({graph.kind(node)})" if graph.kind(node) else '')]
+        if 'downstream' not in intents or 'upstream' in intents:
+            lines.append(f"- Depende de: {_format_nodes(graph, [n for n, _ in graph.upstream(node)])}")
+        if 'upstream' not in intents or 'downstream' in intents:
+            affected = graph.blast_radius(node)
+            lines.append(f"- Impacto si cae ({len(affected)} equipos): {_format_nodes(graph, affected)}")
+        sections.append('\n'.join(lines))
+
+    if len(nodes) > 1:
+        shared = graph.shared_parents(nodes)
+        sections.append(f"🔗 **Dependencias comunes:** {_format_nodes(graph, [n for n, _ in shared])}")
+    return '\n\n'.join(sections)
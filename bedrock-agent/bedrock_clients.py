@@ -0,0 +1,125 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+from deadlines import DeadlineExceeded, remaining
+
+# Región por defecto de los servicios Bedrock
+AWS_REGION = os.environ.get('BEDROCK_REGION', 'us-west-2')
+# Región de la propia función para los demás servicios (lambda, dynamodb...)
+FUNCTION_REGION = os.environ.get('AWS_REGION', AWS_REGION)
+
+# Parámetros de conexión (ajustables por variables de entorno de Lambda)
+MAX_POOL_CONNECTIONS = int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', '20'))
+CONNECT_TIMEOUT = float(os.environ.get('BEDROCK_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.environ.get('BEDROCK_READ_TIMEOUT', '25'))
+MAX_RETRIES = int(os.environ.get('BEDROCK_MAX_RETRIES', '2'))
+
+# Escalones de timeout de lectura: los timeouts (explícitos o por deadline) se
+# redondean hacia abajo al escalón más cercano para reutilizar pocos clientes
+TIMEOUT_LEVELS = sorted({1.0, 2.0, 3.0, 4.0, 5.0, 7.0, 10.0, 12.0, 15.0, 20.0, READ_TIMEOUT})
+# Margen mínimo que debe quedar tras un intento completo para permitir reintentos
+RETRY_MIN_BUDGET = float(os.environ.get('BEDROCK_RETRY_MIN_BUDGET', '1'))
+
+# Códigos de error de Bedrock que indican throttling
+THROTTLING_CODES = {'ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException'}
+
+# Registro de clientes compartido por todo el contenedor Lambda.
+# Se crea una sola vez (cold start) y se reutiliza en las invocaciones
+# calientes, evitando resolver endpoint, credenciales y handshake TLS.
+_clients = {}
+_lock = threading.Lock()
+
+
+def service_region(service_name):
+    """Región del servicio: BEDROCK_REGION para Bedrock, la de la función para el resto"""
+    return AWS_REGION if service_name.startswith('bedrock') else FUNCTION_REGION
+
+
+def build_config(read_timeout=None, max_attempts=MAX_RETRIES, region=AWS_REGION):
+    """Crea la configuración botocore con pool, keep-alive y timeouts"""
+    return Config(
+        region_name=region,
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=read_timeout if read_timeout is not None else READ_TIMEOUT,
+        retries={
+            'max_attempts': max_attempts,
+            'mode': 'adaptive'
+        }
+    )
+
+
+def timeout_level(seconds):
+    """Mayor escalón de TIMEOUT_LEVELS que no supera los segundos dados (mínimo el primero)"""
+    levels = [level for level in TIMEOUT_LEVELS if level <= seconds]
+    return levels[-1] if levels else TIMEOUT_LEVELS[0]
+
+
+def get_client(service_name, read_timeout=None):
+    """Retorna el cliente compartido para el servicio indicado
+
+    Sin deadline se usa un único cliente por servicio (o por escalón de
+    read_timeout explícito). Si el request en curso tiene deadline, el timeout
+    de lectura se acota al tiempo que queda. El timeout se redondea hacia abajo
+    a un escalón de TIMEOUT_LEVELS (como máximo READ_TIMEOUT), así la cantidad
+    de clientes queda acotada y se reutilizan entre invocaciones. Los
+    reintentos se mantienen mientras después de un intento completo quede al
+    menos RETRY_MIN_BUDGET; con el deadline vencido se lanza DeadlineExceeded
+    sin llamar al servicio.
+    """
+    max_attempts = MAX_RETRIES
+    left = remaining()
+    if left is not None:
+        if left <= 0:
+            raise DeadlineExceeded(f"Deadline vencido antes de llamar a {service_name}")
+        read_timeout = min(read_timeout if read_timeout is not None else READ_TIMEOUT, left)
+    read_timeout = timeout_level(read_timeout) if read_timeout is not None else READ_TIMEOUT
+    # max_attempts de botocore cuenta los reintentos, sin el intento inicial
+    if left is not None and left < read_timeout + RETRY_MIN_BUDGET:
+        max_attempts = 0
+    key = (service_name, read_timeout, max_attempts)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = boto3.client(service_name,
+                                  config=build_config(read_timeout, max_attempts, service_region(service_name)))
+            _clients[key] = client
+    return client
+
+
+def is_throttling_error(error):
+    """Indica si el error (de botocore o uno que lo envuelve) es un throttling de Bedrock"""
+    response = getattr(error, 'response', None) or {}
+    code = response.get('Error', {}).get('Code', '')
+    return code in THROTTLING_CODES or 'Throttling' in type(error).__name__ or \
+        any(name in str(error) for name in THROTTLING_CODES)
+
+
+def get_agent_runtime():
+    """Cliente bedrock-agent-runtime (Knowledge Base)"""
+    return get_client('bedrock-agent-runtime')
+
+
+def get_bedrock_runtime():
+    """Cliente bedrock-runtime (invocación directa de modelos)"""
+    return get_client('bedrock-runtime')
+
+
+def warm_up():
+    """Crea los clientes en el cold start para que la primera invocación no pague el costo"""
+    get_agent_runtime()
+    get_bedrock_runtime()
+
+
+def reset_clients():
+    """Descarta los clientes registrados (uso en pruebas o rotación de credenciales)"""
+    with _lock:
+        _clients.clear()
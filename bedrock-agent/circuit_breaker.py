@@ -0,0 +1,155 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger()
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: la dependencia no se invoca"""
+
+
+def is_timeout(error):
+    """Indica si el error es un timeout de conexión o lectura (botocore o futures)"""
+    return 'Timeout' in type(error).__name__
+
+
+class CircuitBreaker:
+    """Circuit breaker con estados closed / open / half_open
+
+    - closed: todo pasa; se abre si la tasa de error de la ventana supera el
+      umbral o si hay N timeouts consecutivos.
+    - open: nada pasa hasta que vence open_duration.
+    - half_open: deja pasar pocos requests de prueba; si todos salen bien
+      se cierra, si alguno falla vuelve a abrirse. Si las pruebas no informan
+      resultado en probe_timeout segundos se liberan sus lugares.
+    """
+
+    def __init__(self, name, error_rate=0.5, window_size=20, min_requests=5,
+                 consecutive_timeouts=3, open_duration=30.0, half_open_probes=2, probe_timeout=None):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.consecutive_timeouts = consecutive_timeouts
+        self.open_duration = open_duration
+        self.half_open_probes = half_open_probes
+        self.probe_timeout = probe_timeout if probe_timeout is not None else open_duration
+
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window_size)
+        self.timeouts = 0
+        self.opened_at = 0.0
+        self.half_opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        """Indica si se puede invocar la dependencia"""
+        with self.lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_duration:
+                    metrics.increment(f'circuit.{self.name}.rejected')
+                    return False
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes and \
+                        time.monotonic() - self.half_opened_at >= self.probe_timeout:
+                    # Pruebas sin resultado (perdidas): se reinicia el half_open
+                    logger.warning(f"Circuit breaker '{self.name}': pruebas sin resultado, se liberan")
+                    self.probes_in_flight = 0
+                    self.half_opened_at = time.monotonic()
+                if self.probes_in_flight >= self.half_open_probes:
+                    metrics.increment(f'circuit.{self.name}.rejected')
+                    return False
+                self.probes_in_flight += 1
+
+            return True
+
+    def record_success(self):
+        """Registra una invocación exitosa"""
+        with self.lock:
+            self.timeouts = 0
+            self.outcomes.append(True)
+
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    self._transition(CLOSED)
+
+    def record_failure(self, error=None):
+        """Registra una invocación fallida (timeouts cuentan aparte)"""
+        with self.lock:
+            self.outcomes.append(False)
+            if error is not None and is_timeout(error):
+                self.timeouts += 1
+
+            if self.state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+
+            failures = self.outcomes.count(False)
+            too_many_errors = (
+                len(self.outcomes) >= self.min_requests
+                and failures / len(self.outcomes) >= self.error_rate
+            )
+            if too_many_errors or self.timeouts >= self.consecutive_timeouts:
+                self._transition(OPEN)
+
+    def release(self):
+        """Devuelve el lugar de prueba sin registrar resultado (invocación cortada o abandonada)"""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+        metrics.increment(f'circuit.{self.name}.{state}')
+
+        self.state = state
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state == HALF_OPEN:
+            self.half_opened_at = time.monotonic()
+        if state == CLOSED:
+            self.outcomes.clear()
+            self.timeouts = 0
+
+    def status(self):
+        """Estado actual para logs y metadata de la respuesta"""
+        with self.lock:
+            state = self.state
+            if state == OPEN and time.monotonic() - self.opened_at >= self.open_duration:
+                state = HALF_OPEN
+            return {
+                'state': state,
+                'failures': self.outcomes.count(False),
+                'window': len(self.outcomes),
+                'consecutive_timeouts': self.timeouts
+            }
+
+
+# Circuito de la Knowledge Base (configurable por variables de entorno)
+kb_breaker = CircuitBreaker(
+    'kb',
+    error_rate=float(os.environ.get('KB_CIRCUIT_ERROR_RATE', '0.5')),
+    window_size=int(os.environ.get('KB_CIRCUIT_WINDOW', '20')),
+    min_requests=int(os.environ.get('KB_CIRCUIT_MIN_REQUESTS', '5')),
+    consecutive_timeouts=int(os.environ.get('KB_CIRCUIT_TIMEOUTS', '3')),
+    open_duration=float(os.environ.get('KB_CIRCUIT_OPEN_SECONDS', '30')),
+    half_open_probes=int(os.environ.get('KB_CIRCUIT_PROBES', '2'))
+)
@@ -1,9 +1,72 @@
-import boto3
+import contextvars
 import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+import metrics
+import semantic_cache
+from bedrock_clients import get_agent_runtime, get_bedrock_runtime, get_client, is_throttling_error, warm_up
+from circuit_breaker import CircuitOpenError, kb_breaker
+from context_builder import build_context, fold_old_turns, format_turns, needs_fold, truncate_to_tokens
+from deadlines import (DeadlineExceeded, budget, check_deadline, deadline_scope, expired, remaining,
+                       submit_with_deadline)
+from model_router import record_usage, route_request
+from session_store import get_store
+
+# Configuración de Bedrock
+KNOWLEDGE_BASE_ID = semantic_cache.KNOWLEDGE_BASE_ID
+KB_MODEL_ARN = 'arn:aws:bedrock:us-west-2::foundation-model/amazon.titan-embed-text-v2:0'
+FALLBACK_MODEL_ID = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
+MAX_TOKENS = 1000
+
+# Prompt de la KB cuando se abre una sesión nueva con historial de la conversación
+KB_SUMMARY_MAX_TOKENS = 300
+KB_RECENT_MAX_TOKENS = 600
+KB_PROMPT_TEMPLATE = """{system}
+Resumen de la conversación previa:
+{summary}
+
+Turnos recientes:
+{recent}
+
+Resultados de búsqueda:
+$search_results$
+
+Pregunta: $query$
+
+$output_format_instructions$"""
+
+# Hedging: si la KB no responde en HEDGE_DELAY segundos se lanza el modelo directo
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'true').lower() == 'true'
+HEDGE_DELAY = os.environ.get('HEDGE_DELAY', '6')  # segundos o 'auto' (p95 de la KB)
+HEDGE_DEFAULT_DELAY = 6.0
+
+# Presupuesto de latencia por nivel (segundos): cada nivel corta en su presupuesto
+# o en el deadline del request, lo que llegue antes
+TIER_BUDGETS = {
+    'cache': float(os.environ.get('CACHE_TIER_BUDGET', '2')),
+    'kb': float(os.environ.get('KB_TIER_BUDGET', '15')),
+    'model': float(os.environ.get('MODEL_TIER_BUDGET', '15')),
+}
+
+# Nivel (cache, kb o model) y ruta de modelo que respondieron el request en curso
+_answer_source = contextvars.ContextVar('answer_source', default=(None, None))
+
+logger = logging.getLogger()
+
+# Pool de hilos compartido para las rutas KB / modelo en paralelo
+_executor = ThreadPoolExecutor(max_workers=8)
+
+# Clientes creados una vez por contenedor (cold start)
+warm_up()
 
 def create_dnoc_agent():
-    """Crea cliente Bedrock para Knowledge Base"""
-    return boto3.client('bedrock-agent-runtime', region_name='us-west-2')
+    """Retorna el cliente Bedrock compartido para Knowledge Base"""
+    return get_agent_runtime()
 
 def get_system_prompt():
     """Retorna el prompt del sistema para DNOC"""
@@ -21,49 +84,409 @@ Usa la información de la base de conocimiento cuando esté disponible.
 Proporciona respuestas técnicas, concisas y con pasos específicos.
 """
 
-def process_message(message, session_id="default"):
-    """Procesa mensaje usando Knowledge Base directamente"""
-    
-    try:
-        client = boto3.client('bedrock-agent-runtime', region_name='us-west-2')
-        
-        # Usar retrieve_and_generate con Knowledge Base
-        response = client.retrieve_and_generate(
-            input={
-                'text': message
-            },
-            retrieveAndGenerateConfiguration={
-                'type': 'KNOWLEDGE_BASE',
-                'knowledgeBaseConfiguration': {
-                    'knowledgeBaseId': 'YIQHGCIFHL',
-                    'modelArn': 'arn:aws:bedrock:us-west-2::foundation-model/amazon.titan-embed-text-v2:0'
-                }
+def build_kb_request(message, bedrock_session_id=None, summary='', recent=None):
+    """Arma los parámetros de retrieve_and_generate para la Knowledge Base"""
+    request = {
+        'input': {
+            'text': message
+        },
+        'retrieveAndGenerateConfiguration': {
+            'type': 'KNOWLEDGE_BASE',
+            'knowledgeBaseConfiguration': {
+                'knowledgeBaseId': KNOWLEDGE_BASE_ID,
+                'modelArn': KB_MODEL_ARN
             }
-        )
-        
+        }
+    }
+
+    # La sesión de Bedrock conserva el contexto de la conversación
+    if bedrock_session_id:
+        request['sessionId'] = bedrock_session_id
+    elif summary or recent:
+        # Sesión nueva con historial (la anterior expiró o falló): el resumen y
+        # los turnos recientes viajan en el prompt
+        request['retrieveAndGenerateConfiguration']['knowledgeBaseConfiguration']['generationConfiguration'] = {
+            'promptTemplate': {
+                'textPromptTemplate': KB_PROMPT_TEMPLATE.format(
+                    system=get_system_prompt(),
+                    summary=truncate_to_tokens(summary, KB_SUMMARY_MAX_TOKENS, keep='tail') or '(vacío)',
+                    recent=format_turns(recent or [], KB_RECENT_MAX_TOKENS) or '(vacío)'
+                )
+            }
+        }
+
+    return request
+
+def session_kb_request(message, session):
+    """Parámetros de la KB para el mensaje en el contexto de la sesión"""
+    return build_kb_request(message, session.get('bedrock_session_id'), session.get('summary', ''), session['turns'])
+
+def build_model_body(message, session=None, route=None):
+    """Arma el body de invoke_model para el fallback directo a Claude
+
+    route (de model_router) define el modelo, y con él el presupuesto de
+    contexto, y los tokens de salida; sin route se usa el modelo de fallback.
+    """
+    model_id = route['model_id'] if route else FALLBACK_MODEL_ID
+    if session is None:
+        system, messages = get_system_prompt(), [{"role": "user", "content": message}]
+    else:
+        system, messages = build_context(session, message, get_system_prompt(), model_id)
+
+    return json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": route['max_tokens'] if route else MAX_TOKENS,
+        "system": system,
+        "messages": messages
+    })
+
+def tier_scope(tier):
+    """Acota el bloque al presupuesto de latencia del nivel"""
+    return deadline_scope(time.time() + TIER_BUDGETS[tier])
+
+def answered_by(tier, answer, route=None):
+    """Registra el nivel y la ruta que respondieron (se informan en la metadata) y retorna la respuesta"""
+    _answer_source.set((tier, route))
+    return answer
+
+# Sesiones con un plegado en curso (uno por sesión a la vez)
+_folding = set()
+_folding_lock = threading.Lock()
+
+def schedule_fold(session_id, session):
+    """Pliega los turnos viejos en segundo plano, después de responder
+
+    El resumen no queda en el camino crítico del request. La sesión de
+    Bedrock se conserva: la KB mantiene su propio contexto de la conversación.
+    """
+    if not needs_fold(session):
+        return
+    with _folding_lock:
+        if session_id in _folding:
+            return
+        _folding.add(session_id)
+    _executor.submit(fold_session, session_id, session)
+
+def fold_session(session_id, session):
+    """Plegado de la sesión (en el pool de hilos) y guardado en el store"""
+    try:
+        if fold_old_turns(session):
+            get_store().save(session_id, session)
+    except Exception as e:
+        logger.warning(f"No se pudo plegar la sesión {session_id}: {str(e)}")
+    finally:
+        with _folding_lock:
+            _folding.discard(session_id)
+
+def process_message(message, session_id="default", cacheable=True):
+    """Procesa mensaje usando el cache semántico y luego la Knowledge Base
+
+    El contexto de la conversación se toma del store de sesiones, por lo que
+    el cliente solo envía el mensaje nuevo. Con cacheable=False (p. ej.
+    análisis de alarmas) no se consulta ni se guarda en el cache semántico.
+    """
+    _answer_source.set((None, None))
+    sessions = get_store()
+    session = sessions.get(session_id)
+
+    # El cache solo aplica a preguntas sin contexto previo
+    first_turn = cacheable and not session['turns'] and not session.get('summary')
+    with tier_scope('cache'):
+        cached = semantic_cache.lookup(message) if first_turn else None
+    if cached is not None:
+        sessions.append_turn(session_id, message, cached)
+        return answered_by('cache', cached)
+
+    answer = generate_answer(message, session, route_request(message))
+    if first_turn:
+        semantic_cache.store(message, answer)
+    sessions.append_turn(session_id, message, answer)
+    schedule_fold(session_id, session)
+    return answer
+
+def kb_answer(message, session):
+    """Consulta la Knowledge Base con retrieve_and_generate (protegida por circuit breaker)"""
+    if not kb_breaker.allow_request():
+        raise CircuitOpenError("Circuito de KB abierto")
+
+    start = time.monotonic()
+    recorded = False
+    try:
+        with tier_scope('kb'):
+            client = get_agent_runtime()
+
+            # Usar retrieve_and_generate con Knowledge Base
+            response = client.retrieve_and_generate(
+                **session_kb_request(message, session)
+            )
+
+        kb_breaker.record_success()
+        recorded = True
+        session['bedrock_session_id'] = response.get('sessionId')
         return response['output']['text']
-        
     except Exception as e:
-        # Fallback directo a Claude
-        try:
-            bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-west-2')
-            
+        # Un corte por el deadline del request no es una falla de la KB
+        if not expired():
+            kb_breaker.record_failure(e)
+            recorded = True
+        # La sesión de Bedrock pudo expirar: el próximo turno abre una nueva
+        session['bedrock_session_id'] = None
+        raise
+    finally:
+        # Sin resultado registrado se devuelve el lugar de prueba del half_open
+        if not recorded:
+            kb_breaker.release()
+        metrics.observe('latency.kb', time.monotonic() - start)
+
+def model_answer(message, session, route):
+    """Invoca directamente a Claude (fallback) con el historial de la sesión y el modelo de la ruta"""
+    name, config = route
+    start = time.monotonic()
+    try:
+        with tier_scope('model'):
+            bedrock_runtime = get_bedrock_runtime()
+
             response = bedrock_runtime.invoke_model(
-                modelId='us.anthropic.claude-sonnet-4-20250514-v1:0',
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 1000,
-                    "system": get_system_prompt(),
-                    "messages": [{"role": "user", "content": message}]
-                })
+                modelId=config['model_id'],
+                body=build_model_body(message, session, config)
             )
-            
+
             response_body = json.loads(response['body'].read())
-            return response_body['content'][0]['text']
-            
+        record_usage(name, time.monotonic() - start, response_body.get('usage'))
+        return response_body['content'][0]['text']
+    finally:
+        metrics.observe('latency.model', time.monotonic() - start)
+
+def invoke_prompt(prompt, max_tokens=MAX_TOKENS, read_timeout=None, model_id=FALLBACK_MODEL_ID):
+    """Invoca directamente al modelo con un prompt aislado (sin sesión ni KB)"""
+    start = time.monotonic()
+    try:
+        bedrock_runtime = get_client('bedrock-runtime', read_timeout=read_timeout)
+
+        response = bedrock_runtime.invoke_model(
+            modelId=model_id,
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": max_tokens,
+                "system": get_system_prompt(),
+                "messages": [{"role": "user", "content": prompt}]
+            })
+        )
+
+        response_body = json.loads(response['body'].read())
+        return response_body['content'][0]['text']
+    finally:
+        metrics.observe('latency.invoke', time.monotonic() - start)
+
+def session_has_context(session_id):
+    """Indica si la sesión tiene turnos o resumen previos (la respuesta depende del historial)"""
+    session = get_store().get(session_id)
+    return bool(session['turns'] or session.get('summary'))
+
+def record_shared_answer(session_id, message, answer):
+    """Registra en la sesión una respuesta compartida por un request idéntico concurrente"""
+    get_store().append_turn(session_id, message, answer)
+
+def get_response_metadata():
+    """Metadata del agente que se adjunta a la respuesta (estado del circuito de KB)"""
+    tier, route = _answer_source.get()
+    return {
+        'kb_circuit': kb_breaker.status()['state'],
+        'tier': tier,
+        'route': route
+    }
+
+def get_hedge_delay():
+    """Retorna la demora antes de lanzar el request de cobertura (hedge)
+
+    Con HEDGE_DELAY=auto se usa el p95 observado de la ruta KB.
+    """
+    if HEDGE_DELAY != 'auto':
+        return float(HEDGE_DELAY)
+    p95 = metrics.percentile('latency.kb', 95)
+    if p95 is None or p95 == float('inf'):
+        return HEDGE_DEFAULT_DELAY
+    return min(p95, HEDGE_DEFAULT_DELAY)
+
+def generate_answer(message, session, route):
+    """Genera la respuesta usando Knowledge Base, con fallback directo a Claude (modelo de la ruta)"""
+    if HEDGE_ENABLED:
+        return hedged_answer(message, session, route)
+
+    try:
+        return answered_by('kb', kb_answer(message, session))
+    except Exception as e:
+        # Con throttling el fallback solo duplicaría la carga sobre Bedrock, y sin
+        # tiempo restante nadie leería su respuesta
+        if is_throttling_error(e) or expired():
+            raise
+        # Fallback directo a Claude
+        try:
+            return answered_by('model', model_answer(message, session, route), route[0])
         except Exception as fallback_error:
             raise Exception(f"Error con KB: {str(e)}, Fallback: {str(fallback_error)}")
 
+def hedged_answer(message, session, route):
+    """Ejecuta la KB y, si no responde dentro del presupuesto, el modelo directo en paralelo
+
+    Se retorna la primera respuesta válida; el request que pierde se cancela
+    (si aún no empezó) o su resultado se descarta. Las esperas se acotan al
+    deadline del request.
+    """
+    start = time.monotonic()
+    futures = {submit_with_deadline(_executor, kb_answer, message, session): 'kb'}
+    errors = {}
+
+    done, _ = wait(futures, timeout=budget(get_hedge_delay()))
+    if not done:
+        check_deadline('esperando la KB')
+        logger.info("KB sin respuesta dentro del presupuesto, lanzando hedge al modelo directo")
+        metrics.increment('hedge.started')
+    else:
+        future = next(iter(done))
+        if future.exception() is None and future.result():
+            metrics.increment('hedge.won.kb')
+            metrics.observe('latency.answer', time.monotonic() - start)
+            return answered_by('kb', future.result())
+        errors['kb'] = future.exception() or Exception("Respuesta vacía")
+        if is_throttling_error(errors['kb']) or expired():
+            raise errors['kb']
+        futures.pop(future)
+
+    futures[submit_with_deadline(_executor, model_answer, message, session, route)] = 'model'
+
+    while futures:
+        done, _ = wait(futures, timeout=remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded("Deadline vencido esperando la KB y el modelo directo")
+        for future in done:
+            source = futures.pop(future)
+            if future.exception() is None and future.result():
+                for other in futures:
+                    other.cancel()
+                metrics.increment(f'hedge.won.{source}')
+                metrics.observe('latency.answer', time.monotonic() - start)
+                return answered_by(source, future.result(), route[0] if source == 'model' else None)
+            errors[source] = future.exception() or Exception("Respuesta vacía")
+
+    raise Exception(f"Error con KB: {str(errors.get('kb'))}, Fallback: {str(errors.get('model'))}")
+
+def stream_kb(message, session):
+    """Genera fragmentos de texto desde retrieve_and_generate_stream"""
+    if not kb_breaker.allow_request():
+        raise CircuitOpenError("Circuito de KB abierto")
+
+    recorded = False
+    try:
+        # El presupuesto del nivel acota la apertura del stream; los fragmentos, el deadline
+        with tier_scope('kb'):
+            client = get_agent_runtime()
+            response = client.retrieve_and_generate_stream(
+                **session_kb_request(message, session)
+            )
+        session['bedrock_session_id'] = response.get('sessionId')
+
+        for event in response['stream']:
+            text = event.get('output', {}).get('text')
+            if text:
+                yield text
+
+        kb_breaker.record_success()
+        recorded = True
+    except Exception as e:
+        if not expired():
+            kb_breaker.record_failure(e)
+            recorded = True
+        session['bedrock_session_id'] = None
+        raise
+    finally:
+        # Deadline vencido o cliente desconectado (GeneratorExit): se devuelve el lugar de prueba
+        if not recorded:
+            kb_breaker.release()
+
+def stream_model(message, session, route):
+    """Genera fragmentos de texto desde invoke_model_with_response_stream (modelo de la ruta)"""
+    name, config = route
+    start = time.monotonic()
+    with tier_scope('model'):
+        bedrock_runtime = get_bedrock_runtime()
+        response = bedrock_runtime.invoke_model_with_response_stream(
+            modelId=config['model_id'],
+            body=build_model_body(message, session, config)
+        )
+
+    usage = {}
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        payload = json.loads(chunk['bytes'])
+        # Tokens de entrada en message_start y de salida en message_delta
+        usage.update(payload.get('message', {}).get('usage') or payload.get('usage') or {})
+        if payload.get('type') == 'content_block_delta':
+            text = payload.get('delta', {}).get('text')
+            if text:
+                yield text
+
+    record_usage(name, time.monotonic() - start, usage)
+
+def stream_message(message, session_id="default", cacheable=True):
+    """Procesa mensaje en modo streaming, retornando los tokens a medida que llegan
+
+    Responde desde el cache semántico si hay coincidencia; si no, usa la
+    Knowledge Base y, si falla antes del primer fragmento, el fallback
+    directo a Claude. Registra el time-to-first-token (TTFT) en las métricas.
+    """
+    start = time.monotonic()
+    first_token = None
+    _answer_source.set((None, None))
+
+    sessions = get_store()
+    session = sessions.get(session_id)
+    first_turn = cacheable and not session['turns'] and not session.get('summary')
+
+    with tier_scope('cache'):
+        cached = semantic_cache.lookup(message) if first_turn else None
+    if cached is not None:
+        metrics.observe('ttft', time.monotonic() - start)
+        sessions.append_turn(session_id, message, cached)
+        yield answered_by('cache', cached)
+        return
+
+    route = route_request(message)
+    sources = [('kb', stream_kb), ('model', partial(stream_model, route=route))]
+    errors = []
+
+    for source, stream in sources:
+        try:
+            chunks = []
+            for text in stream(message, session):
+                check_deadline('streaming')
+                if first_token is None:
+                    first_token = time.monotonic() - start
+                    metrics.observe('ttft', first_token)
+                    metrics.observe(f'ttft.{source}', first_token)
+                    answered_by(source, None, route[0] if source == 'model' else None)
+                chunks.append(text)
+                yield text
+
+            metrics.observe('stream.total', time.monotonic() - start)
+            answer = ''.join(chunks)
+            if first_turn:
+                semantic_cache.store(message, answer)
+            sessions.append_turn(session_id, message, answer)
+            schedule_fold(session_id, session)
+            return
+
+        except Exception as e:
+            # Si ya se enviaron tokens no se puede cambiar de fuente; con throttling
+            # el fallback solo duplicaría la carga sobre Bedrock y sin tiempo no sirve
+            if first_token is not None or is_throttling_error(e) or expired():
+                raise
+            errors.append(f"{source}: {str(e)}")
+
+    raise Exception(f"Error en streaming: {', '.join(errors)}")
+
 if __name__ == "__main__":
     test_message = "Tengo un problema de conectividad en la red"
     try:
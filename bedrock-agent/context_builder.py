@@ -0,0 +1,177 @@
+import json
+import logging
+import math
+import os
+import time
+
+import metrics
+from bedrock_clients import get_bedrock_runtime
+
+logger = logging.getLogger()
+
+# Estimación local de tokens (español técnico ~3.5 caracteres por token)
+CHARS_PER_TOKEN = 3.5
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Presupuesto máximo de tokens de entrada por modelo
+DEFAULT_INPUT_BUDGET = int(os.environ.get('CONTEXT_INPUT_BUDGET', '8000'))
+MODEL_INPUT_BUDGETS = {
+    'us.anthropic.claude-sonnet-4-20250514-v1:0': DEFAULT_INPUT_BUDGET,
+    'us.anthropic.claude-opus-4-20250514-v1:0': DEFAULT_INPUT_BUDGET,
+    'us.anthropic.claude-3-5-haiku-20241022-v1:0': 6000,
+    'us.amazon.nova-micro-v1:0': 4000,
+}
+
+# Turnos (mensajes) que se conservan textuales; los anteriores se resumen
+KEEP_RECENT_MESSAGES = int(os.environ.get('CONTEXT_KEEP_RECENT', '6'))
+# Histéresis: se pliega recién cuando el historial supera este largo, no en cada turno
+FOLD_AT_MESSAGES = int(os.environ.get('CONTEXT_FOLD_AT', str(2 * KEEP_RECENT_MESSAGES)))
+SUMMARY_MAX_TOKENS = int(os.environ.get('CONTEXT_SUMMARY_TOKENS', '400'))
+SUMMARY_MODEL_ID = os.environ.get('CONTEXT_SUMMARY_MODEL', 'us.anthropic.claude-3-5-haiku-20241022-v1:0')
+
+
+def estimate_tokens(text):
+    """Estima los tokens de un texto sin llamar al modelo"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def messages_tokens(messages):
+    """Estima los tokens de una lista de mensajes"""
+    return sum(estimate_tokens(m['content']) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def input_budget(model_id):
+    """Presupuesto de tokens de entrada para el modelo"""
+    return MODEL_INPUT_BUDGETS.get(model_id, DEFAULT_INPUT_BUDGET)
+
+
+def truncate_to_tokens(text, max_tokens, keep='head'):
+    """Recorta un texto al presupuesto de tokens (conserva el inicio o el final)"""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    if keep == 'tail':
+        return '…' + text[-max_chars:]
+    return text[:max_chars] + '…'
+
+
+def local_summary(previous, turns):
+    """Resumen extractivo local (sin modelo): primera oración de cada turno"""
+    lines = [previous] if previous else []
+    for turn in turns:
+        first_sentence = turn['content'].strip().split('\n')[0].split('. ')[0]
+        prefix = 'Operador' if turn['role'] == 'user' else 'Asistente'
+        lines.append(f"- {prefix}: {first_sentence[:200]}")
+    return truncate_to_tokens('\n'.join(lines), SUMMARY_MAX_TOKENS, keep='tail')
+
+
+def model_summary(previous, turns):
+    """Resume los turnos con un modelo rápido, incorporando el resumen previo"""
+    transcript = '\n'.join(
+        f"{'Operador' if t['role'] == 'user' else 'Asistente'}: {t['content']}" for t in turns
+    )
+    prompt = (
+        "Actualiza el resumen de este incidente DNOC. Conserva equipos, alarmas, "
+        "hipótesis, acciones realizadas y pendientes. Responde solo con el resumen "
+        f"en viñetas, máximo {SUMMARY_MAX_TOKENS} tokens.\n\n"
+        f"Resumen previo:\n{previous or '(vacío)'}\n\nNuevos turnos:\n{transcript}"
+    )
+
+    response = get_bedrock_runtime().invoke_model(
+        modelId=SUMMARY_MODEL_ID,
+        body=json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": SUMMARY_MAX_TOKENS,
+            "messages": [{"role": "user", "content": prompt}]
+        })
+    )
+    return json.loads(response['body'].read())['content'][0]['text']
+
+
+def needs_fold(session):
+    """Indica si el historial de la sesión superó el umbral de plegado"""
+    return len(session['turns']) > FOLD_AT_MESSAGES
+
+
+def fold_old_turns(session):
+    """Pliega los turnos viejos de la sesión en el resumen acumulado
+
+    Solo pliega cuando el historial supera FOLD_AT_MESSAGES y deja los últimos
+    KEEP_RECENT_MESSAGES textuales, así el resumen se actualiza cada varios
+    turnos. Los turnos agregados mientras se resume se conservan. Retorna True
+    si hubo plegado.
+    """
+    turns = list(session['turns'])
+    if len(turns) <= FOLD_AT_MESSAGES:
+        return False
+
+    # Cortar en un mensaje de usuario para que el historial alterne bien
+    cut = len(turns) - KEEP_RECENT_MESSAGES
+    while cut < len(turns) and turns[cut]['role'] != 'user':
+        cut += 1
+    old = turns[:cut]
+    if not old:
+        return False
+
+    start = time.monotonic()
+    previous = session.get('summary', '')
+    try:
+        summary = model_summary(previous, old)
+    except Exception as e:
+        logger.warning(f"Resumen con modelo falló, usando resumen local: {str(e)}")
+        summary = local_summary(previous, old)
+
+    session['summary'] = truncate_to_tokens(summary, SUMMARY_MAX_TOKENS, keep='tail')
+    session['turns'] = session['turns'][cut:]
+    metrics.increment('context.folds')
+    metrics.observe('latency.summary', time.monotonic() - start)
+    return True
+
+
+def format_turns(turns, max_tokens):
+    """Transcripción de los turnos para un prompt, acotada a max_tokens (conserva los últimos)"""
+    transcript = '\n'.join(
+        f"{'Operador' if t['role'] == 'user' else 'Asistente'}: {t['content']}" for t in turns
+    )
+    return truncate_to_tokens(transcript, max_tokens, keep='tail')
+
+
+def build_context(session, message, system_prompt, model_id):
+    """Arma (system, messages) dentro del presupuesto de tokens del modelo
+
+    Orden de recorte: turnos recientes más viejos, luego el resumen y por
+    último el propio mensaje.
+    """
+    budget = input_budget(model_id)
+    summary = session.get('summary', '')
+    recent = list(session['turns'])
+
+    def system_with(summary_text):
+        if not summary_text:
+            return system_prompt
+        return f"{system_prompt}\nResumen de la conversación previa:\n{summary_text}\n"
+
+    def total(system, history, user_message):
+        return (estimate_tokens(system) + messages_tokens(history)
+                + estimate_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS)
+
+    system = system_with(summary)
+    while recent and total(system, recent, message) > budget:
+        # Descartar el par (usuario, asistente) más viejo
+        recent = recent[2:] if len(recent) >= 2 else []
+
+    overflow = total(system, recent, message) - budget
+    if overflow > 0 and summary:
+        summary = truncate_to_tokens(summary, max(0, estimate_tokens(summary) - overflow), keep='tail')
+        system = system_with(summary)
+        overflow = total(system, recent, message) - budget
+
+    if overflow > 0:
+        message = truncate_to_tokens(message, max(1, estimate_tokens(message) - overflow))
+
+    messages = recent + [{"role": "user", "content": message}]
+    metrics.increment('context.builds')
+    logger.info(f"Contexto: ~{total(system, recent, message)} tokens de {budget} ({len(recent)} mensajes previos)")
+    return system, messages
@@ -0,0 +1,59 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Deadline absoluto (epoch en segundos) del request en curso. Se propaga por
+# contextvars: cada llamada a Bedrock recibe solo el tiempo que queda.
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """El request se quedó sin tiempo: no tiene sentido seguir trabajando"""
+
+
+def get_deadline():
+    """Deadline del request en curso (None si no hay)"""
+    return _deadline.get()
+
+
+def remaining():
+    """Segundos que le quedan al request (None si no hay deadline)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def expired():
+    """Indica si el request tiene deadline y ya venció"""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def budget(default):
+    """El default acotado por el tiempo que queda (nunca negativo)"""
+    left = remaining()
+    return default if left is None else max(0.0, min(default, left))
+
+
+def check_deadline(stage=''):
+    """Lanza DeadlineExceeded si el deadline ya venció"""
+    if expired():
+        raise DeadlineExceeded(f"Deadline vencido{f' ({stage})' if stage else ''}")
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Aplica el deadline (epoch en segundos) dentro del bloque; si ya hay uno gana el más cercano"""
+    current = _deadline.get()
+    if deadline is None or (current is not None and current <= deadline):
+        yield current
+        return
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def submit_with_deadline(executor, fn, *args):
+    """executor.submit que conserva el deadline del request en el hilo del pool"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
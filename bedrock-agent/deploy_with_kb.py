@@ -13,93 +13,59 @@ def run_command(cmd):
     except Exception as e:
         return False, str(e)
 
-def update_claude_agent_with_kb():
-    """Actualiza claude_agent.py para usar la base de conocimiento"""
-    
-    claude_code = '''import boto3
-import json
-
-def create_dnoc_agent():
-    """Crea cliente Bedrock para Knowledge Base"""
-    return boto3.client('bedrock-agent-runtime', region_name='us-west-2')
-
-def get_system_prompt():
-    """Retorna el prompt del sistema para DNOC"""
-    return """
-Eres un asistente técnico especializado en DNOC (Data Network Operations Center).
-
-Tu función es ayudar con:
-- Resolución de incidentes de red y servicios
-- Consultas sobre topología de equipos
-- Procedimientos técnicos documentados
-- Correlación de fallas y sistemas
-- Respuestas rápidas para acciones correctivas
+# Módulos del agente que se empaquetan junto a lambda_function.py
+AGENT_MODULES = [
+    'claude_agent.py',
+    'bedrock_clients.py',
+    'metrics.py',
+    'semantic_cache.py',
+    'circuit_breaker.py',
+    'session_store.py',
+    'context_builder.py',
+    'deadlines.py',
+    'model_router.py',
+]
 
-Usa la información de la base de conocimiento cuando esté disponible.
-Proporciona respuestas técnicas, concisas y con pasos específicos.
-"""
+# Módulos del backend que se empaquetan junto a lambda_function.py
+BACKEND_MODULES = [
+    'alarm_parser.py',
+    'alarm_correlator.py',
+    'template_miner.py',
+    'alarm_dedup.py',
+    'event_index.py',
+    'text_matching.py',
+    'topology.py',
+    'root_cause.py',
+    'job_store.py',
+    'async_jobs.py',
+    'adaptive_concurrency.py',
+    'storm_mode.py',
+    'signature_registry.py',
+    'single_flight.py',
+    'idempotency.py',
+    'scheduler.py',
+    'admission.py',
+    'lambda_function_mock.py',
+    'degradation.py',
+]
 
-def process_message(message, session_id="default"):
-    """Procesa mensaje usando Knowledge Base directamente"""
-    
-    try:
-        client = boto3.client('bedrock-agent-runtime', region_name='us-west-2')
-        
-        # Usar retrieve_and_generate con Knowledge Base
-        response = client.retrieve_and_generate(
-            input={
-                'text': message
-            },
-            retrieveAndGenerateConfiguration={
-                'type': 'KNOWLEDGE_BASE',
-                'knowledgeBaseConfiguration': {
-                    'knowledgeBaseId': 'YIQHGCIFHL',
-                    'modelArn': 'arn:aws:bedrock:us-west-2::foundation-model/amazon.titan-embed-text-v2:0'
-                }
-            }
-        )
-        
-        return response['output']['text']
-        
-    except Exception as e:
-        # Fallback directo a Claude
-        try:
-            bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-west-2')
-            
-            response = bedrock_runtime.invoke_model(
-                modelId='us.anthropic.claude-sonnet-4-20250514-v1:0',
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 1000,
-                    "system": get_system_prompt(),
-                    "messages": [{"role": "user", "content": message}]
-                })
-            )
-            
-            response_body = json.loads(response['body'].read())
-            return response_body['content'][0]['text']
-            
-        except Exception as fallback_error:
-            raise Exception(f"Error con KB: {str(e)}, Fallback: {str(fallback_error)}")
+# Búsqueda local de la KB (nivel local de la degradación)
+KNOWLEDGE_BASE_MODULES = [
+    'retrieval_engine.py',
+    'mock_kb.py',
+]
 
-if __name__ == "__main__":
-    test_message = "Tengo un problema de conectividad en la red"
-    try:
-        response = process_message(test_message)
-        print(f"Consulta: {test_message}")
-        print(f"Respuesta: {response}")
-    except Exception as e:
-        print(f"Error: {e}")
-'''
+def update_claude_agent_with_kb():
+    """Verifica que el agente use la base de conocimiento (definida en semantic_cache.py)"""
+    from semantic_cache import KNOWLEDGE_BASE_ID
     
-    # Escribir archivo actualizado
-    with open('claude_agent.py', 'w', encoding='utf-8') as f:
-        f.write(claude_code)
+    if KNOWLEDGE_BASE_ID != 'YIQHGCIFHL':
+        raise Exception(f"El agente usa la Knowledge Base {KNOWLEDGE_BASE_ID}, se esperaba YIQHGCIFHL")
     
-    print("✅ claude_agent.py actualizado con Knowledge Base YIQHGCIFHL")
+    print("✅ claude_agent.py configurado con Knowledge Base YIQHGCIFHL")
 
 def create_lambda_package():
-    """Crea paquete Lambda con ambos archivos"""
+    """Crea paquete Lambda con la función y los módulos del agente"""
     print("📦 Creando paquete Lambda...")
     
     zip_path = 'lambda_with_kb.zip'
@@ -107,8 +73,13 @@ def create_lambda_package():
     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
         # Agregar función Lambda
         zip_file.write('../backend/lambda_function.py', 'lambda_function.py')
-        # Agregar agente Claude actualizado
-        zip_file.write('claude_agent.py', 'claude_agent.py')
+        for module in BACKEND_MODULES:
+            zip_file.write(f'../backend/{module}', module)
+        for module in KNOWLEDGE_BASE_MODULES:
+            zip_file.write(f'../knowledge-base/{module}', module)
+        # Agregar agente Claude y módulos auxiliares
+        for module in AGENT_MODULES:
+            zip_file.write(module, module)
     
     print(f"✅ Paquete creado: {zip_path}")
     return zip_path
@@ -123,8 +94,8 @@ def deploy_lambda(zip_path):
     if success:
         print("✅ Lambda actualizada exitosamente")
         
-        # Actualizar timeout para Knowledge Base
-        cmd_timeout = "aws lambda update-function-configuration --function-name dnoc-chatbot-handler --timeout 60 --region us-west-2"
+        # Actualizar timeout para Knowledge Base y jobs asíncronos (API Gateway corta a los 29s igual)
+        cmd_timeout = "aws lambda update-function-configuration --function-name dnoc-chatbot-handler --timeout 300 --region us-west-2"
         run_command(cmd_timeout)
         print("✅ Timeout actualizado para Knowledge Base")
         
@@ -137,7 +108,7 @@ def main():
     print("🔧 Desplegando DNOC Assistant con Knowledge Base YIQHGCIFHL")
     print("=" * 60)
     
-    # 1. Actualizar claude_agent.py
+    # 1. Verificar claude_agent.py
     update_claude_agent_with_kb()
     
     # 2. Crear paquete
@@ -152,6 +123,7 @@ def main():
             print("\n🎉 Despliegue completado!")
             print("\n📝 Configuración:")
             print("- ✅ claude_agent.py con Knowledge Base YIQHGCIFHL")
+            print("- ✅ Clientes Bedrock compartidos con keep-alive")
             print("- ✅ lambda_function.py actualizado")
             print("- ✅ Claude Opus 4 usando retrieve_and_generate")
             
@@ -0,0 +1,82 @@
+import logging
+import threading
+
+logger = logging.getLogger()
+
+# Límites (segundos) de los buckets de los histogramas de latencia
+LATENCY_BUCKETS = [0.005, 0.025, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60]
+
+# Métricas en memoria del contenedor Lambda
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+
+
+def increment(name, value=1):
+    """Incrementa un contador"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    """Registra una latencia en el histograma indicado"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = {
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                'count': 0,
+                'sum': 0.0
+            }
+            _histograms[name] = histogram
+
+        index = len(LATENCY_BUCKETS)
+        for i, limit in enumerate(LATENCY_BUCKETS):
+            if seconds <= limit:
+                index = i
+                break
+
+        histogram['buckets'][index] += 1
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+
+    logger.info(f"METRIC {name}={seconds * 1000:.1f}ms")
+
+
+def percentile(name, p):
+    """Estima el percentil p (0-100) de un histograma usando el límite del bucket"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if not histogram or histogram['count'] == 0:
+            return None
+
+        target = histogram['count'] * p / 100.0
+        accumulated = 0
+        for i, count in enumerate(histogram['buckets']):
+            accumulated += count
+            if accumulated >= target:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float('inf')
+    return None
+
+
+def snapshot():
+    """Retorna una copia de todas las métricas"""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'histograms': {
+                name: {
+                    'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], h['buckets'])),
+                    'count': h['count'],
+                    'avg': h['sum'] / h['count'] if h['count'] else 0.0
+                }
+                for name, h in _histograms.items()
+            }
+        }
+
+
+def reset():
+    """Limpia las métricas (uso en pruebas)"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import re
+import unicodedata
+
+import metrics
+from context_builder import estimate_tokens
+
+logger = logging.getLogger()
+
+# Ruteo de modelos para las llamadas directas (variables de entorno de Lambda)
+MODEL_ROUTER = os.environ.get('MODEL_ROUTER', 'true').lower() == 'true'
+DEFAULT_ROUTE = 'standard'
+
+# Tabla de rutas: modelo (API de mensajes de Anthropic) y presupuesto de salida.
+# MODEL_ROUTES (JSON) reemplaza campos por ruta, p. ej. {"complex": {"max_tokens": 2000}}
+DEFAULT_ROUTES = {
+    'simple': {'model_id': 'us.anthropic.claude-3-5-haiku-20241022-v1:0', 'max_tokens': 400},
+    'standard': {'model_id': 'us.anthropic.claude-sonnet-4-20250514-v1:0', 'max_tokens': 1000},
+    'complex': {'model_id': 'us.anthropic.claude-opus-4-20250514-v1:0', 'max_tokens': 1500},
+}
+
+# Umbrales de la clasificación local
+SIMPLE_MAX_WORDS = int(os.environ.get('ROUTER_SIMPLE_MAX_WORDS', '15'))
+COMPLEX_MIN_TOKENS = int(os.environ.get('ROUTER_COMPLEX_MIN_TOKENS', '600'))
+COMPLEX_MIN_ALARMS = int(os.environ.get('ROUTER_COMPLEX_MIN_ALARMS', '20'))
+COMPLEX_MIN_CLUSTERS = int(os.environ.get('ROUTER_COMPLEX_MIN_CLUSTERS', '3'))
+
+# Encabezado del prompt de alarmas que arma alarm_correlator.summarize_clusters
+_ALARM_SUMMARY_RE = re.compile(r'Resumen de (\d+) alarmas en (\d+) grupos')
+# Preguntas de definición ("qué es BGP", "qué significa LOS", "define MTU")
+_DEFINITION_RE = re.compile(r'^\W*(?:(?:que|cual|cuales) (?:es|son|significa|quiere decir)|define|definicion|significado)\b')
+# Pedidos de análisis o correlación entre equipos
+_ANALYSIS_RE = re.compile(r'\b(?:correlaci\w*|causa raiz|analiza\w*|compara\w*|varios|multiples)\b')
+
+
+def _load_routes():
+    routes = {name: dict(route) for name, route in DEFAULT_ROUTES.items()}
+    try:
+        overrides = json.loads(os.environ.get('MODEL_ROUTES', '{}'))
+    except ValueError as e:
+        logger.error(f"MODEL_ROUTES inválido, se usan las rutas por defecto: {str(e)}")
+        overrides = {}
+    for name, fields in overrides.items():
+        routes.setdefault(name, dict(DEFAULT_ROUTES[DEFAULT_ROUTE])).update(fields)
+    return routes
+
+
+ROUTES = _load_routes()
+
+
+def _plain(text):
+    """Minúsculas y sin acentos"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def classify(message):
+    """Rasgos locales del request: intención, tamaño estimado y alarmas del dump"""
+    match = _ALARM_SUMMARY_RE.search(message)
+    plain = _plain(message)
+    if match:
+        intent = 'alarmas'
+    elif _DEFINITION_RE.search(plain):
+        intent = 'definicion'
+    elif _ANALYSIS_RE.search(plain):
+        intent = 'analisis'
+    else:
+        intent = 'consulta'
+    return {
+        'intent': intent,
+        'words': len(plain.split()),
+        'tokens': estimate_tokens(message),
+        'alarms': int(match.group(1)) if match else 0,
+        'clusters': int(match.group(2)) if match else 0
+    }
+
+
+def choose_route(features):
+    """Ruta según los rasgos: los modelos pesados solo para los casos difíciles"""
+    if features['intent'] == 'alarmas':
+        hard = features['alarms'] >= COMPLEX_MIN_ALARMS or features['clusters'] >= COMPLEX_MIN_CLUSTERS
+        return 'complex' if hard else 'standard'
+    if features['intent'] == 'analisis' or features['tokens'] >= COMPLEX_MIN_TOKENS:
+        return 'complex'
+    if features['intent'] == 'definicion' and features['words'] <= SIMPLE_MAX_WORDS:
+        return 'simple'
+    return DEFAULT_ROUTE
+
+
+def route_request(message):
+    """Elige la ruta del mensaje; retorna (nombre, ruta) con model_id y max_tokens"""
+    if not MODEL_ROUTER:
+        return DEFAULT_ROUTE, ROUTES[DEFAULT_ROUTE]
+    features = classify(message)
+    name = choose_route(features)
+    if name not in ROUTES:
+        name = DEFAULT_ROUTE
+    logger.info(f"Ruta '{name}' ({ROUTES[name]['model_id']}): {json.dumps(features)}")
+    return name, ROUTES[name]
+
+
+def record_usage(name, seconds, usage=None):
+    """Registra latencia y tokens consumidos por la ruta"""
+    metrics.observe(f'latency.route.{name}', seconds)
+    usage = usage or {}
+    metrics.increment(f'tokens.route.{name}.input', usage.get('input_tokens', 0))
+    metrics.increment(f'tokens.route.{name}.output', usage.get('output_tokens', 0))
@@ -0,0 +1,458 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger()
+
+# Configuración del cache (variables de entorno de Lambda)
+CACHE_BACKEND = os.environ.get('SEMANTIC_CACHE_BACKEND', 'memory')  # memory | sqlite | dynamodb | none
+CACHE_TTL = int(os.environ.get('SEMANTIC_CACHE_TTL', '3600'))
+CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', '500'))
+CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+CACHE_SQLITE_PATH = os.environ.get('SEMANTIC_CACHE_PATH', '/tmp/dnoc_semantic_cache.db')
+CACHE_TABLE = os.environ.get('SEMANTIC_CACHE_TABLE', 'dnoc-semantic-cache')
+DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT')  # p. ej. http://localhost:8000 (DynamoDB Local)
+CACHE_EMBEDDINGS = os.environ.get('SEMANTIC_CACHE_EMBEDDINGS', 'local')  # local | titan
+
+# Versión de la Knowledge Base: al re-ingestar cambia y el cache se invalida
+KB_VERSION = os.environ.get('KB_VERSION', '')
+KNOWLEDGE_BASE_ID = os.environ.get('KNOWLEDGE_BASE_ID', 'YIQHGCIFHL')
+KB_DATA_SOURCE_ID = os.environ.get('KB_DATA_SOURCE_ID', '')
+KB_VERSION_REFRESH = int(os.environ.get('KB_VERSION_REFRESH', '300'))
+
+EMBEDDING_DIMENSIONS = 512
+TITAN_EMBED_MODEL_ID = 'amazon.titan-embed-text-v2:0'
+
+# Palabras sin valor semántico para las consultas DNOC
+STOPWORDS = {
+    'que', 'es', 'un', 'una', 'el', 'la', 'los', 'las', 'de', 'del', 'en', 'y',
+    'o', 'a', 'al', 'por', 'para', 'con', 'se', 'me', 'mi', 'como', 'cual',
+    'hay', 'tengo', 'necesito', 'ayuda', 'sobre', 'favor', 'hola', 'lo', 'le',
+    'servicio', 'servicios', 'significa', 'explica', 'explicame'
+}
+
+# Palabras que invierten el sentido de la consulta
+NEGATIONS = {'no', 'ni', 'nunca', 'jamas', 'sin'}
+
+
+def normalize_query(text):
+    """Normaliza la consulta: minúsculas, sin acentos, sin puntuación ni stopwords"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    words = re.findall(r'[a-z0-9]+', text)
+    return ' '.join(w for w in words if w not in STOPWORDS)
+
+
+def cache_bucket(normalized):
+    """Tokens que deben coincidir exactamente para reutilizar una respuesta
+
+    Hosts, IPs y números (tokens con dígitos) y negaciones: el embedding por
+    hashing los diluye y "reiniciar plwagapp2" o "no reiniciar" quedarían
+    por encima del umbral frente a "reiniciar plwagapp1" o "reiniciar".
+    """
+    anchors = sorted(w for w in normalized.split() if w in NEGATIONS or any(c.isdigit() for c in w))
+    return 'b:' + ' '.join(anchors)
+
+
+def local_embedding(normalized):
+    """Embedding local por hashing de palabras y trigramas de caracteres (sin red)"""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    features = normalized.split()
+    for word in normalized.split():
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    for feature in features:
+        digest = hashlib.md5(feature.encode('utf-8')).digest()
+        index = int.from_bytes(digest[:4], 'little') % EMBEDDING_DIMENSIONS
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+
+    return _unit(vector)
+
+
+def titan_embedding(normalized):
+    """Embedding con Amazon Titan Text Embeddings v2"""
+    from bedrock_clients import get_bedrock_runtime
+
+    response = get_bedrock_runtime().invoke_model(
+        modelId=TITAN_EMBED_MODEL_ID,
+        body=json.dumps({
+            'inputText': normalized,
+            'dimensions': EMBEDDING_DIMENSIONS,
+            'normalize': True
+        })
+    )
+    return json.loads(response['body'].read())['embedding']
+
+
+def embed(normalized):
+    """Calcula el embedding de una consulta normalizada"""
+    if CACHE_EMBEDDINGS == 'titan':
+        return titan_embedding(normalized)
+    return local_embedding(normalized)
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        return vector
+    return [v / norm for v in vector]
+
+
+def cosine_similarity(a, b):
+    """Similitud coseno entre dos vectores unitarios"""
+    return sum(x * y for x, y in zip(a, b))
+
+
+class MemoryBackend:
+    """Backend en memoria del contenedor, con orden LRU"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def items(self):
+        with self.lock:
+            return list(self.entries.items())
+
+    def candidates(self, bucket):
+        return [(key, entry) for key, entry in self.items() if cache_bucket(key) == bucket]
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def touch(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries[key]['last_access'] = time.time()
+                self.entries.move_to_end(key)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteBackend:
+    """Backend en archivo SQLite (persiste entre invocaciones en /tmp o en local)"""
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS semantic_cache ('
+            'key TEXT PRIMARY KEY, embedding TEXT, answer TEXT, '
+            'created_at REAL, last_access REAL, kb_version TEXT)'
+        )
+        self.conn.commit()
+
+    def _row_to_entry(self, row):
+        return {
+            'embedding': json.loads(row[1]),
+            'answer': row[2],
+            'created_at': row[3],
+            'last_access': row[4],
+            'kb_version': row[5]
+        }
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT * FROM semantic_cache WHERE key = ?', (key,)
+            ).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def items(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT * FROM semantic_cache').fetchall()
+        return [(row[0], self._row_to_entry(row)) for row in rows]
+
+    def candidates(self, bucket):
+        return [(key, entry) for key, entry in self.items() if cache_bucket(key) == bucket]
+
+    def put(self, key, entry):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO semantic_cache VALUES (?, ?, ?, ?, ?, ?)',
+                (key, json.dumps(entry['embedding']), entry['answer'],
+                 entry['created_at'], entry['last_access'], entry['kb_version'])
+            )
+            # Evicción LRU
+            self.conn.execute(
+                'DELETE FROM semantic_cache WHERE key NOT IN ('
+                'SELECT key FROM semantic_cache ORDER BY last_access DESC LIMIT ?)',
+                (self.max_entries,)
+            )
+            self.conn.commit()
+
+    def touch(self, key):
+        with self.lock:
+            self.conn.execute(
+                'UPDATE semantic_cache SET last_access = ? WHERE key = ?', (time.time(), key)
+            )
+            self.conn.commit()
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute('DELETE FROM semantic_cache WHERE key = ?', (key,))
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM semantic_cache')
+            self.conn.commit()
+
+
+class DynamoDBBackend:
+    """Backend DynamoDB (o DynamoDB Local vía DYNAMODB_ENDPOINT) con TTL nativo
+
+    Clave compuesta: bucket (cache_bucket de la consulta) como partition key y
+    la consulta normalizada como sort key. La búsqueda semántica consulta solo
+    el bucket de la consulta, sin scan, y las entradas vencen por el TTL de la
+    tabla (atributo expires_at) en vez de una evicción LRU.
+    """
+
+    def __init__(self, table_name, max_entries, endpoint_url=None):
+        import boto3
+
+        self.max_entries = max_entries
+        self.table = boto3.resource('dynamodb', endpoint_url=endpoint_url).Table(table_name)
+
+    def _to_entry(self, item):
+        return {
+            'embedding': json.loads(item['embedding']),
+            'answer': item['answer'],
+            'created_at': float(item['created_at']),
+            'last_access': float(item['last_access']),
+            'kb_version': item.get('kb_version', '')
+        }
+
+    def _key(self, key):
+        return {'bucket': cache_bucket(key), 'key': key}
+
+    def get(self, key):
+        item = self.table.get_item(Key=self._key(key)).get('Item')
+        return self._to_entry(item) if item else None
+
+    def candidates(self, bucket):
+        from boto3.dynamodb.conditions import Key
+
+        items = []
+        kwargs = {'KeyConditionExpression': Key('bucket').eq(bucket)}
+        while len(items) < self.max_entries:
+            response = self.table.query(**kwargs)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return [(item['key'], self._to_entry(item)) for item in items[:self.max_entries]]
+
+    def items(self):
+        response = self.table.scan()
+        items = response['Items']
+        while 'LastEvaluatedKey' in response:
+            response = self.table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+            items.extend(response['Items'])
+        return [(item['key'], self._to_entry(item)) for item in items]
+
+    def put(self, key, entry):
+        self.table.put_item(Item={
+            **self._key(key),
+            'embedding': json.dumps(entry['embedding']),
+            'answer': entry['answer'],
+            'created_at': str(entry['created_at']),
+            'last_access': str(entry['last_access']),
+            'kb_version': entry['kb_version'],
+            'expires_at': int(entry['created_at'] + CACHE_TTL)
+        })
+
+    def touch(self, key):
+        self.table.update_item(
+            Key=self._key(key),
+            UpdateExpression='SET last_access = :t',
+            ExpressionAttributeValues={':t': str(time.time())}
+        )
+
+    def delete(self, key):
+        self.table.delete_item(Key=self._key(key))
+
+    def clear(self):
+        for key, _ in self.items():
+            self.delete(key)
+
+
+def create_backend(name=CACHE_BACKEND):
+    """Crea el backend de cache configurado"""
+    if name == 'none':
+        return None
+    if name == 'sqlite':
+        return SQLiteBackend(CACHE_SQLITE_PATH, CACHE_MAX_ENTRIES)
+    if name == 'dynamodb':
+        return DynamoDBBackend(CACHE_TABLE, CACHE_MAX_ENTRIES, DYNAMODB_ENDPOINT)
+    return MemoryBackend(CACHE_MAX_ENTRIES)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_kb_version = {'value': KB_VERSION, 'checked_at': 0.0}
+
+
+def get_backend():
+    """Retorna el backend compartido (creado una vez por contenedor)"""
+    global _backend
+    if _backend is None and CACHE_BACKEND != 'none':
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Reemplaza el backend del cache (pruebas o configuración local)"""
+    global _backend
+    _backend = backend
+
+
+def current_kb_version():
+    """Retorna la versión de la KB (último ingestion job completo), con refresco periódico"""
+    if not KB_DATA_SOURCE_ID:
+        return _kb_version['value']
+
+    now = time.time()
+    if now - _kb_version['checked_at'] < KB_VERSION_REFRESH:
+        return _kb_version['value']
+
+    _kb_version['checked_at'] = now
+    try:
+        from bedrock_clients import get_client
+
+        response = get_client('bedrock-agent').list_ingestion_jobs(
+            knowledgeBaseId=KNOWLEDGE_BASE_ID,
+            dataSourceId=KB_DATA_SOURCE_ID,
+            filters=[{'attribute': 'STATUS', 'operator': 'EQ', 'values': ['COMPLETE']}],
+            sortBy={'attribute': 'STARTED_AT', 'order': 'DESCENDING'},
+            maxResults=1
+        )
+        jobs = response.get('ingestionJobSummaries', [])
+        if jobs:
+            version = jobs[0]['ingestionJobId']
+            if version != _kb_version['value']:
+                logger.info(f"Nueva ingesta de KB detectada ({version}), invalidando cache")
+                invalidate()
+            _kb_version['value'] = version
+    except Exception as e:
+        logger.warning(f"No se pudo obtener la versión de la KB: {str(e)}")
+
+    return _kb_version['value']
+
+
+def lookup(message):
+    """Busca una respuesta en cache para la consulta (exacta o semánticamente similar)"""
+    backend = get_backend()
+    if backend is None:
+        return None
+
+    try:
+        return _lookup(backend, message)
+    except Exception as e:
+        logger.warning(f"Error consultando cache: {str(e)}")
+        metrics.increment('cache.errors')
+        return None
+
+
+def _lookup(backend, message):
+    start = time.monotonic()
+    normalized = normalize_query(message)
+    if not normalized:
+        return None
+
+    kb_version = current_kb_version()
+    now = time.time()
+
+    def valid(entry):
+        return entry['kb_version'] == kb_version and now - entry['created_at'] < CACHE_TTL
+
+    # 1. Coincidencia exacta de la consulta normalizada
+    entry = backend.get(normalized)
+    best_key, best_score = (normalized, 1.0) if entry and valid(entry) else (None, 0.0)
+
+    # 2. Coincidencia semántica por embedding, solo entre consultas con los mismos
+    #    hosts, IPs, números y negaciones
+    if best_key is None:
+        embedding = embed(normalized)
+        for key, candidate in backend.candidates(cache_bucket(normalized)):
+            if not valid(candidate):
+                backend.delete(key)
+                continue
+            score = cosine_similarity(embedding, candidate['embedding'])
+            if score > best_score:
+                best_key, best_score, entry = key, score, candidate
+
+    elapsed = time.monotonic() - start
+    metrics.observe('cache.lookup', elapsed)
+
+    if best_key is not None and best_score >= CACHE_THRESHOLD:
+        backend.touch(best_key)
+        metrics.increment('cache.hit')
+        logger.info(f"Cache hit ({best_score:.2f}) para '{normalized}' -> '{best_key}'")
+        return entry['answer']
+
+    metrics.increment('cache.miss')
+    return None
+
+
+def store(message, answer):
+    """Guarda la respuesta de una consulta en el cache"""
+    backend = get_backend()
+    if backend is None or not answer:
+        return
+
+    normalized = normalize_query(message)
+    if not normalized:
+        return
+
+    now = time.time()
+    try:
+        backend.put(normalized, {
+            'embedding': embed(normalized),
+            'answer': answer,
+            'created_at': now,
+            'last_access': now,
+            'kb_version': current_kb_version()
+        })
+    except Exception as e:
+        logger.warning(f"No se pudo guardar en cache: {str(e)}")
+
+
+def invalidate():
+    """Vacía el cache (p. ej. luego de re-ingestar la Knowledge Base)"""
+    backend = get_backend()
+    if backend is not None:
+        backend.clear()
+        metrics.increment('cache.invalidations')
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger()
+
+# Configuración de sesiones (variables de entorno de Lambda)
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'none')  # none | sqlite | dynamodb
+SESSION_TTL = int(os.environ.get('SESSION_TTL', '14400'))
+SESSION_MAX_SESSIONS = int(os.environ.get('SESSION_MAX_SESSIONS', '1000'))
+SESSION_MAX_TURNS = int(os.environ.get('SESSION_MAX_TURNS', '50'))
+SESSION_SQLITE_PATH = os.environ.get('SESSION_SQLITE_PATH', '/tmp/dnoc_sessions.db')
+SESSION_TABLE = os.environ.get('SESSION_TABLE', 'dnoc-sessions')
+DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT')
+
+
+def new_session():
+    """Estructura vacía de una sesión de conversación"""
+    return {
+        'turns': [],
+        'summary': '',
+        'bedrock_session_id': None,
+        'updated_at': time.time()
+    }
+
+
+class SQLiteSessionBackend:
+    """Backend durable en archivo SQLite"""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data TEXT, updated_at REAL)'
+        )
+        self.conn.commit()
+
+    def load(self, session_id):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT data FROM sessions WHERE session_id = ?', (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, session):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+                (session_id, json.dumps(session), session['updated_at'])
+            )
+            self.conn.execute(
+                'DELETE FROM sessions WHERE updated_at < ?', (time.time() - SESSION_TTL,)
+            )
+            self.conn.commit()
+
+    def delete(self, session_id):
+        with self.lock:
+            self.conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+            self.conn.commit()
+
+
+class DynamoDBSessionBackend:
+    """Backend durable DynamoDB (o DynamoDB Local vía DYNAMODB_ENDPOINT) con TTL nativo"""
+
+    def __init__(self, table_name, endpoint_url=None):
+        import boto3
+
+        self.table = boto3.resource('dynamodb', endpoint_url=endpoint_url).Table(table_name)
+
+    def load(self, session_id):
+        item = self.table.get_item(Key={'session_id': session_id}).get('Item')
+        return json.loads(item['data']) if item else None
+
+    def save(self, session_id, session):
+        self.table.put_item(Item={
+            'session_id': session_id,
+            'data': json.dumps(session),
+            'expires_at': int(session['updated_at'] + SESSION_TTL)
+        })
+
+    def delete(self, session_id):
+        self.table.delete_item(Key={'session_id': session_id})
+
+
+def create_backend(name=SESSION_BACKEND):
+    """Crea el backend durable configurado (None = solo memoria)"""
+    if name == 'sqlite':
+        return SQLiteSessionBackend(SESSION_SQLITE_PATH)
+    if name == 'dynamodb':
+        return DynamoDBSessionBackend(SESSION_TABLE, DYNAMODB_ENDPOINT)
+    return None
+
+
+class SessionStore:
+    """Sesiones por session_id: LRU en memoria (contenedor caliente) + backend durable"""
+
+    def __init__(self, backend=None, max_sessions=SESSION_MAX_SESSIONS):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        """Retorna la sesión (crea una vacía si no existe o expiró)"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+
+        if session is None and self.backend is not None:
+            try:
+                session = self.backend.load(session_id)
+                metrics.increment('session.durable_load')
+            except Exception as e:
+                logger.warning(f"No se pudo leer la sesión {session_id}: {str(e)}")
+
+        if session is None or time.time() - session['updated_at'] > SESSION_TTL:
+            session = new_session()
+
+        self._remember(session_id, session)
+        return session
+
+    def save(self, session_id, session):
+        """Guarda la sesión en memoria y en el backend durable"""
+        session['updated_at'] = time.time()
+        session['turns'] = session['turns'][-SESSION_MAX_TURNS:]
+        self._remember(session_id, session)
+
+        if self.backend is not None:
+            try:
+                self.backend.save(session_id, session)
+            except Exception as e:
+                logger.warning(f"No se pudo guardar la sesión {session_id}: {str(e)}")
+
+    def append_turn(self, session_id, user_message, assistant_message):
+        """Agrega un turno (pregunta + respuesta) a la sesión"""
+        session = self.get(session_id)
+        session['turns'].append({'role': 'user', 'content': user_message})
+        session['turns'].append({'role': 'assistant', 'content': assistant_message})
+        self.save(session_id, session)
+
+    def delete(self, session_id):
+        """Elimina la sesión"""
+        with self.lock:
+            self.sessions.pop(session_id, None)
+        if self.backend is not None:
+            self.backend.delete(session_id)
+
+    def _remember(self, session_id, session):
+        with self.lock:
+            self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Retorna el store de sesiones compartido (creado una vez por contenedor)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore(create_backend())
+    return _store
+
+
+def set_store(store):
+    """Reemplaza el store de sesiones (pruebas o configuración local)"""
+    global _store
+    _store = store
@@ -1,7 +1,9 @@
 from strands import Agent
 
-def create_dnoc_agent():
-    """Crea agente DNOC usando Strands con Claude Opus 4"""
+from model_router import ROUTES, route_request
+
+def create_dnoc_agent(model_id=ROUTES['complex']['model_id']):
+    """Crea agente DNOC usando Strands (por defecto con el modelo de la ruta 'complex')"""
     
     system_prompt = """
 Eres un asistente técnico especializado en DNOC (Data Network Operations Center).
@@ -44,7 +46,7 @@ Características:
 """
     
     agent = Agent(
-        model="us.anthropic.claude-opus-4-20250514-v1:0",
+        model=model_id,
         system_prompt=system_prompt
     )
     
@@ -54,7 +56,8 @@ def process_message(message, session_id="default"):
     """Procesa mensaje usando el agente Strands"""
     
     try:
-        agent = create_dnoc_agent()
+        _, route = route_request(message)
+        agent = create_dnoc_agent(route['model_id'])
         response = agent.run(message)
         return response
     except Exception as e:
@@ -22,6 +22,8 @@ def deploy_mock_lambda():
     
     with zipfile.ZipFile(zip_path, 'w') as zip_file:
         zip_file.write('backend/lambda_function_mock.py', 'lambda_function.py')
+        zip_file.write('backend/text_matching.py', 'text_matching.py')
+        zip_file.write('backend/topology.py', 'topology.py')
     
     print(f"📦 ZIP creado: {zip_path}")
     
@@ -37,7 +39,7 @@ def deploy_mock_lambda():
         
         print("\n🎉 ¡Lambda actualizada!")
         print("\n📝 Características de la versión mock:")
-        print("- ✅ Respuestas inteligentes basadas en palabras clave")
+        print("- ✅ Respuestas inteligentes basadas en palabras clave (sin acentos, por raíz)")
         print("- ✅ Procedimientos DNOC reales")
         print("- ✅ Sin dependencia de Bedrock")
         print("- ✅ Funciona inmediatamente")
@@ -2,6 +2,9 @@ import gradio as gr
 import requests
 import json
 import os
+import threading
+import time
+import uuid
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
@@ -14,13 +17,156 @@ logger = logging.getLogger(__name__)
 # Configuration
 API_GATEWAY_URL = os.getenv('API_GATEWAY_URL', '')
 API_KEY = os.getenv('API_KEY', '')  # Optional API key for security
+# SSE framing only: the Lambda builds the whole body before responding, so there is no earlier first token
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', 'false').lower() == 'true'
+# Async jobs for alarm dumps and large queries (avoid the API Gateway timeout)
+ASYNC_JOBS = os.getenv('ASYNC_JOBS', 'true').lower() == 'true'
+ASYNC_MIN_CHARS = int(os.getenv('ASYNC_MIN_CHARS', '1500'))
+ASYNC_TIMEOUT = int(os.getenv('ASYNC_TIMEOUT', '300'))
+ASYNC_POLL_WAIT = int(os.getenv('ASYNC_POLL_WAIT', '20'))
+# Share one backend call between identical concurrent submissions
+SINGLE_FLIGHT = os.getenv('SINGLE_FLIGHT', 'true').lower() == 'true'
+# Retries reuse the idempotency key so the backend does not generate twice;
+# 409 (original still running) and 429 (rate limited) are retried after Retry-After
+RETRY_MAX_WAIT = int(os.getenv('RETRY_MAX_WAIT', '60'))
+RETRY_STATUS_CODES = (409, 429)
+# Each attempt carries an absolute deadline (X-Request-Deadline, epoch ms) so the
+# backend stops working on a request as soon as we stop waiting for it
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '28'))
+DEADLINE_GRACE = 1.0
+# Priority classes: alarm triage ("alert") is served before ordinary questions, both
+# in the Gradio queue (separate concurrency groups) and in the backend scheduler
+PRIORITY_CLASSES = ("alert", "interactive", "background")
+ALERT_CONCURRENCY = int(os.getenv('ALERT_CONCURRENCY', '4'))
+CHAT_CONCURRENCY = int(os.getenv('CHAT_CONCURRENCY', '2'))
+
+def is_alarm_payload(message):
+    """Alarm dump pasted from the monitoring console (header or tab-separated rows)"""
+    lines = [line for line in message.strip().splitlines() if line.strip()]
+    header = lines[0].lower() if lines else ""
+    return ("node" in header and "summary" in header) or sum(1 for line in lines if line.count("\t") >= 2) >= 2
+
+def request_priority(message, priority=None):
+    """Priority class for a message: the requested one, but alarm dumps are always alert"""
+    if is_alarm_payload(message):
+        return "alert"
+    return priority if priority in PRIORITY_CLASSES else "interactive"
+
+def request_fingerprint(message):
+    """Normalized key for a message: same text regardless of whitespace and case"""
+    return " ".join(message.split()).casefold()
+
+class Flight:
+    """Chunks produced by the in-flight call, replayed to every waiting caller"""
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.condition = threading.Condition()
+    
+    def publish(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+    
+    def finish(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+    
+    def replay(self):
+        position = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.chunks) > position or self.finished)
+                pending = self.chunks[position:]
+                finished = self.finished
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position == len(self.chunks):
+                return
+
+class SingleFlight:
+    """Coalesce identical concurrent requests: the first one calls the backend, the rest follow it"""
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+    
+    def stream(self, key, produce):
+        """Yield produce()'s chunks; concurrent callers with the same key get the same chunks"""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        
+        if not leader:
+            logger.info("Identical request in flight, sharing its response")
+            yield from flight.replay()
+            return
+        
+        try:
+            for chunk in produce():
+                flight.publish(chunk)
+                yield chunk
+        finally:
+            # Later submissions start a new call (no stale responses)
+            with self.lock:
+                self.flights.pop(key, None)
+            flight.finish()
+    
+    def call(self, key, produce):
+        """Single-result variant of stream()"""
+        return "".join(self.stream(key, lambda: iter([produce()])))
 
 class DNOCChatbot:
     def __init__(self):
         self.session_id = None
-        
-    def call_lambda_backend(self, message, history):
-        """Call Lambda function via API Gateway"""
+        self.single_flight = SingleFlight()
+        self.pending_keys = {}
+    
+    def idempotency_key(self, message):
+        """Key for this message; kept after a timeout so resubmitting it attaches to the original request"""
+        return self.pending_keys.setdefault(request_fingerprint(message), str(uuid.uuid4()))
+    
+    def settle_key(self, message):
+        """The backend answered: the next submission of the message is a new request"""
+        self.pending_keys.pop(request_fingerprint(message), None)
+    
+    def post_chat(self, message, payload, headers, settle=True, **kwargs):
+        """POST /chat with an idempotency key, retrying while the backend asks to (409, 429)
+
+        With settle=False the key is kept until the caller settles it (async jobs,
+        so resubmitting after a poll timeout attaches to the same job). Every
+        attempt gets REQUEST_TIMEOUT seconds, sent to the backend as an absolute
+        deadline; the HTTP timeout only adds a little grace for the response.
+        """
+        headers = dict(headers, **{"Idempotency-Key": self.idempotency_key(message)})
+        deadline = time.monotonic() + RETRY_MAX_WAIT
+        while True:
+            attempt_deadline = time.time() + REQUEST_TIMEOUT
+            headers["X-Request-Deadline"] = str(int(attempt_deadline * 1000))
+            response = requests.post(
+                f"{API_GATEWAY_URL}/chat",
+                json=payload,
+                headers=headers,
+                timeout=REQUEST_TIMEOUT + DEADLINE_GRACE,
+                **kwargs
+            )
+            retry_after = float(response.headers.get("Retry-After", 5))
+            if response.status_code not in RETRY_STATUS_CODES or time.monotonic() + retry_after > deadline:
+                break
+            logger.info(f"Backend busy ({response.status_code}), retrying in {retry_after:.0f}s")
+            response.close()
+            time.sleep(retry_after)
+        if response.headers.get("Idempotent-Replayed"):
+            logger.info("Response replayed from the original request")
+        if settle and response.status_code not in RETRY_STATUS_CODES:
+            self.settle_key(message)
+        return response
+        
+    def call_lambda_backend(self, message, priority=None):
+        """Call Lambda function via API Gateway (history lives server-side)"""
         try:
             headers = {
                 "Content-Type": "application/json"
@@ -32,22 +178,22 @@ class DNOCChatbot:
             
             payload = {
                 "message": message,
-                "history": history,
-                "session_id": self.session_id,
-                "timestamp": datetime.utcnow().isoformat()
+                "session_id": self.get_session_id(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "priority": request_priority(message, priority)
             }
             
             logger.info(f"Calling Lambda with message: {message[:50]}...")
             
-            response = requests.post(
-                f"{API_GATEWAY_URL}/chat",
-                json=payload,
-                headers=headers,
-                timeout=30
+            response = self.post_chat(
+                message,
+                payload,
+                headers
             )
             
             if response.status_code == 200:
                 result = response.json()
+                self.session_id = result.get("session_id", self.session_id)
                 return result.get("response", "No response received")
             else:
                 logger.error(f"API call failed: {response.status_code} - {response.text}")
@@ -61,13 +207,213 @@ class DNOCChatbot:
             logger.error(f"Unexpected error: {str(e)}")
             return f"Error: {str(e)}"
     
-    def respond(self, message, chat_history):
+    def use_async(self, message):
+        """Alarm dumps and large queries run as async jobs"""
+        if not ASYNC_JOBS:
+            return False
+        return is_alarm_payload(message) or len(message) >= ASYNC_MIN_CHARS
+    
+    def call_lambda_backend_async(self, message, priority=None):
+        """Submit the message as an async job and long-poll /jobs/{id} until it finishes"""
+        try:
+            headers = {
+                "Content-Type": "application/json"
+            }
+            
+            if API_KEY:
+                headers["x-api-key"] = API_KEY
+            
+            payload = {
+                "message": message,
+                "session_id": self.get_session_id(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "priority": request_priority(message, priority),
+                # The job outlives the request: its own deadline is the polling budget
+                "deadline_ms": int((time.time() + ASYNC_TIMEOUT) * 1000),
+                "async": True
+            }
+            
+            logger.info(f"Submitting async job with message: {message[:50]}...")
+            
+            response = self.post_chat(
+                message,
+                payload,
+                headers,
+                settle=False
+            )
+            
+            if response.status_code not in (200, 202):
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.settle_key(message)
+                logger.error(f"API call failed: {response.status_code} - {response.text}")
+                return f"Error: API call failed with status {response.status_code}"
+            
+            result = response.json()
+            self.session_id = result.get("session_id", self.session_id)
+            # Backend without async support answered synchronously
+            if "job_id" not in result:
+                self.settle_key(message)
+                return result.get("response", "No response received")
+            
+            job_id = result["job_id"]
+            deadline = time.monotonic() + ASYNC_TIMEOUT
+            while time.monotonic() < deadline:
+                poll = requests.get(
+                    f"{API_GATEWAY_URL}/jobs/{job_id}",
+                    params={"wait": ASYNC_POLL_WAIT},
+                    headers=headers,
+                    timeout=ASYNC_POLL_WAIT + 10
+                )
+                if poll.status_code != 200:
+                    logger.error(f"Job poll failed: {poll.status_code} - {poll.text}")
+                    return f"Error: job poll failed with status {poll.status_code}"
+                
+                job = poll.json()
+                if job["status"] in ("done", "error"):
+                    self.settle_key(message)
+                if job["status"] == "done":
+                    self.session_id = job.get("session_id", self.session_id)
+                    return job.get("response", "No response received")
+                if job["status"] == "error":
+                    return f"Error: {job.get('error', 'unknown')}"
+            
+            return "Error: The analysis is taking too long. Please try again later."
+                
+        except requests.exceptions.Timeout:
+            return "Error: Request timed out. Please try again."
+        except requests.exceptions.ConnectionError:
+            return "Error: Unable to connect to backend service."
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            return f"Error: {str(e)}"
+    
+    def get_session_id(self):
+        """Return the conversation session ID, creating one on the first turn"""
+        if self.session_id is None:
+            self.session_id = str(uuid.uuid4())
+        return self.session_id
+    
+    def parse_sse(self, lines):
+        """Parse Server-Sent Events lines into (event, data) tuples"""
+        event, data = "message", []
+        for line in lines:
+            if line is None:
+                continue
+            if line == "":
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:"):].strip())
+        if data:
+            yield event, json.loads("\n".join(data))
+    
+    def call_lambda_backend_stream(self, message, priority=None):
+        """Call Lambda in streaming mode, yielding text chunks as they arrive"""
+        try:
+            headers = {
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream"
+            }
+            
+            if API_KEY:
+                headers["x-api-key"] = API_KEY
+            
+            payload = {
+                "message": message,
+                "session_id": self.get_session_id(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "priority": request_priority(message, priority),
+                "stream": True
+            }
+            
+            logger.info(f"Calling Lambda (stream) with message: {message[:50]}...")
+            start = time.monotonic()
+            first_chunk = None
+            
+            with self.post_chat(
+                message,
+                payload,
+                headers,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"API call failed: {response.status_code} - {response.text}")
+                    yield f"Error: API call failed with status {response.status_code}"
+                    return
+                
+                # Backend without streaming support: plain JSON response
+                if "text/event-stream" not in response.headers.get("Content-Type", ""):
+                    result = response.json()
+                    self.session_id = result.get("session_id", self.session_id)
+                    yield result.get("response", "No response received")
+                    return
+                
+                for event, data in self.parse_sse(response.iter_lines(decode_unicode=True)):
+                    if event == "token":
+                        if first_chunk is None:
+                            first_chunk = time.monotonic() - start
+                            logger.info(f"Time to first token: {first_chunk * 1000:.0f}ms")
+                        yield data.get("text", "")
+                    elif event == "done":
+                        self.session_id = data.get("session_id", self.session_id)
+                        logger.info(f"Stream done: {data}")
+                    elif event == "error":
+                        yield f"\n\nError: {data.get('error', 'unknown')}"
+                
+        except requests.exceptions.Timeout:
+            yield "Error: Request timed out. Please try again."
+        except requests.exceptions.ConnectionError:
+            yield "Error: Unable to connect to backend service."
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            yield f"Error: {str(e)}"
+    
+    def coalesced_call(self, message, call, priority=None):
+        """call(message, priority), shared with identical concurrent submissions"""
+        if not SINGLE_FLIGHT:
+            return call(message, priority)
+        return self.single_flight.call(("call", request_fingerprint(message)), lambda: call(message, priority))
+    
+    def coalesced_stream(self, message, priority=None):
+        """Streaming call, shared with identical concurrent submissions"""
+        if not SINGLE_FLIGHT:
+            return self.call_lambda_backend_stream(message, priority)
+        return self.single_flight.stream(("stream", request_fingerprint(message)),
+                                         lambda: self.call_lambda_backend_stream(message, priority))
+    
+    def respond_stream(self, message, chat_history, priority=None):
+        """Handle chat response, updating the last message as tokens arrive"""
+        if not message.strip():
+            yield chat_history, ""
+            return
+        
+        chat_history.append((message, ""))
+        yield chat_history, ""
+        
+        if self.use_async(message):
+            chat_history[-1] = (message, self.coalesced_call(message, self.call_lambda_backend_async, priority))
+            yield chat_history, ""
+            return
+        
+        bot_response = ""
+        for chunk in self.coalesced_stream(message, priority):
+            bot_response += chunk
+            chat_history[-1] = (message, bot_response)
+            yield chat_history, ""
+    
+    def respond(self, message, chat_history, priority=None):
         """Handle chat response"""
         if not message.strip():
             return chat_history, ""
         
         # Get response from Lambda backend
-        bot_response = self.call_lambda_backend(message, chat_history)
+        if self.use_async(message):
+            bot_response = self.coalesced_call(message, self.call_lambda_backend_async, priority)
+        else:
+            bot_response = self.coalesced_call(message, self.call_lambda_backend, priority)
         
         # Update chat history
         chat_history.append((message, bot_response))
@@ -78,8 +424,9 @@ class DNOCChatbot:
         self.session_id = None
         return []
 
-# Initialize chatbot
-dnoc_bot = DNOCChatbot()
+def session_bot(bot):
+    """Chatbot of the browser session: conversation, idempotency keys and in-flight requests are per user"""
+    return bot if bot is not None else DNOCChatbot()
 
 # Create Gradio interface
 def create_interface():
@@ -448,38 +795,63 @@ def create_interface():
         with gr.Row():
             status = gr.Markdown("🟢 **Estado del Sistema**: Operativo", elem_classes=["status-indicator"])
         
+        # Per-user chatbot (created on the first message of each browser session)
+        bot_state = gr.State(None)
+        
         # Event handlers
-        def submit_message(message, history):
+        def submit_message(message, history, bot, priority=None):
+            bot = session_bot(bot)
             if not message.strip():
-                return history, "", "🔴 **Estado del Sistema**: Ingrese un mensaje"
+                yield history, "", "🔴 **Estado del Sistema**: Ingrese un mensaje", bot
+                return
+            
+            if STREAM_RESPONSES:
+                # Stream tokens into the chat as they arrive
+                for new_history, empty_msg in bot.respond_stream(message, history, priority):
+                    yield new_history, empty_msg, "🟡 **Estado del Sistema**: Generando respuesta...", bot
+                yield new_history, empty_msg, "🟢 **Estado del Sistema**: Operativo", bot
+                return
             
             # Get response
-            new_history, empty_msg = dnoc_bot.respond(message, history)
+            new_history, empty_msg = bot.respond(message, history, priority)
             
-            return new_history, empty_msg, "🟢 **Estado del Sistema**: Operativo"
+            yield new_history, empty_msg, "🟢 **Estado del Sistema**: Operativo", bot
+        
+        def submit_alert(message, history, bot):
+            yield from submit_message(message, history, bot, "alert")
+        
+        def clear_session(bot):
+            bot = session_bot(bot)
+            return bot.clear_chat(), "🟢 **Estado del Sistema**: Conversación reiniciada", bot
         
         # Enter key event
         msg.submit(
             submit_message,
-            inputs=[msg, chatbot],
-            outputs=[chatbot, msg, status]
+            inputs=[msg, chatbot, bot_state],
+            outputs=[chatbot, msg, status, bot_state],
+            concurrency_id="chat",
+            concurrency_limit=CHAT_CONCURRENCY
         )
 
         # Button click event
         submit.click(
             submit_message,
-            inputs=[msg, chatbot],
-            outputs=[chatbot, msg, status]
+            inputs=[msg, chatbot, bot_state],
+            outputs=[chatbot, msg, status, bot_state],
+            concurrency_id="chat",
+            concurrency_limit=CHAT_CONCURRENCY
         )
 
         clear.click(
-            lambda: (dnoc_bot.clear_chat(), "🟢 **Estado del Sistema**: Conversación reiniciada"),
-            outputs=[chatbot, status],
+            clear_session,
+            inputs=[bot_state],
+            outputs=[chatbot, status, bot_state],
             queue=False
         )
         
+        # Alarm triage gets its own concurrency group so it never waits behind chat questions
         alert.click(
-            submit_message,
+            submit_alert,
             inputs=[gr.State("""
             node	summary	first_ocurrence
 plwagapp2	! - [Windows]: EventLog(6008 - None): The previous system shutdown at 12:22:00 on 8/8/2025 was unexpected. [MonitoreoBase EventLog 6008]	21/8/2025 16:02
@@ -487,8 +859,10 @@ plwagapp1	! - [Windows]: EventLog(6008 - None): The previous system shutdown at
 plwagmirr1	! - [Windows]: EventLog(6008 - None): The previous system shutdown at 12:23:00 on 8/8/2025 was unexpected. [MonitoreoBase EventLog 6008]	21/8/2025 15:59
 pesx4559.oneteco.arg.telecom.com.ar	The status on pesx4559.oneteco.arg.telecom.com.ar.Status is not as expected (3 (red))	21/8/2025 15:54
 pesx4608.oneteco.arg.telecom.com.ar	System.Memory:Memory Usage pct has breached threshold for 5 out of 6 times for pesx4608.oneteco.arg.telecom.com.ar	21/8/2025 15:57
-            """), chatbot],
-            outputs=[chatbot, msg, status]
+            """), chatbot, bot_state],
+            outputs=[chatbot, msg, status, bot_state],
+            concurrency_id="alert",
+            concurrency_limit=ALERT_CONCURRENCY
         )
         
         # Footer
@@ -31,23 +31,18 @@ MOCK_KNOWLEDGE_BASE = {
     }
 }
 
-def search_knowledge_base(query):
-    """Simula búsqueda en knowledge base"""
-    query_lower = query.lower()
-    
-    # Búsqueda simple por palabras clave
-    if any(word in query_lower for word in ["conectividad", "red", "falla", "conexión"]):
-        return "Para problemas de conectividad: 1) Verificar estado de interfaces 2) Revisar logs de equipos 3) Validar topología de red 4) Ejecutar diagnósticos 5) Aplicar solución según tipo de falla"
-    
-    elif any(word in query_lower for word in ["reinicio", "servicio", "reiniciar"]):
-        return "Para reinicio de servicios: 1) Identificar servicio afectado 2) Verificar dependencias 3) Ejecutar reinicio controlado 4) Validar funcionamiento 5) Monitorear estabilidad"
-    
-    elif any(word in query_lower for word in ["correlación", "fallas", "eventos"]):
-        return "Para correlación de fallas: 1) Recopilar eventos 2) Aplicar reglas de correlación 3) Identificar causa raíz 4) Generar recomendaciones 5) Ejecutar acciones correctivas"
-    
-    else:
+def search_knowledge_base(query, k=3):
+    """Busca en la knowledge base local (BM25 + vectores densos, ver retrieval_engine)"""
+    from retrieval_engine import retrieve
+
+    results = retrieve(query, k)
+    if not results:
         return "Consulta los procedimientos DNOC estándar o proporciona más detalles sobre el problema específico."
 
+    best = results[0]
+    steps = [line.lstrip('- ').strip() for line in best['text'].splitlines() if line.strip()]
+    return f"{best['heading']}: " + ' '.join(f"{i}) {step}" for i, step in enumerate(steps, 1))
+
 if __name__ == "__main__":
     print(f"✅ Mock Knowledge Base creado: {MOCK_KNOWLEDGE_BASE['kb_id']}")
     
@@ -0,0 +1,246 @@
+import hashlib
+import heapq
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Normalización de texto compartida con el backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from mock_kb import MOCK_KNOWLEDGE_BASE
+from text_matching import stem, tokenize as split_words
+
+# Parámetros de BM25 y de la fusión por ranking recíproco (RRF)
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+# Relevancia mínima: un chunk entra al resultado solo si comparte algún término
+# con la consulta (BM25 > 0) o si su similitud densa supera este umbral
+MIN_DENSE_SCORE = float(os.environ.get('KB_MIN_DENSE_SCORE', '0.3'))
+DENSE_DIMENSIONS = 256
+MAX_CHUNK_CHARS = 800
+
+# Directorio opcional con documentos locales (.md / .txt)
+KB_CORPUS_DIR = os.environ.get('KB_CORPUS_DIR', '')
+
+STOPWORDS = {
+    'que', 'es', 'un', 'una', 'el', 'la', 'los', 'las', 'de', 'del', 'en', 'y',
+    'o', 'a', 'al', 'por', 'para', 'con', 'se', 'su', 'sus', 'lo', 'le', 'como',
+    'si', 'no', 'mi', 'me', 'the', 'of', 'and', 'to'
+}
+
+
+def tokenize(text):
+    """Tokeniza: minúsculas, sin acentos, sin stopwords y reducido a raíces"""
+    return [stem(w) for w in split_words(text) if w not in STOPWORDS and len(w) > 1]
+
+
+def chunk_markdown(doc_id, text, max_chars=MAX_CHUNK_CHARS):
+    """Divide un documento Markdown en chunks por sección, conservando el título
+
+    Cada chunk lleva el camino de títulos (p. ej. "Procedimientos DNOC > Reinicio
+    de Servicios") para que la sección sea buscable aunque el texto no lo repita.
+    """
+    chunks = []
+    headings = []
+    lines = []
+
+    def flush():
+        body = '\n'.join(lines).strip()
+        lines.clear()
+        if not body:
+            return
+        heading = ' > '.join(headings)
+        # Secciones largas: cortar por párrafos
+        parts, current = [], ''
+        for paragraph in re.split(r'\n\s*\n', body):
+            if current and len(current) + len(paragraph) > max_chars:
+                parts.append(current)
+                current = ''
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            parts.append(current)
+        for part in parts:
+            chunks.append({'doc_id': doc_id, 'heading': heading, 'text': part.strip()})
+
+    for line in text.splitlines():
+        match = re.match(r'^(#{1,6})\s+(.*)', line.strip())
+        if match:
+            flush()
+            level = len(match.group(1))
+            headings[:] = headings[:level - 1] + [match.group(2).strip()]
+        else:
+            lines.append(line)
+    flush()
+
+    return chunks
+
+
+def dense_vector(tokens):
+    """Vector denso por hashing de palabras y trigramas de caracteres (normalizado)"""
+    vector = [0.0] * DENSE_DIMENSIONS
+    features = list(tokens)
+    for token in tokens:
+        padded = f" {token} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    for feature in features:
+        digest = hashlib.md5(feature.encode('utf-8')).digest()
+        index = int.from_bytes(digest[:4], 'little') % DENSE_DIMENSIONS
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class HybridRetriever:
+    """Motor de búsqueda local: índice invertido BM25 + índice denso + fusión RRF"""
+
+    def __init__(self):
+        self.chunks = []
+        self.postings = defaultdict(list)  # término -> [(chunk, tf)]
+        self.lengths = []
+        self.avg_length = 0.0
+        self.idf = {}
+        self.vectors = None
+        self.last_search_ms = 0.0
+
+    def add_document(self, doc_id, text):
+        """Agrega un documento (se indexa al llamar a build)"""
+        self.chunks.extend(chunk_markdown(doc_id, text))
+
+    def add_directory(self, path):
+        """Agrega los .md / .txt de un directorio (recursivo)"""
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.endswith(('.md', '.txt')):
+                    full_path = os.path.join(root, name)
+                    with open(full_path, 'r', encoding='utf-8') as f:
+                        self.add_document(os.path.relpath(full_path, path), f.read())
+
+    def build(self):
+        """Construye el índice invertido, los IDF y la matriz densa"""
+        self.postings = defaultdict(list)
+        self.lengths = []
+        vectors = []
+
+        for i, chunk in enumerate(self.chunks):
+            tokens = tokenize(f"{chunk['heading']} {chunk['text']}")
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((i, tf))
+            vectors.append(dense_vector(tokens))
+
+        total = len(self.chunks)
+        self.avg_length = sum(self.lengths) / total if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        self.vectors = np.array(vectors, dtype=np.float32) if np is not None and vectors else vectors
+        return self
+
+    def bm25_search(self, query, k=10):
+        """Top-k chunks por BM25 (solo recorre las listas de los términos de la consulta)"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / self.avg_length)
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def dense_search(self, query, k=10):
+        """Top-k chunks por similitud coseno con el vector de la consulta"""
+        tokens = tokenize(query)
+        if not tokens or not self.chunks:
+            return []
+        query_vector = dense_vector(tokens)
+
+        if np is not None:
+            scores = self.vectors @ np.array(query_vector, dtype=np.float32)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            results = [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+            return sorted(results, key=lambda item: item[1], reverse=True)
+
+        scores = ((i, sum(a * b for a, b in zip(v, query_vector))) for i, v in enumerate(self.vectors))
+        return heapq.nlargest(k, (s for s in scores if s[1] > 0), key=lambda item: item[1])
+
+    def search(self, query, k=5):
+        """Búsqueda híbrida: fusiona BM25 y denso con Reciprocal Rank Fusion"""
+        start = time.perf_counter()
+        candidates = max(k * 4, 20)
+        bm25 = self.bm25_search(query, candidates)
+        dense = self.dense_search(query, candidates)
+
+        fused = defaultdict(float)
+        for ranking in (bm25, dense):
+            for rank, (i, _) in enumerate(ranking):
+                fused[i] += 1.0 / (RRF_K + rank + 1)
+
+        bm25_scores = dict(bm25)
+        dense_scores = dict(dense)
+        # RRF siempre ordena algo: sin el corte, una consulta ajena a la KB
+        # devolvería el chunk menos malo en vez de ningún resultado
+        relevant = [(i, score) for i, score in fused.items()
+                    if bm25_scores.get(i, 0.0) > 0 or dense_scores.get(i, 0.0) >= MIN_DENSE_SCORE]
+        results = []
+        for i, score in heapq.nlargest(k, relevant, key=lambda item: item[1]):
+            chunk = self.chunks[i]
+            results.append({
+                'doc_id': chunk['doc_id'],
+                'heading': chunk['heading'],
+                'text': chunk['text'],
+                'score': score,
+                'bm25': bm25_scores.get(i, 0.0),
+                'dense': dense_scores.get(i, 0.0)
+            })
+
+        self.last_search_ms = (time.perf_counter() - start) * 1000
+        return results
+
+
+def build_default_retriever():
+    """Crea el motor con MOCK_KNOWLEDGE_BASE y el corpus local (KB_CORPUS_DIR)"""
+    retriever = HybridRetriever()
+    for doc_id, text in MOCK_KNOWLEDGE_BASE['documents'].items():
+        retriever.add_document(doc_id, text)
+    if KB_CORPUS_DIR and os.path.isdir(KB_CORPUS_DIR):
+        retriever.add_directory(KB_CORPUS_DIR)
+    return retriever.build()
+
+
+_retriever = None
+
+
+def get_retriever():
+    """Retorna el motor compartido (se construye una vez por proceso)"""
+    global _retriever
+    if _retriever is None:
+        _retriever = build_default_retriever()
+    return _retriever
+
+
+def retrieve(query, k=5):
+    """Retorna los top-k chunks con score para la consulta"""
+    return get_retriever().search(query, k)
+
+
+if __name__ == "__main__":
+    retriever = get_retriever()
+    print(f"✅ Índice local: {len(retriever.chunks)} chunks, {len(retriever.idf)} términos")
+
+    for query in ["problema de conectividad en la red", "reinicio de servicio", "correlación de eventos"]:
+        results = retriever.search(query, k=3)
+        print(f"\nConsulta: {query} ({retriever.last_search_ms:.3f} ms)")
+        for result in results:
+            print(f"  {result['score']:.4f} [{result['heading']}] {result['text'][:60]!r}")